@@ -4,6 +4,9 @@
   const TIMEOUT_MS = 4000;
   const API_LIST_LIMIT = 60;
   const CF_IMAGE_OPTIONS = "width=960,height=720,fit=cover,quality=72,format=webp";
+  // Matches SNAPSHOT_IMAGE_SIZES in scripts/sync_daily_sketch_from_photos.py.
+  const IMAGE_SIZES = "(max-width: 900px) 92vw, 30vw";
+  const FALLBACK_VARIANT_WIDTH = 640;
 
   const card = document.querySelector("[data-daily-sketch-card]");
   if (!card) return;
@@ -14,6 +17,13 @@
   const nextButton = card.querySelector("[data-sketch-next]");
   if (!rail) return;
 
+  // Month shards listed by the manifest index, newest first; older history is
+  // fetched one shard at a time once the rail is scrolled near its end.
+  let historyShards = [];
+  let historyReady = false;
+  let historyRequest = null;
+  const shownIds = new Set();
+
   setupNavigation();
   hydrate();
 
@@ -25,6 +35,7 @@
     try {
       const manifest = await requestManifest();
       const manifestItems = normalizeSketches(manifest?.items);
+      historyShards = normalizeShards(manifest?.shards);
       if (manifestItems.length > 0) {
         renderSketches(manifestItems);
         manifestStatus = "Loaded from static sketch manifest.";
@@ -51,13 +62,16 @@
       if (liveItems.length > 0) {
         renderSketches(liveItems);
         setStatus("Live sketches synced.");
-        return;
+      } else {
+        setStatus(manifestStatus);
       }
-      setStatus(manifestStatus);
     } catch (error) {
       setStatus(manifestStatus);
       console.error(error);
     }
+
+    historyReady = true;
+    updateNavState();
   }
 
   function normalizeSketches(items) {
@@ -80,15 +94,42 @@
         note: sanitizeText(raw.note),
         sketch_at: new Date(timestamp).toISOString(),
         timestamp,
+        variants: normalizeVariants(raw.variants || raw.derivatives),
       });
     }
     normalized.sort((a, b) => b.timestamp - a.timestamp);
     return normalized;
   }
 
+  // Web-format derivatives ({url, width}) narrowest first; the manifest calls
+  // them variants, the API derivatives.
+  function normalizeVariants(variants) {
+    if (!Array.isArray(variants)) return [];
+    return variants
+      .map((variant) => ({
+        url: sanitizeText(variant?.url),
+        width: Number.parseInt(variant?.width, 10),
+      }))
+      .filter((variant) => variant.url && Number.isInteger(variant.width) && variant.width > 0)
+      .sort((a, b) => a.width - b.width);
+  }
+
+  function normalizeShards(shards) {
+    if (!Array.isArray(shards)) return [];
+    return shards
+      .filter((shard) => shard && typeof shard === "object" && sanitizeText(shard.path))
+      .map((shard) => {
+        const path = sanitizeText(shard.path);
+        const version = sanitizeText(shard.sha256).slice(0, 12);
+        return version ? `${path}?v=${version}` : path;
+      });
+  }
+
   function renderSketches(items) {
     const fragment = document.createDocumentFragment();
+    shownIds.clear();
     items.forEach((item, index) => {
+      shownIds.add(item.id);
       fragment.appendChild(buildSketchFigure(item, index));
     });
     rail.innerHTML = "";
@@ -97,6 +138,39 @@
     updateNavState();
   }
 
+  function appendSketches(items) {
+    const fragment = document.createDocumentFragment();
+    for (const item of items) {
+      if (shownIds.has(item.id)) continue;
+      shownIds.add(item.id);
+      fragment.appendChild(buildSketchFigure(item, shownIds.size - 1));
+    }
+    const added = fragment.childNodes.length;
+    rail.appendChild(fragment);
+    return added;
+  }
+
+  function loadHistory() {
+    if (!historyReady || historyRequest || historyShards.length === 0) return;
+    historyRequest = (async () => {
+      // Shards that only repeat sketches already on the rail are skipped, so
+      // one scroll keeps fetching until something new is shown.
+      while (historyShards.length > 0) {
+        const shardUrl = historyShards.shift();
+        try {
+          const shard = await requestJson(shardUrl, { method: "GET" });
+          if (appendSketches(normalizeSketches(shard?.items)) > 0) break;
+        } catch (error) {
+          console.error(error);
+          break;
+        }
+      }
+    })().finally(() => {
+      historyRequest = null;
+      updateNavState();
+    });
+  }
+
   function buildSketchFigure(item, index) {
     const figure = document.createElement("figure");
     figure.className = "sketch-figure";
@@ -104,12 +178,22 @@
     const image = document.createElement("img");
     image.className = "sketch-image";
     image.dataset.originalSrc = item.image_url;
-    image.src = getSketchImageSrc(item.image_url);
+    if (item.variants.length > 0) {
+      const fallback =
+        item.variants.find((variant) => variant.width >= FALLBACK_VARIANT_WIDTH) ||
+        item.variants[item.variants.length - 1];
+      image.srcset = item.variants.map((variant) => `${variant.url} ${variant.width}w`).join(", ");
+      image.sizes = IMAGE_SIZES;
+      image.src = fallback.url;
+    } else {
+      image.src = getSketchImageSrc(item.image_url);
+    }
     image.alt = `Daily sketch from ${formatSketchAltDate(new Date(item.timestamp))}`;
     image.loading = index === 0 ? "eager" : "lazy";
     image.decoding = "async";
     image.addEventListener("error", () => {
       if (image.dataset.originalSrc && image.src !== image.dataset.originalSrc) {
+        image.removeAttribute("srcset");
         image.src = image.dataset.originalSrc;
       }
     });
@@ -169,8 +253,11 @@
   }
 
   function updateNavState() {
-    if (!prevButton || !nextButton) return;
     const maxScroll = rail.scrollWidth - rail.clientWidth;
+    if (rail.scrollLeft >= maxScroll - rail.clientWidth) {
+      loadHistory();
+    }
+    if (!prevButton || !nextButton) return;
     if (maxScroll <= 2) {
       prevButton.disabled = true;
       nextButton.disabled = true;
@@ -180,13 +267,16 @@
     nextButton.disabled = rail.scrollLeft >= maxScroll - 2;
   }
 
-  async function requestManifest() {
+  function requestManifest() {
+    return requestJson(MANIFEST_PATH, { method: "GET", cache: "no-cache" });
+  }
+
+  async function requestJson(url, options) {
     const controller = new AbortController();
     const timer = setTimeout(() => controller.abort(), TIMEOUT_MS);
     try {
-      const response = await fetch(MANIFEST_PATH, {
-        method: "GET",
-        cache: "no-cache",
+      const response = await fetch(url, {
+        ...options,
         signal: controller.signal,
       });
       if (!response.ok) {
@@ -0,0 +1,75 @@
+(function () {
+  const TIMEOUT_MS = 4000;
+  const SECTIONS = [
+    ["link_summary", "From link"],
+    ["comments_summary", "From comments"],
+  ];
+
+  const grid = document.querySelector("[data-hn-stories]");
+  if (!grid) return;
+
+  const storiesUrl = grid.getAttribute("data-hn-stories");
+  let storiesRequest = null;
+
+  grid.addEventListener("change", (event) => {
+    const target = event.target;
+    if (!(target instanceof HTMLInputElement) || !target.classList.contains("hn-toggle")) return;
+    if (!target.checked) return;
+
+    const story = target.closest(".hn-card")?.querySelector("[data-hn-story]");
+    if (!story || story.hasAttribute("data-loaded")) return;
+    hydrateStory(story);
+  });
+
+  async function hydrateStory(story) {
+    story.setAttribute("aria-busy", "true");
+    try {
+      const stories = await loadStories();
+      const entry = stories[story.getAttribute("data-hn-story")];
+      if (!entry || story.hasAttribute("data-loaded")) return;
+
+      const fragment = document.createDocumentFragment();
+      for (const [field, label] of SECTIONS) {
+        const text = typeof entry[field] === "string" ? entry[field].trim() : "";
+        if (!text) continue;
+        const paragraph = document.createElement("p");
+        const labelEl = document.createElement("span");
+        labelEl.className = "hn-label";
+        labelEl.textContent = label;
+        paragraph.append(labelEl, text);
+        fragment.appendChild(paragraph);
+      }
+      story.appendChild(fragment);
+      story.setAttribute("data-loaded", "");
+    } catch (error) {
+      storiesRequest = null;
+      console.error(error);
+    } finally {
+      story.removeAttribute("aria-busy");
+    }
+  }
+
+  function loadStories() {
+    if (!storiesRequest) {
+      storiesRequest = requestStories().then((payload) => payload?.stories || {});
+    }
+    return storiesRequest;
+  }
+
+  async function requestStories() {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), TIMEOUT_MS);
+    try {
+      const response = await fetch(storiesUrl, {
+        method: "GET",
+        signal: controller.signal,
+      });
+      if (!response.ok) {
+        throw new Error(`Stories request failed: ${response.status}`);
+      }
+      return await response.json();
+    } finally {
+      clearTimeout(timer);
+    }
+  }
+})();
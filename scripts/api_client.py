@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""Shared keep-alive HTTP client for the api.adamjones.ca refresh scripts.
+
+One SSL context is built per CA bundle, auth headers are read from the
+environment once, and HTTP/1.1 connections are pooled per host so that several
+requests in the same process reuse a single TLS handshake.
+
+Errors are surfaced as ``urllib.error.HTTPError`` / ``urllib.error.URLError`` so
+callers keep the same exception handling they had with ``urllib.request``.
+"""
+
+from __future__ import annotations
+
+import functools
+import http.client
+import io
+import json
+import os
+import select
+import ssl
+import threading
+import urllib.error
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import refresh_metrics
+from index_render import write_text_atomic
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_USER_AGENT = "adamjones.ca-refresh/1.0"
+DEFAULT_VALIDATOR_CACHE = ROOT / ".cache" / "api-validators.json"
+MAX_IDLE_PER_HOST = 4
+# Send buffer for request bodies; http.client's 8 KiB default means a
+# thousand-plus socket writes for a 10 MB photo.
+SEND_BLOCK_SIZE = 64 * 1024
+
+# Errors that mean a pooled keep-alive connection was closed by the server
+# between requests. The server may still have acted on the request, so it is
+# retried once on a fresh connection only if repeating it is harmless: the
+# method is idempotent (upload parts and derivatives are PUTs), or the
+# request never left the client.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+_RETRY_METHODS = frozenset({"GET", "HEAD", "PUT"})
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_ca_bundle(explicit_ca_bundle: str | None) -> str | None:
+    if explicit_ca_bundle:
+        return explicit_ca_bundle
+    env_ca_bundle = os.getenv("SSL_CERT_FILE")
+    if env_ca_bundle:
+        return env_ca_bundle
+    try:
+        import certifi  # type: ignore
+
+        return certifi.where()
+    except Exception:
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def create_ssl_context(explicit_ca_bundle: str | None, insecure: bool = False) -> ssl.SSLContext:
+    if insecure:
+        return ssl._create_unverified_context()
+    ca_bundle = resolve_ca_bundle(explicit_ca_bundle)
+    if ca_bundle:
+        return ssl.create_default_context(cafile=ca_bundle)
+    return ssl.create_default_context()
+
+
+@functools.lru_cache(maxsize=None)
+def _auth_headers() -> tuple[tuple[str, str], ...]:
+    headers: list[tuple[str, str]] = []
+    bearer = os.getenv("TODOS_API_BEARER_TOKEN")
+    if bearer:
+        headers.append(("Authorization", f"Bearer {bearer}"))
+    cf_id = os.getenv("CF_ACCESS_CLIENT_ID")
+    cf_secret = os.getenv("CF_ACCESS_CLIENT_SECRET")
+    if cf_id and cf_secret:
+        headers.append(("CF-Access-Client-Id", cf_id))
+        headers.append(("CF-Access-Client-Secret", cf_secret))
+    return tuple(headers)
+
+
+def build_headers(user_agent: str = DEFAULT_USER_AGENT) -> dict[str, str]:
+    headers = {"Accept": "application/json", "User-Agent": user_agent}
+    headers.update(_auth_headers())
+    return headers
+
+
+class NotModified(Exception):
+    """Raised by ``get_json`` when the server answers 304 to If-None-Match."""
+
+    def __init__(self, url: str) -> None:
+        super().__init__(f"Not modified: {url}")
+        self.url = url
+
+
+class ValidatorCache:
+    """On-disk map of validator key -> ETag used for conditional GETs.
+
+    ``get_json`` stages new validators as responses arrive. Callers ``commit``
+    a key only after its response has been rendered, then ``save``; a failed or
+    abandoned fetch therefore never persists a validator for content that was
+    not written.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._pending: dict[str, str | None] = {}
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        self._etags: dict[str, str] = {
+            str(k): str(v) for k, v in data.items()
+        } if isinstance(data, dict) else {}
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            return self._etags.get(key)
+
+    def discard(self, key: str) -> None:
+        """Forget the ETag for ``key`` so its next GET is unconditional.
+
+        Callers discard a key whose rendered artifact is no longer the one on
+        disk: a 304 would keep the edited or missing output in place.
+        """
+        with self._lock:
+            if self._etags.pop(key, None) is not None:
+                self._dirty = True
+
+    def record(self, key: str, etag: str | None) -> None:
+        with self._lock:
+            self._pending[key] = etag
+
+    def commit(self, key: str | None = None) -> None:
+        """Promote the staged validator for ``key`` (or every staged key)."""
+        with self._lock:
+            keys = list(self._pending) if key is None else [key]
+            for k in keys:
+                if k not in self._pending:
+                    continue
+                etag = self._pending.pop(k)
+                if etag and self._etags.get(k) != etag:
+                    self._etags[k] = etag
+                    self._dirty = True
+                elif not etag and k in self._etags:
+                    del self._etags[k]
+                    self._dirty = True
+
+    def mark_not_modified(self) -> None:
+        refresh_metrics.count("not_modified")
+        with self._lock:
+            self.not_modified += 1
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = json.dumps(self._etags, indent=2, sort_keys=True) + "\n"
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_text_atomic(self.path, payload)
+
+
+@dataclass
+class ApiResponse:
+    url: str
+    status: int
+    reason: str
+    headers: http.client.HTTPMessage
+    body: bytes
+
+    def json(self) -> object:
+        return json.loads(self.body)
+
+    def to_http_error(self) -> urllib.error.HTTPError:
+        return urllib.error.HTTPError(
+            self.url, self.status, self.reason, self.headers, io.BytesIO(self.body)
+        )
+
+
+def _dropped(conn: http.client.HTTPConnection) -> bool:
+    """True if an idle connection was closed by the server (or has unsolicited data)."""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class ApiClient:
+    """Pooled HTTP/1.1 client. Safe to share between threads."""
+
+    def __init__(
+        self,
+        *,
+        ssl_context: ssl.SSLContext,
+        user_agent: str = DEFAULT_USER_AGENT,
+        max_idle_per_host: int = MAX_IDLE_PER_HOST,
+    ) -> None:
+        self.ssl_context = ssl_context
+        self.headers = build_headers(user_agent)
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: dict[tuple[str, str, int], list[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _checkout(
+        self, key: tuple[str, str, int], timeout: float, *, fresh: bool = False
+    ) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            idle = [] if fresh else self._idle.get(key, [])
+            while idle:
+                conn = idle.pop()
+                if _dropped(conn):
+                    conn.close()
+                    continue
+                conn.timeout = timeout
+                conn.sock.settimeout(timeout)
+                return conn, True
+            self.connections_opened += 1
+        refresh_metrics.count("connections_opened")
+        scheme, host, port = key
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(
+                host, port, timeout=timeout, context=self.ssl_context, blocksize=SEND_BLOCK_SIZE
+            )
+        else:
+            conn = http.client.HTTPConnection(
+                host, port, timeout=timeout, blocksize=SEND_BLOCK_SIZE
+            )
+        return conn, False
+
+    def _checkin(self, key: tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        timeout: float,
+        body: bytes | MultipartBody | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> ApiResponse:
+        """Send a request and return the fully read response (any status).
+
+        ``body`` may be a ``MultipartBody``, which is streamed from disk and
+        rewound if the request has to be retried on a fresh connection. A
+        pooled connection the server already closed is retried at most once,
+        and only for GET, HEAD and PUT or a request that was never sent;
+        otherwise the error is raised as URLError.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in {"http", "https"} or not parts.hostname:
+            raise urllib.error.URLError(f"Unsupported URL: {url}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        request_headers = {**self.headers, **(headers or {})}
+        if isinstance(body, MultipartBody):
+            # Without a length http.client would fall back to chunked encoding.
+            request_headers.setdefault("Content-Length", str(len(body)))
+
+        retried = False
+        while True:
+            conn, reused = self._checkout(key, timeout, fresh=retried)
+            if isinstance(body, MultipartBody):
+                body.seek(0)
+            try:
+                if conn.sock is None:
+                    # Connect explicitly so the TCP and TLS handshakes are timed on their own.
+                    with refresh_metrics.phase("connect"):
+                        conn.connect()
+                with refresh_metrics.phase("fetch"):
+                    conn.request(method, target, body=body, headers=request_headers)
+                    response = conn.getresponse()
+                    payload = response.read()
+            except _STALE_CONNECTION_ERRORS as exc:
+                conn.close()
+                if (
+                    reused
+                    and not retried
+                    and (
+                        method.upper() in _RETRY_METHODS
+                        or isinstance(exc, http.client.CannotSendRequest)
+                    )
+                ):
+                    retried = True
+                    continue
+                raise urllib.error.URLError(exc) from exc
+            except urllib.error.URLError:
+                conn.close()
+                raise
+            except (OSError, http.client.HTTPException) as exc:
+                conn.close()
+                raise urllib.error.URLError(exc) from exc
+            except BaseException:
+                conn.close()
+                raise
+            break
+
+        refresh_metrics.count("requests")
+        refresh_metrics.count("bytes_in", len(payload))
+        if isinstance(body, (bytes, MultipartBody)):
+            refresh_metrics.count("bytes_out", len(body))
+        if response.will_close:
+            conn.close()
+        else:
+            self._checkin(key, conn)
+        return ApiResponse(
+            url=url,
+            status=response.status,
+            reason=response.reason,
+            headers=response.headers,
+            body=payload,
+        )
+
+    def get_json(
+        self,
+        url: str,
+        *,
+        timeout: float,
+        headers: dict[str, str] | None = None,
+        validators: ValidatorCache | None = None,
+        validator_key: str | None = None,
+    ) -> object:
+        """GET ``url`` and decode its JSON body; non-2xx raises HTTPError.
+
+        With ``validators``, the cached ETag is sent as If-None-Match and a 304
+        raises NotModified before any body is parsed. ``validator_key`` scopes
+        the ETag to the artifact rendered from it (defaults to the URL).
+        """
+        key = validator_key or url
+        request_headers = dict(headers or {})
+        etag = validators.get(key) if validators else None
+        if etag:
+            request_headers["If-None-Match"] = etag
+        response = self.request("GET", url, timeout=timeout, headers=request_headers)
+        if response.status == 304 and validators is not None:
+            validators.mark_not_modified()
+            raise NotModified(url)
+        if not 200 <= response.status < 300:
+            raise response.to_http_error()
+        with refresh_metrics.phase("decode"):
+            payload = response.json()
+        if validators is not None:
+            validators.record(key, response.headers.get("ETag"))
+        return payload
+
+    def request_json(
+        self,
+        method: str,
+        url: str,
+        *,
+        timeout: float,
+        body: bytes | MultipartBody | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> tuple[int, object]:
+        """Send a request and return (status, decoded JSON body) for any status.
+
+        A body that is not JSON (an HTML error page from a proxy, say) comes
+        back as ``{"raw": text}`` so callers can still report it.
+        """
+        response = self.request(method, url, timeout=timeout, body=body, headers=headers)
+        try:
+            with refresh_metrics.phase("decode"):
+                return response.status, response.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return response.status, {"raw": response.body.decode("utf-8", errors="replace")}
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._idle.values())
+            self._idle.clear()
+        for idle in pools:
+            for conn in idle:
+                conn.close()
+
+
+_clients: dict[tuple[str | None, bool, str], ApiClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(
+    ca_bundle: str | None = None,
+    *,
+    insecure: bool = False,
+    user_agent: str = DEFAULT_USER_AGENT,
+) -> ApiClient:
+    """Return the process-wide client for this TLS configuration."""
+    key = (ca_bundle, insecure, user_agent)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = ApiClient(
+                ssl_context=create_ssl_context(ca_bundle, insecure),
+                user_agent=user_agent,
+            )
+            _clients[key] = client
+        return client
+
+
+class MultipartBody:
+    """Readable multipart/form-data body whose file parts stream from disk.
+
+    http.client pulls it block by block, so a large photo is never held in
+    memory; ``len()`` is known up front for the Content-Length header.
+    """
+
+    def __init__(self, parts: list[bytes | Path]) -> None:
+        self._parts = parts
+        self._length = sum(
+            len(part) if isinstance(part, bytes) else part.stat().st_size for part in parts
+        )
+        self._index = 0
+        self._current: io.BufferedIOBase | None = None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("MultipartBody can only be rewound")
+        self.close()
+        self._index = 0
+        return 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunks: list[bytes] = []
+        remaining = size
+        while remaining != 0:
+            if self._current is None:
+                if self._index >= len(self._parts):
+                    break
+                part = self._parts[self._index]
+                self._index += 1
+                self._current = io.BytesIO(part) if isinstance(part, bytes) else part.open("rb")
+            chunk = self._current.read(remaining)
+            if not chunk:
+                self._current.close()
+                self._current = None
+                continue
+            chunks.append(chunk)
+            if remaining > 0:
+                remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+def encode_multipart(
+    fields: dict[str, str],
+    files: dict[str, tuple[str, str, bytes | Path]],
+) -> tuple[MultipartBody, str]:
+    """Encode form ``fields`` and ``files`` ({name: (filename, type, data or path)}).
+
+    File contents given as a Path are read from disk while the body is sent.
+    """
+    boundary = f"----adamjones-{os.urandom(12).hex()}"
+    parts: list[bytes | Path] = []
+    head = io.BytesIO()
+    for name, value in fields.items():
+        head.write(f"--{boundary}\r\n".encode())
+        head.write(f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode())
+        head.write(value.encode("utf-8"))
+        head.write(b"\r\n")
+    for name, (filename, content_type, data) in files.items():
+        safe_filename = filename.replace('"', "%22").replace("\r", "").replace("\n", "")
+        head.write(f"--{boundary}\r\n".encode())
+        head.write(
+            f'Content-Disposition: form-data; name="{name}"; filename="{safe_filename}"\r\n'.encode()
+        )
+        head.write(f"Content-Type: {content_type}\r\n\r\n".encode())
+        parts.extend([head.getvalue(), data])
+        head = io.BytesIO()
+        head.write(b"\r\n")
+    head.write(f"--{boundary}--\r\n".encode())
+    parts.append(head.getvalue())
+    return MultipartBody(parts), f"multipart/form-data; boundary={boundary}"
@@ -0,0 +1,1365 @@
+#!/usr/bin/env python3
+"""Local stand-in for the todos API worker (workers/todos-api).
+
+Serves the routes the refresh and sketch sync scripts use from a SQLite
+database built with the worker's D1 migrations, and stores uploaded objects
+under a local directory instead of R2, so fetch, upload and render timings
+can be measured offline:
+
+    python3 scripts/api_standin.py --todos 500 --sketches 5000 --latency-ms 80
+    python3 scripts/update_todo_snapshot.py --api-url http://127.0.0.1:8787/todos
+
+Routes, with the worker's response shapes, ETags and 304s: GET /, /health,
+/todos, /focus-cards, /sketches (``limit``/``before`` pages and the
+``updated_since``/``after`` change feed), /sketches/latest, POST
+/sketches/upload, the resumable /sketches/uploads routes (create, PUT parts,
+complete, DELETE to abort), PUT /sketches/:id/derivatives/:name, POST /todos,
+PATCH/DELETE /todos/:id, PATCH /focus-cards/:slot and PATCH/DELETE
+/sketches/:id (deletes leave a ``sketch_tombstones`` row for the change feed).
+Only POST /sketches, which registers an object uploaded out of band, answers
+404 like any unknown route. Stored objects are served from GET /objects/<key>,
+which is what ``image_url`` points at unless ``--public-base-url`` is given;
+parts of pending uploads are kept under ``objects/.uploads/`` until complete
+assembles them into the object.
+
+Measurement knobs: ``--latency-ms``/``--jitter-ms`` delay every response,
+``--error-rate`` answers that fraction of requests with ``--error-status``,
+``--drop-rate`` closes the connection without answering (what a stale
+keep-alive connection looks like to the client), and ``--bandwidth-kbps``
+caps request and response throughput. ``--todos``/``--sketches`` top the
+tables up to that many generated rows, the same rows for the same ``--seed``;
+generated sketches have no stored object behind their ``image_url``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime as dt
+import email.parser
+import email.policy
+import hashlib
+import json
+import mimetypes
+import random
+import re
+import shutil
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import SplitResult, parse_qs, quote, unquote, urlsplit
+
+from index_render import write_bytes_atomic
+
+ROOT = Path(__file__).resolve().parents[1]
+MIGRATIONS_DIR = ROOT / "workers" / "todos-api" / "migrations"
+DEFAULT_STATE_DIR = ROOT / ".cache" / "api-standin"
+DEFAULT_HOST = "127.0.0.1"
+# wrangler dev's port, so URLs written for `npx wrangler dev` work unchanged.
+DEFAULT_PORT = 8787
+
+FOCUS_CARD_SLOTS = ("primary-focus", "current-mode")
+MAX_FOCUS_CARD_LABEL_LENGTH = 80
+MAX_FOCUS_CARD_COPY_LENGTH = 280
+MAX_TODO_LENGTH = 280
+DEFAULT_SKETCH_PAGE_SIZE = 30
+MAX_SKETCH_PAGE_SIZE = 200
+MAX_SKETCH_NOTE_LENGTH = 280
+MAX_SKETCH_UPLOAD_BYTES = 12 * 1024 * 1024
+# The worker's R2 multipart limits: equal parts (all but the last) of 5 MiB.
+MAX_SKETCH_CHUNKED_UPLOAD_BYTES = 100 * 1024 * 1024
+SKETCH_UPLOAD_PART_BYTES = 5 * 1024 * 1024
+MAX_SKETCH_DERIVATIVE_BYTES = 8 * 1024 * 1024
+MAX_SKETCH_DERIVATIVES = 8
+# Multipart framing around the largest accepted file; bigger bodies are refused unread.
+MAX_REQUEST_BYTES = MAX_SKETCH_UPLOAD_BYTES + 1024 * 1024
+SKETCH_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/heic": "heic",
+    "image/heif": "heif",
+}
+SKETCH_DERIVATIVE_NAME_RE = re.compile(r"^(primary|w\d{2,4})\.(webp|avif)$")
+SKETCH_DERIVATIVE_CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif"}
+OBJECT_KEY_RE = re.compile(r"^[a-zA-Z0-9][a-zA-Z0-9/_\-.]{1,511}$")
+SKETCH_COLUMNS = (
+    "id, sketch_at, object_key, image_url, content_type, size_bytes, note, derivatives, "
+    "created_at, updated_at"
+)
+TODO_COLUMNS = "id, text, completed, created_at, updated_at"
+FOCUS_CARD_COLUMNS = "slot, label, front_text, back_text, created_at, updated_at"
+SKETCH_UPLOAD_COLUMNS = (
+    "upload_id, object_key, sketch_at, content_type, size_bytes, part_size, note"
+)
+# Object keys start with an alphanumeric, so pending parts never shadow an object.
+PARTS_DIRNAME = ".uploads"
+IO_CHUNK_BYTES = 16 * 1024
+
+_WORDS = (
+    "ink", "line", "study", "morning", "harbour", "cedar", "window", "figure", "light",
+    "shadow", "quick", "gesture", "bridge", "rain", "coffee", "sketch", "tree", "street",
+)
+
+Response = tuple[int, dict[str, str], bytes]
+
+
+class ApiError(Exception):
+    """A request the worker would reject; rendered as its ``{"error": {...}}`` body."""
+
+    def __init__(self, status: int, code: str, message: str, **details: object) -> None:
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.details = details
+
+
+@dataclass
+class Faults:
+    """Injected latency, errors, dropped connections and bandwidth cap."""
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    drop_rate: float = 0.0
+    bandwidth_kbps: float = 0.0
+    seed: int | None = None
+    _rng: random.Random = field(init=False, repr=False)
+    _lock: threading.Lock = field(init=False, repr=False, default_factory=threading.Lock)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)
+
+    def decide(self) -> tuple[float, str | None]:
+        """Delay in seconds and the fault ("drop", "error" or None) for the next request."""
+        with self._lock:
+            delay = self.latency_ms + self._rng.uniform(0.0, self.jitter_ms)
+            roll = self._rng.random()
+        if roll < self.drop_rate:
+            return delay / 1000.0, "drop"
+        if roll < self.drop_rate + self.error_rate:
+            return delay / 1000.0, "error"
+        return delay / 1000.0, None
+
+    def throttle(self, nbytes: int) -> None:
+        if self.bandwidth_kbps > 0:
+            time.sleep(nbytes * 8 / (self.bandwidth_kbps * 1000.0))
+
+
+def iso_timestamp(moment: dt.datetime) -> str:
+    """``Date.prototype.toISOString``: UTC with milliseconds."""
+    return (
+        moment.astimezone(dt.timezone.utc)
+        .isoformat(timespec="milliseconds")
+        .replace("+00:00", "Z")
+    )
+
+
+def iso_now() -> str:
+    return iso_timestamp(dt.datetime.now(dt.timezone.utc))
+
+
+def normalize_iso_timestamp(value: str | None) -> str | None:
+    """Canonical form of an ISO-8601 timestamp, or None; times without an offset are UTC."""
+    value = (value or "").strip()
+    if not value:
+        return None
+    if value[-1:] in ("Z", "z"):
+        value = value[:-1] + "+00:00"
+    try:
+        parsed = dt.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=dt.timezone.utc)
+    return iso_timestamp(parsed)
+
+
+def apply_migrations(db_path: Path, migrations_dir: Path = MIGRATIONS_DIR) -> list[str]:
+    """Apply the migrations not yet recorded in ``d1_migrations``, in file name order.
+
+    Each file runs in its own transaction, like ``wrangler d1 migrations apply``.
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    applied_now: list[str] = []
+    with contextlib.closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS d1_migrations ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, applied_at TEXT NOT NULL)"
+        )
+        conn.commit()
+        applied = {row[0] for row in conn.execute("SELECT name FROM d1_migrations")}
+        for path in sorted(migrations_dir.glob("*.sql")):
+            if path.name in applied:
+                continue
+            name = path.name.replace("'", "''")
+            conn.executescript(
+                "BEGIN;\n"
+                f"{path.read_text(encoding='utf-8')}\n;\n"
+                f"INSERT INTO d1_migrations (name, applied_at) VALUES ('{name}', '{iso_now()}');\n"
+                "COMMIT;"
+            )
+            applied_now.append(path.name)
+    return applied_now
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(count))
+
+
+def _seeded_uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def sketch_image_url(public_base_url: str, object_key: str) -> str:
+    encoded = "/".join(quote(segment, safe="") for segment in object_key.split("/"))
+    return f"{public_base_url}/{encoded}"
+
+
+def build_sketch_object_key(sketch_at: str, content_type: str, suffix: str) -> str:
+    moment = dt.datetime.fromisoformat(sketch_at.replace("Z", "+00:00"))
+    ext = SKETCH_EXTENSIONS.get(content_type, "img")
+    return f"sketches/{moment:%Y/%m/%Y-%m-%d-%H%M%S}-{suffix}.{ext}"
+
+
+def seed_dataset(
+    conn: sqlite3.Connection, todos: int, sketches: int, seed: int, public_base_url: str
+) -> tuple[int, int]:
+    """Top the todos and sketches tables up to ``todos``/``sketches`` generated rows.
+
+    Row ``n`` depends only on ``seed`` and ``n``, so growing a dataset keeps the
+    rows generated before. Returns how many rows of each were added.
+    """
+    now = dt.datetime.now(dt.timezone.utc).replace(microsecond=0)
+    have_todos = conn.execute("SELECT COUNT(*) FROM todos").fetchone()[0]
+    todo_rows = []
+    for n in range(have_todos, todos):
+        rng = random.Random(f"{seed}:todo:{n}")
+        created = now - dt.timedelta(minutes=rng.randrange(365 * 24 * 60))
+        updated = created + dt.timedelta(minutes=rng.randrange(7 * 24 * 60))
+        todo_rows.append(
+            (
+                _seeded_uuid(rng),
+                _words(rng, rng.randint(2, 9)),
+                int(rng.random() < 0.3),
+                iso_timestamp(created),
+                iso_timestamp(min(updated, now)),
+            )
+        )
+    conn.executemany(
+        "INSERT INTO todos (id, text, completed, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        todo_rows,
+    )
+
+    have_sketches = conn.execute("SELECT COUNT(*) FROM sketches").fetchone()[0]
+    sketch_rows = []
+    for n in range(have_sketches, sketches):
+        # About one sketch a day, going back from now.
+        rng = random.Random(f"{seed}:sketch:{n}")
+        sketch_at = iso_timestamp(now - dt.timedelta(days=n, minutes=rng.randrange(24 * 60)))
+        object_key = build_sketch_object_key(sketch_at, "image/jpeg", f"{n:08x}")
+        derivatives = []
+        if rng.random() < 0.5:
+            stem = object_key.rsplit(".", 1)[0]
+            for name, width in (("w320.webp", 320), ("w640.webp", 640), ("primary.webp", 1600)):
+                derivatives.append(
+                    {
+                        "name": name,
+                        "object_key": f"{stem}/{name}",
+                        "url": sketch_image_url(public_base_url, f"{stem}/{name}"),
+                        "content_type": "image/webp",
+                        "width": width,
+                        "height": width * 4 // 3,
+                        "size_bytes": width * 60,
+                    }
+                )
+        sketch_rows.append(
+            (
+                _seeded_uuid(rng),
+                sketch_at,
+                object_key,
+                sketch_image_url(public_base_url, object_key),
+                "image/jpeg",
+                rng.randint(200_000, 3_000_000),
+                _words(rng, rng.randint(0, 20))[:MAX_SKETCH_NOTE_LENGTH],
+                json.dumps(derivatives),
+                sketch_at,
+                sketch_at,
+            )
+        )
+    conn.executemany(
+        f"INSERT INTO sketches ({SKETCH_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        sketch_rows,
+    )
+    conn.commit()
+    return len(todo_rows), len(sketch_rows)
+
+
+def normalize_todo_row(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "text": row["text"],
+        "completed": row["completed"] == 1,
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def normalize_focus_card_row(row: sqlite3.Row) -> dict:
+    return {
+        "slot": row["slot"],
+        "label": row["label"],
+        "front": row["front_text"],
+        "back": row["back_text"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def _object_key_taken(conn: sqlite3.Connection, object_key: str) -> bool:
+    return (
+        conn.execute("SELECT id FROM sketches WHERE object_key = ?", (object_key,)).fetchone()
+        is not None
+    )
+
+
+def _sketch_derivatives(value: object) -> list[dict]:
+    if not isinstance(value, str) or not value:
+        return []
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        return []
+    if not isinstance(parsed, list):
+        return []
+    return [item for item in parsed if isinstance(item, dict) and item.get("name")]
+
+
+def normalize_sketch_row(row: sqlite3.Row | None) -> dict | None:
+    if row is None:
+        return None
+    return {
+        "id": row["id"],
+        "sketch_at": row["sketch_at"],
+        "object_key": row["object_key"],
+        "image_url": row["image_url"],
+        "content_type": row["content_type"],
+        "size_bytes": row["size_bytes"],
+        "note": row["note"] or "",
+        "derivatives": [
+            {key: derivative.get(key) for key in ("name", "url", "content_type", "width", "height")}
+            for derivative in _sketch_derivatives(row["derivatives"])
+        ],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+
+
+def _json_bytes(payload: object) -> bytes:
+    # JSON.stringify's spacing, so ETags compare equal to the worker's for the same rows.
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_response(payload: object, status: int = 200) -> Response:
+    return status, {"Content-Type": "application/json; charset=utf-8"}, _json_bytes(payload)
+
+
+def json_with_etag(payload: object, if_none_match: str | None) -> Response:
+    body = _json_bytes(payload)
+    etag = f'"{hashlib.sha256(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and any(
+        candidate.strip().removeprefix("W/") in ("*", etag)
+        for candidate in if_none_match.split(",")
+    ):
+        return 304, headers, b""
+    headers["Content-Type"] = "application/json; charset=utf-8"
+    return 200, headers, body
+
+
+def error_response(status: int, code: str, message: str, **details: object) -> Response:
+    return json_response({"error": {"code": code, "message": message, **details}}, status)
+
+
+def sketch_conflict() -> ApiError:
+    return ApiError(409, "CONFLICT", "A sketch already exists with this object key.")
+
+
+def upload_not_found() -> ApiError:
+    return ApiError(404, "NOT_FOUND", "Upload not found or already finished.")
+
+
+def parse_json_body(content_type: str, body: bytes) -> dict:
+    """The JSON object in ``body``, rejected like the worker's ``parseJson``."""
+    if "application/json" not in content_type:
+        raise ApiError(415, "UNSUPPORTED_MEDIA_TYPE", "Content-Type must be application/json.")
+    try:
+        value = json.loads(body)
+    except ValueError:
+        raise ApiError(400, "INVALID_JSON", "Malformed JSON body.") from None
+    return value if isinstance(value, dict) else {}
+
+
+def _text(value: object) -> str:
+    return value.strip() if isinstance(value, str) else ""
+
+
+def normalize_sketch_note(value: object) -> str:
+    if value is None or value == "":
+        return ""
+    if not isinstance(value, str):
+        raise ApiError(400, "VALIDATION_ERROR", "note must be a string.")
+    note = value.strip()
+    if len(note) > MAX_SKETCH_NOTE_LENGTH:
+        raise ApiError(
+            400, "VALIDATION_ERROR", f"note must be {MAX_SKETCH_NOTE_LENGTH} characters or less."
+        )
+    return note
+
+
+def normalize_focus_card_text(value: object, field_name: str, max_length: int) -> str:
+    if not isinstance(value, str):
+        raise ApiError(400, "VALIDATION_ERROR", f"{field_name} must be a string.")
+    text = value.strip()
+    if not text:
+        raise ApiError(400, "VALIDATION_ERROR", f"{field_name} is required.")
+    if len(text) > max_length:
+        raise ApiError(
+            400, "VALIDATION_ERROR", f"{field_name} must be {max_length} characters or less."
+        )
+    return text
+
+
+def _positive_int(value: object) -> int | None:
+    try:
+        number = int(str(value).strip())
+    except ValueError:
+        return None
+    return number if number > 0 else None
+
+
+def _sketch_limit(query: dict[str, list[str]]) -> int:
+    raw = query.get("limit", [""])[0]
+    if not raw:
+        return DEFAULT_SKETCH_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_SKETCH_PAGE_SIZE:
+        raise ApiError(
+            400,
+            "VALIDATION_ERROR",
+            f"Query parameter limit must be an integer between 1 and {MAX_SKETCH_PAGE_SIZE}.",
+        )
+    return limit
+
+
+@dataclass
+class FormPart:
+    data: bytes
+    filename: str | None = None
+    content_type: str = ""
+
+    @property
+    def text(self) -> str:
+        return self.data.decode("utf-8", errors="replace") if self.filename is None else ""
+
+
+def parse_multipart(content_type: str, body: bytes) -> dict[str, FormPart]:
+    """Fields of a multipart/form-data ``body``; the first part wins for repeated names."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    if not message.is_multipart():
+        raise ValueError("not a multipart body")
+    fields: dict[str, FormPart] = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if not name or name in fields:
+            continue
+        fields[name] = FormPart(
+            data=part.get_payload(decode=True) or b"",
+            filename=part.get_filename(),
+            content_type=part.get_content_type() if part.get("content-type") else "",
+        )
+    return fields
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        db_path: Path,
+        object_dir: Path,
+        public_base_url: str,
+        faults: Faults,
+        quiet: bool = False,
+    ) -> None:
+        super().__init__(address, StandinHandler)
+        self.db_path = db_path
+        self.object_dir = object_dir
+        self.public_base_url = public_base_url
+        self.faults = faults
+        self.quiet = quiet
+
+    def connect(self) -> sqlite3.Connection:
+        # One connection per request, like a D1 binding: no state shared between threads.
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def object_path(self, object_key: str) -> Path:
+        return self.object_dir / object_key
+
+    def put_object(self, object_key: str, data: bytes) -> None:
+        path = self.object_path(object_key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_bytes_atomic(path, data)
+
+    def delete_object(self, object_key: str) -> None:
+        self.object_path(object_key).unlink(missing_ok=True)
+
+    def part_path(self, upload_id: str, part_number: int) -> Path:
+        return self.object_dir / PARTS_DIRNAME / upload_id / f"{part_number}.part"
+
+    def discard_parts(self, upload_id: str) -> None:
+        shutil.rmtree(self.object_dir / PARTS_DIRNAME / upload_id, ignore_errors=True)
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so the scripts' pooled connections are exercised as against the worker.
+    protocol_version = "HTTP/1.1"
+    server: StandinServer
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_PUT(self) -> None:
+        self._handle("PUT")
+
+    def do_PATCH(self) -> None:
+        self._handle("PATCH")
+
+    def do_DELETE(self) -> None:
+        self._handle("DELETE")
+
+    def log_message(self, format: str, *args: object) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _read_body(self) -> bytes | None:
+        """The request body, or None when it is larger than any route accepts."""
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = 0
+        if length > MAX_REQUEST_BYTES:
+            return None
+        chunks = []
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(IO_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            self.server.faults.throttle(len(chunk))
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def _handle(self, method: str) -> None:
+        body = self._read_body()
+        delay, fault = self.server.faults.decide()
+        if delay:
+            time.sleep(delay)
+        if fault == "drop":
+            self.log_message('"%s" dropped', self.requestline)
+            self.close_connection = True
+            return
+        if body is None:
+            self.close_connection = True
+            response = error_response(413, "PAYLOAD_TOO_LARGE", "Request body is too large.")
+        elif fault == "error":
+            status = self.server.faults.error_status
+            response = error_response(status, "INJECTED_ERROR", "Injected by api_standin.")
+        else:
+            try:
+                response = self._route(method, urlsplit(self.path), body)
+            except ApiError as exc:
+                response = error_response(exc.status, exc.code, str(exc), **exc.details)
+            except Exception:
+                traceback.print_exc()
+                response = error_response(500, "INTERNAL_ERROR", "Unexpected server error.")
+        self._send(*response)
+
+    def _send(self, status: int, headers: dict[str, str], body: bytes) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        if self.command == "HEAD" or status == 304:
+            return
+        view = memoryview(body)
+        for start in range(0, len(body), IO_CHUNK_BYTES):
+            chunk = view[start : start + IO_CHUNK_BYTES]
+            self.server.faults.throttle(len(chunk))
+            self.wfile.write(chunk)
+
+    def _route(self, method: str, url: SplitResult, body: bytes) -> Response:
+        path = url.path
+        query = parse_qs(url.query)
+        if method == "GET":
+            if path == "/":
+                return json_response({"ok": True, "service": "todos-api"})
+            if path == "/health":
+                return json_response({"ok": True})
+            if path == "/todos":
+                return self._list_todos()
+            if path == "/focus-cards":
+                return self._list_focus_cards()
+            if path == "/sketches":
+                return self._list_sketches(query)
+            if path == "/sketches/latest":
+                return self._latest_sketch()
+            if path.startswith("/objects/"):
+                return self._get_object(unquote(path[len("/objects/") :]))
+        if method == "POST" and path == "/todos":
+            return self._create_todo(body)
+        todo_match = re.fullmatch(r"/todos/([^/]+)", path)
+        if todo_match and method == "PATCH":
+            return self._update_todo(unquote(todo_match.group(1)), body)
+        if todo_match and method == "DELETE":
+            return self._delete_todo(unquote(todo_match.group(1)))
+        focus_card_match = re.fullmatch(r"/focus-cards/([^/]+)", path)
+        if focus_card_match and method == "PATCH":
+            return self._update_focus_card(unquote(focus_card_match.group(1)), body)
+        if method == "POST" and path == "/sketches/upload":
+            return self._upload_sketch(body)
+        if method == "POST" and path == "/sketches/uploads":
+            return self._create_sketch_upload(body)
+        part_match = re.fullmatch(r"/sketches/uploads/([^/]+)/parts/(\d+)", path)
+        if method == "PUT" and part_match:
+            return self._upload_sketch_part(
+                unquote(part_match.group(1)), int(part_match.group(2)), body
+            )
+        complete_match = re.fullmatch(r"/sketches/uploads/([^/]+)/complete", path)
+        if method == "POST" and complete_match:
+            return self._complete_sketch_upload(unquote(complete_match.group(1)), body)
+        upload_match = re.fullmatch(r"/sketches/uploads/([^/]+)", path)
+        if method == "DELETE" and upload_match:
+            return self._abort_sketch_upload(unquote(upload_match.group(1)))
+        derivative_match = re.fullmatch(r"/sketches/([^/]+)/derivatives/([^/]+)", path)
+        if method == "PUT" and derivative_match:
+            return self._put_derivative(
+                unquote(derivative_match.group(1)), derivative_match.group(2), query, body
+            )
+        sketch_match = re.fullmatch(r"/sketches/([^/]+)", path)
+        if sketch_match and method == "PATCH":
+            return self._update_sketch(unquote(sketch_match.group(1)), body)
+        if sketch_match and method == "DELETE":
+            return self._delete_sketch(unquote(sketch_match.group(1)))
+        return error_response(404, "NOT_FOUND", "Route not found.")
+
+    def _json_body(self, body: bytes) -> dict:
+        return parse_json_body(self.headers.get("Content-Type") or "", body)
+
+    def _list_todos(self) -> Response:
+        with contextlib.closing(self.server.connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {TODO_COLUMNS} FROM todos ORDER BY updated_at DESC"
+            ).fetchall()
+        return json_with_etag(
+            {"data": [normalize_todo_row(row) for row in rows]}, self.headers.get("If-None-Match")
+        )
+
+    def _create_todo(self, body: bytes) -> Response:
+        text = _text(self._json_body(body).get("text"))
+        if not text:
+            raise ApiError(400, "VALIDATION_ERROR", "Todo text is required.")
+        if len(text) > MAX_TODO_LENGTH:
+            raise ApiError(
+                400, "VALIDATION_ERROR", f"Todo text must be {MAX_TODO_LENGTH} characters or less."
+            )
+        todo_id = str(uuid.uuid4())
+        now = iso_now()
+        with contextlib.closing(self.server.connect()) as conn:
+            with conn:
+                conn.execute(
+                    "INSERT INTO todos (id, text, completed, created_at, updated_at) "
+                    "VALUES (?, ?, 0, ?, ?)",
+                    (todo_id, text, now, now),
+                )
+        return json_response(
+            {
+                "data": {
+                    "id": todo_id,
+                    "text": text,
+                    "completed": False,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            },
+            201,
+        )
+
+    def _update_todo(self, todo_id: str, body: bytes) -> Response:
+        completed = self._json_body(body).get("completed")
+        if not isinstance(completed, bool):
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                "PATCH /todos/:id currently requires a boolean completed field.",
+            )
+        with contextlib.closing(self.server.connect()) as conn:
+            with conn:
+                updated = conn.execute(
+                    "UPDATE todos SET completed = ?, updated_at = ? WHERE id = ?",
+                    (int(completed), iso_now(), todo_id),
+                ).rowcount
+            if not updated:
+                raise ApiError(404, "NOT_FOUND", "Todo not found.")
+            row = conn.execute(
+                f"SELECT {TODO_COLUMNS} FROM todos WHERE id = ?", (todo_id,)
+            ).fetchone()
+        return json_response({"data": normalize_todo_row(row)})
+
+    def _delete_todo(self, todo_id: str) -> Response:
+        with contextlib.closing(self.server.connect()) as conn:
+            with conn:
+                deleted = conn.execute("DELETE FROM todos WHERE id = ?", (todo_id,)).rowcount
+        if not deleted:
+            raise ApiError(404, "NOT_FOUND", "Todo not found.")
+        return json_response({"data": {"id": todo_id, "deleted": True}})
+
+    def _list_focus_cards(self) -> Response:
+        with contextlib.closing(self.server.connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {FOCUS_CARD_COLUMNS} FROM focus_cards ORDER BY CASE slot "
+                "WHEN 'primary-focus' THEN 1 WHEN 'current-mode' THEN 2 ELSE 99 END"
+            ).fetchall()
+        return json_with_etag(
+            {"data": [normalize_focus_card_row(row) for row in rows]},
+            self.headers.get("If-None-Match"),
+        )
+
+    def _update_focus_card(self, slot: str, body: bytes) -> Response:
+        slot = slot.strip()
+        if slot not in FOCUS_CARD_SLOTS:
+            raise ApiError(404, "NOT_FOUND", "Focus card not found.")
+        payload = self._json_body(body)
+        if not payload.keys() & {"label", "front", "back"}:
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                "PATCH /focus-cards/:slot requires at least one of label, front, or back.",
+            )
+        changes = {}
+        for field_name, column, max_length in (
+            ("label", "label", MAX_FOCUS_CARD_LABEL_LENGTH),
+            ("front", "front_text", MAX_FOCUS_CARD_COPY_LENGTH),
+            ("back", "back_text", MAX_FOCUS_CARD_COPY_LENGTH),
+        ):
+            if field_name in payload:
+                changes[column] = normalize_focus_card_text(
+                    payload[field_name], field_name, max_length
+                )
+
+        with contextlib.closing(self.server.connect()) as conn:
+            with conn:
+                assignments = ", ".join(f"{column} = ?" for column in changes)
+                updated = conn.execute(
+                    f"UPDATE focus_cards SET {assignments}, updated_at = ? WHERE slot = ?",
+                    (*changes.values(), iso_now(), slot),
+                ).rowcount
+            if not updated:
+                raise ApiError(404, "NOT_FOUND", "Focus card not found.")
+            row = conn.execute(
+                f"SELECT {FOCUS_CARD_COLUMNS} FROM focus_cards WHERE slot = ?", (slot,)
+            ).fetchone()
+        return json_response({"data": normalize_focus_card_row(row)})
+
+    def _list_sketches(self, query: dict[str, list[str]]) -> Response:
+        limit = _sketch_limit(query)
+        updated_since_param = query.get("updated_since", [""])[0].strip()
+        if updated_since_param:
+            return self._list_sketch_changes(query, limit, updated_since_param)
+
+        before_param = query.get("before", [""])[0].strip()
+        with contextlib.closing(self.server.connect()) as conn:
+            if before_param:
+                before = normalize_iso_timestamp(before_param)
+                if before is None:
+                    raise ApiError(
+                        400,
+                        "VALIDATION_ERROR",
+                        "Query parameter before must be a valid timestamp.",
+                    )
+                rows = conn.execute(
+                    f"SELECT {SKETCH_COLUMNS} FROM sketches WHERE sketch_at < ? "
+                    "ORDER BY sketch_at DESC, created_at DESC LIMIT ?",
+                    (before, limit),
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"SELECT {SKETCH_COLUMNS} FROM sketches "
+                    "ORDER BY sketch_at DESC, created_at DESC LIMIT ?",
+                    (limit,),
+                ).fetchall()
+        return json_with_etag(
+            {"data": [normalize_sketch_row(row) for row in rows]},
+            self.headers.get("If-None-Match"),
+        )
+
+    def _list_sketch_changes(
+        self, query: dict[str, list[str]], limit: int, updated_since_param: str
+    ) -> Response:
+        updated_since = normalize_iso_timestamp(updated_since_param)
+        if updated_since is None:
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                "Query parameter updated_since must be a valid timestamp.",
+            )
+        after = query.get("after", [""])[0].strip()
+        deleted_since_param = query.get("deleted_since", [""])[0].strip()
+        deleted_since = (
+            normalize_iso_timestamp(deleted_since_param) if deleted_since_param else updated_since
+        )
+        if deleted_since is None:
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                "Query parameter deleted_since must be a valid timestamp.",
+            )
+        deleted_after = query.get("deleted_after", [""])[0].strip()
+        with contextlib.closing(self.server.connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {SKETCH_COLUMNS} FROM sketches "
+                "WHERE updated_at > ? OR (updated_at = ? AND id > ?) "
+                "ORDER BY updated_at ASC, id ASC LIMIT ?",
+                (updated_since, updated_since, after, limit),
+            ).fetchall()
+            tombstones = conn.execute(
+                "SELECT id, deleted_at FROM sketch_tombstones "
+                "WHERE deleted_at > ? OR (deleted_at = ? AND id > ?) "
+                "ORDER BY deleted_at ASC, id ASC LIMIT ?",
+                (deleted_since, deleted_since, deleted_after, limit),
+            ).fetchall()
+        sketches = [normalize_sketch_row(row) for row in rows]
+        cursor = {
+            "updated_since": sketches[-1]["updated_at"] if sketches else updated_since,
+            "after": sketches[-1]["id"] if sketches else after,
+            "deleted_since": tombstones[-1]["deleted_at"] if tombstones else deleted_since,
+            "deleted_after": tombstones[-1]["id"] if tombstones else deleted_after,
+        }
+        more = len(sketches) == limit or len(tombstones) == limit
+        return json_with_etag(
+            {
+                "data": sketches,
+                "deleted": [row["id"] for row in tombstones],
+                "cursor": cursor,
+                "next": cursor if more else None,
+            },
+            self.headers.get("If-None-Match"),
+        )
+
+    def _latest_sketch(self) -> Response:
+        with contextlib.closing(self.server.connect()) as conn:
+            row = conn.execute(
+                f"SELECT {SKETCH_COLUMNS} FROM sketches "
+                "ORDER BY sketch_at DESC, created_at DESC LIMIT 1"
+            ).fetchone()
+        return json_response({"data": normalize_sketch_row(row)})
+
+    def _get_object(self, object_key: str) -> Response:
+        if not OBJECT_KEY_RE.match(object_key) or ".." in object_key:
+            return error_response(404, "NOT_FOUND", "Object not found.")
+        path = self.server.object_path(object_key)
+        if not path.is_file():
+            return error_response(404, "NOT_FOUND", "Object not found.")
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        return 200, {"Content-Type": content_type}, path.read_bytes()
+
+    def _upload_sketch(self, body: bytes) -> Response:
+        content_type = self.headers.get("Content-Type") or ""
+        if "multipart/form-data" not in content_type:
+            raise ApiError(
+                415,
+                "UNSUPPORTED_MEDIA_TYPE",
+                "Content-Type must be multipart/form-data for uploads.",
+            )
+        try:
+            form = parse_multipart(content_type, body)
+        except ValueError:
+            raise ApiError(400, "INVALID_FORM_DATA", "Malformed multipart payload.") from None
+
+        file = form.get("file")
+        if file is None or file.filename is None:
+            raise ApiError(400, "VALIDATION_ERROR", "Form field file is required.")
+        if not 0 < len(file.data) <= MAX_SKETCH_UPLOAD_BYTES:
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                f"Uploaded image must be between 1 byte and {MAX_SKETCH_UPLOAD_BYTES} bytes.",
+            )
+
+        def field_text(name: str) -> str:
+            part = form.get(name)
+            return part.text.strip() if part is not None else ""
+
+        upload_content_type = (field_text("content_type") or file.content_type).lower()
+        if upload_content_type not in SKETCH_EXTENSIONS:
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                "Only JPEG, PNG, WEBP, HEIC, and HEIF uploads are supported.",
+            )
+        sketch_at = normalize_iso_timestamp(field_text("sketch_at") or iso_now())
+        if sketch_at is None:
+            raise ApiError(400, "VALIDATION_ERROR", "sketch_at must be a valid timestamp.")
+        note = normalize_sketch_note(field_text("note"))
+        object_key = field_text("object_key") or build_sketch_object_key(
+            sketch_at, upload_content_type, uuid.uuid4().hex[:8]
+        )
+        if not OBJECT_KEY_RE.match(object_key) or ".." in object_key:
+            raise ApiError(400, "VALIDATION_ERROR", "object_key must be a safe object path.")
+
+        with contextlib.closing(self.server.connect()) as conn:
+            if _object_key_taken(conn, object_key):
+                raise sketch_conflict()
+            self.server.put_object(object_key, file.data)
+            return self._insert_uploaded_sketch(
+                conn, sketch_at, object_key, upload_content_type, len(file.data), note
+            )
+
+    def _insert_uploaded_sketch(
+        self,
+        conn: sqlite3.Connection,
+        sketch_at: str,
+        object_key: str,
+        content_type: str,
+        size_bytes: int,
+        note: str,
+    ) -> Response:
+        """Insert the row for an object already stored; 201 with the row, or 409."""
+        sketch_id = str(uuid.uuid4())
+        now = iso_now()
+        image_url = sketch_image_url(self.server.public_base_url, object_key)
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO sketches (id, sketch_at, object_key, image_url, content_type, "
+                    "size_bytes, note, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        sketch_id,
+                        sketch_at,
+                        object_key,
+                        image_url,
+                        content_type,
+                        size_bytes,
+                        note,
+                        now,
+                        now,
+                    ),
+                )
+        except sqlite3.IntegrityError:
+            raise sketch_conflict() from None
+        row = conn.execute(
+            f"SELECT {SKETCH_COLUMNS} FROM sketches WHERE id = ?", (sketch_id,)
+        ).fetchone()
+        return json_response({"data": normalize_sketch_row(row)}, 201)
+
+    # Resumable uploads: create returns an upload id and the part size, parts are
+    # PUT in any order (and may be retried), and complete assembles them into the
+    # object and inserts the row exactly like /sketches/upload.
+    def _create_sketch_upload(self, body: bytes) -> Response:
+        payload = self._json_body(body)
+        content_type = _text(payload.get("content_type")).lower()
+        if content_type not in SKETCH_EXTENSIONS:
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                "Only JPEG, PNG, WEBP, HEIC, and HEIF uploads are supported.",
+            )
+        size_bytes = _positive_int(payload.get("size_bytes"))
+        if size_bytes is None or size_bytes > MAX_SKETCH_CHUNKED_UPLOAD_BYTES:
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                f"size_bytes must be between 1 and {MAX_SKETCH_CHUNKED_UPLOAD_BYTES}.",
+            )
+        sketch_at = normalize_iso_timestamp(_text(payload.get("sketch_at")) or iso_now())
+        if sketch_at is None:
+            raise ApiError(400, "VALIDATION_ERROR", "sketch_at must be a valid timestamp.")
+        note = normalize_sketch_note(payload.get("note"))
+        object_key = _text(payload.get("object_key")) or build_sketch_object_key(
+            sketch_at, content_type, uuid.uuid4().hex[:8]
+        )
+        if not OBJECT_KEY_RE.match(object_key) or ".." in object_key:
+            raise ApiError(400, "VALIDATION_ERROR", "object_key must be a safe object path.")
+
+        with contextlib.closing(self.server.connect()) as conn:
+            if _object_key_taken(conn, object_key):
+                raise sketch_conflict()
+            pending = conn.execute(
+                "SELECT upload_id FROM sketch_uploads WHERE object_key = ?", (object_key,)
+            ).fetchone()
+            if pending is not None:
+                raise ApiError(
+                    409,
+                    "UPLOAD_IN_PROGRESS",
+                    "An upload for this object key is already in progress.",
+                    upload_id=pending["upload_id"],
+                )
+            upload_id = uuid.uuid4().hex
+            with conn:
+                conn.execute(
+                    "INSERT INTO sketch_uploads (upload_id, object_key, sketch_at, content_type, "
+                    "size_bytes, part_size, note, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        upload_id,
+                        object_key,
+                        sketch_at,
+                        content_type,
+                        size_bytes,
+                        SKETCH_UPLOAD_PART_BYTES,
+                        note,
+                        iso_now(),
+                    ),
+                )
+        return json_response(
+            {
+                "data": {
+                    "upload_id": upload_id,
+                    "object_key": object_key,
+                    "part_size": SKETCH_UPLOAD_PART_BYTES,
+                    "part_count": -(-size_bytes // SKETCH_UPLOAD_PART_BYTES),
+                }
+            },
+            201,
+        )
+
+    def _pending_upload(self, conn: sqlite3.Connection, upload_id: str) -> sqlite3.Row:
+        pending = conn.execute(
+            f"SELECT {SKETCH_UPLOAD_COLUMNS} FROM sketch_uploads WHERE upload_id = ?",
+            (upload_id,),
+        ).fetchone()
+        if pending is None:
+            raise upload_not_found()
+        return pending
+
+    def _finish_upload(self, conn: sqlite3.Connection, upload_id: str) -> None:
+        with conn:
+            conn.execute("DELETE FROM sketch_uploads WHERE upload_id = ?", (upload_id,))
+        self.server.discard_parts(upload_id)
+
+    def _upload_sketch_part(self, upload_id: str, part_number: int, body: bytes) -> Response:
+        with contextlib.closing(self.server.connect()) as conn:
+            pending = self._pending_upload(conn, upload_id)
+        part_count = -(-pending["size_bytes"] // pending["part_size"])
+        if not 1 <= part_number <= part_count:
+            raise ApiError(
+                400, "VALIDATION_ERROR", f"Part number must be between 1 and {part_count}."
+            )
+        expected = (
+            pending["part_size"]
+            if part_number < part_count
+            else pending["size_bytes"] - pending["part_size"] * (part_count - 1)
+        )
+        if len(body) != expected:
+            raise ApiError(
+                400, "VALIDATION_ERROR", f"Part {part_number} must be exactly {expected} bytes."
+            )
+        path = self.server.part_path(upload_id, part_number)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_bytes_atomic(path, body)
+        etag = hashlib.sha256(body).hexdigest()
+        return json_response({"data": {"part_number": part_number, "etag": etag}})
+
+    def _complete_sketch_upload(self, upload_id: str, body: bytes) -> Response:
+        with contextlib.closing(self.server.connect()) as conn:
+            pending = self._pending_upload(conn, upload_id)
+            payload = self._json_body(body)
+            part_count = -(-pending["size_bytes"] // pending["part_size"])
+            parts = []
+            for part in payload.get("parts") if isinstance(payload.get("parts"), list) else ():
+                number = _positive_int(part.get("part_number")) if isinstance(part, dict) else None
+                etag = _text(part.get("etag")) if isinstance(part, dict) else ""
+                if number is not None and etag:
+                    parts.append((number, etag))
+            parts.sort()
+            if [number for number, _ in parts] != list(range(1, part_count + 1)):
+                raise ApiError(
+                    400,
+                    "VALIDATION_ERROR",
+                    f"parts must list part_number and etag for all {part_count} parts.",
+                )
+            chunks = []
+            for number, etag in parts:
+                try:
+                    data = self.server.part_path(upload_id, number).read_bytes()
+                except FileNotFoundError:
+                    data = None
+                # R2 refuses to complete with a missing part or a stale etag.
+                if data is None or hashlib.sha256(data).hexdigest() != etag:
+                    raise ApiError(
+                        400, "INVALID_PART", f"Part {number} was not uploaded with that etag."
+                    )
+                chunks.append(data)
+
+            object_key = pending["object_key"]
+            if _object_key_taken(conn, object_key):
+                self._finish_upload(conn, upload_id)
+                raise sketch_conflict()
+            self.server.put_object(object_key, b"".join(chunks))
+            self._finish_upload(conn, upload_id)
+            return self._insert_uploaded_sketch(
+                conn,
+                pending["sketch_at"],
+                object_key,
+                pending["content_type"],
+                pending["size_bytes"],
+                pending["note"],
+            )
+
+    def _abort_sketch_upload(self, upload_id: str) -> Response:
+        with contextlib.closing(self.server.connect()) as conn:
+            self._pending_upload(conn, upload_id)
+            self._finish_upload(conn, upload_id)
+        return json_response({"data": {"upload_id": upload_id, "aborted": True}})
+
+    def _update_sketch(self, sketch_id: str, body: bytes) -> Response:
+        note = self._json_body(body).get("note")
+        if not isinstance(note, str):
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                "PATCH /sketches/:id currently requires a string note field.",
+            )
+        note = normalize_sketch_note(note)
+        with contextlib.closing(self.server.connect()) as conn:
+            with conn:
+                updated = conn.execute(
+                    "UPDATE sketches SET note = ?, updated_at = ? WHERE id = ?",
+                    (note, iso_now(), sketch_id),
+                ).rowcount
+            if not updated:
+                raise ApiError(404, "NOT_FOUND", "Sketch not found.")
+            row = conn.execute(
+                f"SELECT {SKETCH_COLUMNS} FROM sketches WHERE id = ?", (sketch_id,)
+            ).fetchone()
+        return json_response({"data": normalize_sketch_row(row)})
+
+    def _delete_sketch(self, sketch_id: str) -> Response:
+        with contextlib.closing(self.server.connect()) as conn:
+            row = conn.execute(
+                "SELECT id, object_key, derivatives FROM sketches WHERE id = ?", (sketch_id,)
+            ).fetchone()
+            if row is None:
+                raise ApiError(404, "NOT_FOUND", "Sketch not found.")
+            # The tombstone is what lets change-feed clients drop the row.
+            with conn:
+                conn.execute("DELETE FROM sketches WHERE id = ?", (sketch_id,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO sketch_tombstones (id, deleted_at) VALUES (?, ?)",
+                    (sketch_id, iso_now()),
+                )
+        object_keys = [row["object_key"]] + [
+            derivative.get("object_key") for derivative in _sketch_derivatives(row["derivatives"])
+        ]
+        for object_key in object_keys:
+            if object_key and OBJECT_KEY_RE.match(object_key) and ".." not in object_key:
+                self.server.delete_object(object_key)
+        return json_response({"data": {"id": sketch_id, "deleted": True}})
+
+    def _put_derivative(
+        self, sketch_id: str, name: str, query: dict[str, list[str]], body: bytes
+    ) -> Response:
+        name_match = SKETCH_DERIVATIVE_NAME_RE.match(name)
+        if not name_match:
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                "Derivative name must be primary.<ext> or w<width>.<ext> (webp or avif).",
+            )
+        try:
+            width = int(query.get("width", [""])[0])
+            height = int(query.get("height", [""])[0])
+        except ValueError:
+            width = height = 0
+        if width <= 0 or height <= 0:
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                "Query parameters width and height must be positive integers.",
+            )
+        if not 0 < len(body) <= MAX_SKETCH_DERIVATIVE_BYTES:
+            raise ApiError(
+                400,
+                "VALIDATION_ERROR",
+                f"Derivative body must be between 1 and {MAX_SKETCH_DERIVATIVE_BYTES} bytes.",
+            )
+
+        with contextlib.closing(self.server.connect()) as conn:
+            row = conn.execute(
+                f"SELECT {SKETCH_COLUMNS} FROM sketches WHERE id = ?", (sketch_id,)
+            ).fetchone()
+            if row is None:
+                raise ApiError(404, "NOT_FOUND", "Sketch not found.")
+            derivatives = [
+                derivative
+                for derivative in _sketch_derivatives(row["derivatives"])
+                if derivative["name"] != name
+            ]
+            if len(derivatives) >= MAX_SKETCH_DERIVATIVES:
+                raise ApiError(
+                    400,
+                    "VALIDATION_ERROR",
+                    f"A sketch can have at most {MAX_SKETCH_DERIVATIVES} derivatives.",
+                )
+            object_key = f"{re.sub(r'[.][^./]+$', '', row['object_key'])}/{name}"
+            self.server.put_object(object_key, body)
+            derivatives.append(
+                {
+                    "name": name,
+                    "object_key": object_key,
+                    "url": sketch_image_url(self.server.public_base_url, object_key),
+                    "content_type": SKETCH_DERIVATIVE_CONTENT_TYPES[name_match.group(2)],
+                    "width": width,
+                    "height": height,
+                    "size_bytes": len(body),
+                }
+            )
+            derivatives.sort(key=lambda derivative: derivative.get("width") or 0)
+            with conn:
+                conn.execute(
+                    "UPDATE sketches SET derivatives = ?, updated_at = ? WHERE id = ?",
+                    (json.dumps(derivatives), iso_now(), sketch_id),
+                )
+            row = conn.execute(
+                f"SELECT {SKETCH_COLUMNS} FROM sketches WHERE id = ?", (sketch_id,)
+            ).fetchone()
+        return json_response({"data": normalize_sketch_row(row)})
+
+
+def _rate(value: str) -> float:
+    rate = float(value)
+    if not 0.0 <= rate <= 1.0:
+        raise argparse.ArgumentTypeError("must be between 0 and 1")
+    return rate
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Serve a local SQLite-backed stand-in for the todos API worker."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port.")
+    parser.add_argument(
+        "--state-dir",
+        type=Path,
+        default=DEFAULT_STATE_DIR,
+        help="Holds api.sqlite3 and the objects/ directory that stands in for R2.",
+    )
+    parser.add_argument(
+        "--reset", action="store_true", help="Delete the database and stored objects first."
+    )
+    parser.add_argument(
+        "--public-base-url",
+        default="",
+        help="Base of image_url for stored objects (default: this server's /objects).",
+    )
+    parser.add_argument("--todos", type=int, default=0, help="Top todos up to this many rows.")
+    parser.add_argument(
+        "--sketches", type=int, default=0, help="Top sketches up to this many rows."
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Seed for generated rows and faults.")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--jitter-ms", type=float, default=0.0, help="Extra uniform random delay up to this."
+    )
+    parser.add_argument("--error-rate", type=_rate, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument(
+        "--drop-rate",
+        type=_rate,
+        default=0.0,
+        help="Fraction of requests whose connection is closed without a response.",
+    )
+    parser.add_argument(
+        "--bandwidth-kbps",
+        type=float,
+        default=0.0,
+        help="Cap request and response bodies at this many kilobits per second (0: no cap).",
+    )
+    parser.add_argument("--quiet", action="store_true", help="Do not log each request.")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    db_path = args.state_dir / "api.sqlite3"
+    object_dir = args.state_dir / "objects"
+    if args.reset:
+        for suffix in ("", "-wal", "-shm"):
+            db_path.with_name(db_path.name + suffix).unlink(missing_ok=True)
+        shutil.rmtree(object_dir, ignore_errors=True)
+    object_dir.mkdir(parents=True, exist_ok=True)
+
+    for name in apply_migrations(db_path):
+        print(f"Applied migration {name}")
+
+    faults = Faults(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        drop_rate=args.drop_rate,
+        bandwidth_kbps=args.bandwidth_kbps,
+        seed=args.seed,
+    )
+    server = StandinServer((args.host, args.port), db_path, object_dir, "", faults, args.quiet)
+    host, port = server.server_address[:2]
+    server.public_base_url = (
+        args.public_base_url.rstrip("/") or f"http://{host}:{port}/objects"
+    )
+
+    with contextlib.closing(server.connect()) as conn:
+        added_todos, added_sketches = seed_dataset(
+            conn, args.todos, args.sketches, args.seed, server.public_base_url
+        )
+        todo_count = conn.execute("SELECT COUNT(*) FROM todos").fetchone()[0]
+        sketch_count = conn.execute("SELECT COUNT(*) FROM sketches").fetchone()[0]
+    print(
+        f"{todo_count} todos ({added_todos} generated), "
+        f"{sketch_count} sketches ({added_sketches} generated) in {db_path}"
+    )
+    print(f"Serving the todos API stand-in on http://{host}:{port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
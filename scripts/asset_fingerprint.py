@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Content-hash fingerprinting for the files of a static site build.
+
+Every asset below the site root's top level (js/, data/, images/, ...) is
+renamed to ``name.<hash>.ext``, and references to it in HTML, CSS, JS and JSON
+are rewritten to the new name. Text assets are fingerprinted after their own
+references have been rewritten, so a changed image also changes the hash of
+every file that points at it. Top-level files (index.html, favicon.ico) keep
+their names because they are entry points requested by fixed URL.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import posixpath
+import re
+from typing import Mapping
+
+HASH_LENGTH = 10
+TEXT_SUFFIXES = {".html", ".css", ".js", ".mjs", ".json", ".svg", ".webmanifest"}
+# Relative URLs in these files resolve against the referring file; in JS and
+# JSON they resolve against the page, which is served from the site root.
+_FILE_RELATIVE_SUFFIXES = {".html", ".css", ".svg"}
+
+_URL_RE = re.compile(
+    r"(?<![\w./@~-])"
+    r"(?P<path>(?:\.{1,2}/|/)?[\w@~-][\w@~.-]*(?:/[\w@~.-]+)*\.[A-Za-z0-9]+)"
+    r"(?P<query>\?[^\s\"'<>(),]*)?"
+)
+
+
+def fingerprinted_name(rel: str, digest: str) -> str:
+    directory, name = posixpath.split(rel)
+    stem, dot, suffix = name.rpartition(".")
+    hashed = f"{stem}.{digest[:HASH_LENGTH]}.{suffix}" if dot else f"{name}.{digest[:HASH_LENGTH]}"
+    return posixpath.join(directory, hashed)
+
+
+def is_fingerprintable(rel: str) -> bool:
+    return "/" in rel
+
+
+def _suffix(rel: str) -> str:
+    return posixpath.splitext(rel)[1].lower()
+
+
+def resolve_reference(
+    path: str, referrer: str, aliases: Mapping[str, str]
+) -> str | None:
+    """Site-relative path that ``path`` (as written in ``referrer``) points to."""
+    if path.startswith("/"):
+        rel = path.lstrip("/")
+    else:
+        base = posixpath.dirname(referrer) if _suffix(referrer) in _FILE_RELATIVE_SUFFIXES else ""
+        rel = posixpath.normpath(posixpath.join(base, path))
+    if rel.startswith("../") or rel == "..":
+        return None
+    for alias, target in aliases.items():
+        if rel.startswith(alias + "/"):
+            return target + rel[len(alias) :]
+    return rel
+
+
+def rewrite_references(
+    text: str,
+    referrer: str,
+    names: Mapping[str, str],
+    aliases: Mapping[str, str],
+) -> str:
+    """Point every reference in ``text`` at the fingerprinted name in ``names``.
+
+    Only the file name is replaced, so references through an alias directory
+    keep using the alias; cache-busting query strings are dropped.
+    """
+
+    def replace(match: re.Match[str]) -> str:
+        path = match.group("path")
+        rel = resolve_reference(path, referrer, aliases)
+        if rel is None or rel not in names or names[rel] == rel:
+            return match.group(0)
+        directory = path[: len(path) - len(posixpath.basename(path))]
+        return directory + posixpath.basename(names[rel])
+
+    return _URL_RE.sub(replace, text)
+
+
+def referenced_assets(
+    text: str, referrer: str, assets: Mapping[str, object], aliases: Mapping[str, str]
+) -> set[str]:
+    found = set()
+    for match in _URL_RE.finditer(text):
+        rel = resolve_reference(match.group("path"), referrer, aliases)
+        if rel is not None and rel in assets and rel != referrer:
+            found.add(rel)
+    return found
+
+
+def fingerprint_assets(
+    digests: Mapping[str, str],
+    texts: dict[str, bytes],
+    aliases: Mapping[str, str],
+) -> dict[str, str]:
+    """Return {source rel: output rel} and rewrite references in ``texts`` in place.
+
+    ``digests`` holds the content hash of every file; ``texts`` the (already
+    minified) bytes of the files whose references should be rewritten.
+    """
+    names: dict[str, str] = {}
+    visiting: set[str] = set()
+
+    def visit(rel: str) -> None:
+        if rel in names or rel in visiting:
+            return
+        visiting.add(rel)
+        digest = digests[rel]
+        if rel in texts and _suffix(rel) in TEXT_SUFFIXES:
+            try:
+                text = texts[rel].decode("utf-8")
+            except UnicodeDecodeError:
+                text = None
+            if text is not None:
+                for dep in sorted(referenced_assets(text, rel, digests, aliases)):
+                    visit(dep)
+                updated = rewrite_references(text, rel, names, aliases)
+                if updated != text:
+                    texts[rel] = updated.encode("utf-8")
+                    digest = hashlib.sha256(texts[rel]).hexdigest()
+        visiting.discard(rel)
+        names[rel] = fingerprinted_name(rel, digest) if is_fingerprintable(rel) else rel
+
+    for rel in sorted(digests):
+        visit(rel)
+    return names
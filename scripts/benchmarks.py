@@ -0,0 +1,599 @@
+#!/usr/bin/env python3
+"""Benchmarks for the render and normalize hot paths of the refresh scripts.
+
+Every benchmark builds a deterministic synthetic input, runs its target
+repeatedly for at least ``--min-time`` seconds and reports operations per
+second, then runs it once more under tracemalloc for peak memory. At
+``--scale 1`` the inputs are 10k todos, 50k sketch rows, 100k calendar
+events and a multi-MB index.html.
+
+    python3 scripts/benchmarks.py                    # run and compare
+    python3 scripts/benchmarks.py --save-baseline    # record this machine's numbers
+    python3 scripts/benchmarks.py --only holidays --scale 0.1
+
+Results are compared with the baseline file, which is machine-specific and
+kept in .cache/. A benchmark whose ops/sec drops by more than ``--threshold``
+(a fraction) is reported as a regression, and the exit status is 1.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import gc
+import json
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+import recurrence
+import sync_daily_sketch_from_photos as sketch_sync
+import update_focus_cards_snapshot as focus_cards
+import update_sketches_manifest as sketches_manifest
+import update_todo_snapshot as todos
+import update_upcoming_holidays as holidays
+from index_render import (
+    FOCUS_CARDS_SNAPSHOT,
+    SKETCH_SNAPSHOT,
+    TODO_SNAPSHOT,
+    UPCOMING_HOLIDAYS,
+    end_marker,
+    render_index,
+    splice_blocks,
+    start_marker,
+    write_text_atomic,
+)
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_BASELINE = ROOT / ".cache" / "bench-baseline.json"
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MIN_TIME = 1.0
+DEFAULT_SEED = 1
+
+TODO_COUNT = 10_000
+FOCUS_CARD_COUNT = 10_000
+SKETCH_ROW_COUNT = 50_000
+CALENDAR_EVENT_COUNT = 100_000
+RECURRING_EVENT_COUNT = 500
+INDEX_PADDING_BYTES = 4_000_000
+HOLIDAYS_TODAY = dt.date(2026, 6, 1)
+HOLIDAYS_HORIZON_DAYS = 180
+
+_WORDS = (
+    "sketch ink paper review draft garden ship read call plan fix write walk bake "
+    "email taxes invoice backup deploy refactor notes studio cafe harbour mountain"
+).split()
+_RRULES = (
+    "FREQ=YEARLY",
+    "FREQ=YEARLY;BYMONTH=2;BYDAY=3MO",
+    "FREQ=YEARLY;BYMONTH=5;BYDAY=-2MO",
+    "FREQ=YEARLY;BYMONTH=9;BYDAY=1MO",
+    "FREQ=YEARLY;BYMONTH=10;BYDAY=2MO",
+    "FREQ=MONTHLY;BYDAY=-1FR",
+    "FREQ=MONTHLY;BYMONTHDAY=15",
+    "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH",
+)
+_REGION_SUFFIXES = ("", "", "", " (BC)", " (AB, ON)", " (QC)", " (Observed)")
+
+
+Runner = Callable[[], object]
+
+
+@dataclass
+class Benchmark:
+    name: str
+    description: str
+    # Builds the inputs (outside the timer) and returns the timed callable.
+    setup: Callable[[float, random.Random, Path], Runner]
+
+
+@dataclass
+class Result:
+    name: str
+    ops_per_sec: float
+    mean_ms: float
+    iterations: int
+    peak_bytes: int
+
+
+def _words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(count))
+
+
+def _scaled(count: int, scale: float) -> int:
+    return max(1, int(count * scale))
+
+
+def make_todos(count: int, rng: random.Random) -> list[dict[str, object]]:
+    return [
+        {
+            "id": f"todo-{n}",
+            "text": f"{_words(rng, rng.randint(2, 9))} <{n}> & more",
+            "completed": rng.random() < 0.3,
+        }
+        for n in range(count)
+    ]
+
+
+def make_focus_cards(count: int, rng: random.Random) -> list[dict[str, object]]:
+    slots = [*focus_cards.SLOT_ORDER, "archived", "draft", ""]
+    cards = [
+        {
+            "slot": rng.choice(slots),
+            "label": _words(rng, 2),
+            "front": _words(rng, 12),
+            "back": _words(rng, 20),
+        }
+        for _ in range(max(0, count - len(focus_cards.SLOT_ORDER)))
+    ]
+    # The renderer needs every slot; keep them last so they win the slot lookup.
+    cards.extend(
+        {
+            "slot": slot,
+            "label": _words(rng, 2),
+            "front": _words(rng, 12),
+            "back": _words(rng, 20),
+        }
+        for slot in focus_cards.SLOT_ORDER
+    )
+    return cards
+
+
+def make_sketch_rows(count: int, rng: random.Random) -> list[dict]:
+    start = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+    rows: list[dict] = []
+    for n in range(count):
+        sketch_at = start + dt.timedelta(minutes=rng.randrange(6 * 365 * 24 * 60))
+        key = f"sketches/{sketch_at:%Y/%m}/sketch-{n:06d}"
+        row = {
+            "id": f"sketch-{n}",
+            "sketch_at": sketch_at.isoformat().replace("+00:00", "Z"),
+            "image_url": f"https://images.example.com/{key}.jpg",
+            "note": _words(rng, rng.randint(0, 30)),
+        }
+        if rng.random() < 0.5:
+            row["derivatives"] = [
+                {"url": f"https://images.example.com/{key}/w{width}.webp", "width": width}
+                for width in (320, 640, 960)
+            ]
+        if rng.random() < 0.01:
+            row["image_url"] = "not a url"
+        rows.append(row)
+    return rows
+
+
+def make_calendar_events(count: int, rng: random.Random) -> list[dict]:
+    events: list[dict] = []
+    recurring = min(count, RECURRING_EVENT_COUNT)
+    for n in range(recurring):
+        day = dt.date(2020, 1, 1) + dt.timedelta(days=rng.randrange(365))
+        events.append(
+            {
+                "title": f"Holiday {n}{rng.choice(_REGION_SUFFIXES)}",
+                "allDay": True,
+                "date": day.isoformat(),
+                "recurrence": rng.choice(_RRULES),
+            }
+        )
+    start = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+    for n in range(count - recurring):
+        moment = start + dt.timedelta(minutes=rng.randrange(5 * 365 * 24 * 60))
+        if rng.random() < 0.5:
+            events.append(
+                {
+                    "title": f"{_words(rng, 3)}{rng.choice(_REGION_SUFFIXES)}",
+                    "allDay": True,
+                    "date": moment.date().isoformat(),
+                }
+            )
+        else:
+            events.append(
+                {
+                    "title": _words(rng, 3),
+                    "allDay": False,
+                    "start": moment.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                }
+            )
+    return events
+
+
+def make_index_html(padding_bytes: int, rng: random.Random) -> str:
+    """An index.html with every snapshot block, padded with ``padding_bytes`` of markup."""
+    filler: list[str] = []
+    size = 0
+    while size < padding_bytes:
+        line = f'      <p class="note">{_words(rng, 14)}</p>\n'
+        filler.append(line)
+        size += len(line)
+    half = len(filler) // 2
+    blocks = "".join(
+        f"      {start_marker(name)}\n      <p>placeholder</p>\n      {end_marker(name)}\n"
+        for name in (TODO_SNAPSHOT, FOCUS_CARDS_SNAPSHOT, SKETCH_SNAPSHOT, UPCOMING_HOLIDAYS)
+    )
+    return (
+        "<!doctype html>\n<html>\n  <body>\n"
+        + "".join(filler[:half])
+        + blocks
+        + "".join(filler[half:])
+        + "  </body>\n</html>\n"
+    )
+
+
+def _setup_todo_snapshot(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    items = make_todos(_scaled(TODO_COUNT, scale), rng)
+    return lambda: todos.build_snapshot(items)
+
+
+def _setup_focus_snapshot(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    items = make_focus_cards(_scaled(FOCUS_CARD_COUNT, scale), rng)
+    return lambda: focus_cards.build_snapshot(items)
+
+
+def _setup_sketch_snapshot(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    rows = make_sketch_rows(_scaled(SKETCH_ROW_COUNT, scale), rng)
+    items = sketches_manifest._normalize_items(rows, len(rows))
+    manifest_path = workdir / "sketches-manifest.json"
+    manifest_path.write_text(json.dumps({"version": 1, "items": items}), encoding="utf-8")
+    return lambda: sketch_sync._build_snapshot_html(manifest_path)
+
+
+def _setup_normalize_items(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    rows = make_sketch_rows(_scaled(SKETCH_ROW_COUNT, scale), rng)
+    return lambda: sketches_manifest._normalize_items(rows, len(rows))
+
+
+def _setup_normalize_items_newest(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    rows = make_sketch_rows(_scaled(SKETCH_ROW_COUNT, scale), rng)
+    return lambda: sketches_manifest._normalize_items(rows, 30)
+
+
+def _setup_occurrence_index(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    events = make_calendar_events(_scaled(CALENDAR_EVENT_COUNT, scale), rng)
+    through = HOLIDAYS_TODAY + dt.timedelta(days=HOLIDAYS_HORIZON_DAYS)
+
+    def run() -> holidays.OccurrenceIndex:
+        _clear_recurrence_caches()
+        return holidays._build_occurrence_index(events, through)
+
+    return run
+
+
+def _prebuilt_occurrence_index(count: int, rng: random.Random) -> holidays.OccurrenceIndex:
+    through = HOLIDAYS_TODAY + dt.timedelta(days=HOLIDAYS_HORIZON_DAYS)
+    return holidays._build_occurrence_index(make_calendar_events(count, rng), through)
+
+
+def _setup_render_index(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    index = _prebuilt_occurrence_index(_scaled(CALENDAR_EVENT_COUNT, scale), rng)
+    return lambda: holidays.render_occurrences(index, HOLIDAYS_TODAY, HOLIDAYS_HORIZON_DAYS, 8)
+
+
+def _setup_render_regions(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    index = _prebuilt_occurrence_index(_scaled(CALENDAR_EVENT_COUNT, scale), rng)
+    return lambda: holidays.render_regions(
+        index, holidays.REGIONS, HOLIDAYS_TODAY, HOLIDAYS_HORIZON_DAYS, 8
+    )
+
+
+def _setup_recurrence_expand(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    rules = [
+        (rng.choice(_RRULES), dt.date(2020, 1, 1) + dt.timedelta(days=rng.randrange(365)))
+        for _ in range(_scaled(RECURRING_EVENT_COUNT, scale))
+    ]
+    window_start = dt.date(2026, 1, 1)
+    window_end = dt.date(2030, 12, 31)
+
+    def run() -> int:
+        _clear_recurrence_caches()
+        return sum(
+            len(holidays._expand_recurrence_dates(rule, base, window_start, window_end))
+            for rule, base in rules
+        )
+
+    return run
+
+
+def _setup_splice_blocks(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    text = make_index_html(_scaled(INDEX_PADDING_BYTES, scale), rng)
+    index = _prebuilt_occurrence_index(200, rng)
+    fragment = holidays.render_occurrences(index, HOLIDAYS_TODAY, HOLIDAYS_HORIZON_DAYS, 8)
+    return lambda: splice_blocks(text, {UPCOMING_HOLIDAYS: fragment})
+
+
+def _setup_render_index_file(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    index_path = workdir / "index.html"
+    index_path.write_text(
+        make_index_html(_scaled(INDEX_PADDING_BYTES, scale), rng), encoding="utf-8"
+    )
+    todo_batches = [make_todos(_scaled(TODO_COUNT, scale) // 10 or 1, rng) for _ in range(2)]
+    index = _prebuilt_occurrence_index(200, rng)
+    holiday_fragments = [
+        holidays.render_occurrences(
+            index, HOLIDAYS_TODAY + dt.timedelta(days=turn), HOLIDAYS_HORIZON_DAYS, 8
+        )
+        for turn in range(2)
+    ]
+    state = {"turn": 0}
+
+    def run() -> list[str]:
+        # Alternate inputs so every call really rewrites the file.
+        state["turn"] ^= 1
+        turn = state["turn"]
+        return render_index(
+            index_path,
+            {
+                TODO_SNAPSHOT: lambda: todos.build_snapshot(todo_batches[turn]),
+                UPCOMING_HOLIDAYS: lambda: holiday_fragments[turn],
+            },
+        )
+
+    return run
+
+
+def _setup_update_html(scale: float, rng: random.Random, workdir: Path) -> Runner:
+    index_path = workdir / "index.html"
+    index_path.write_text(
+        make_index_html(_scaled(INDEX_PADDING_BYTES, scale), rng), encoding="utf-8"
+    )
+    batches = [make_todos(_scaled(TODO_COUNT, scale) // 10 or 1, rng) for _ in range(2)]
+    state = {"turn": 0}
+
+    def run() -> bool:
+        # Alternate inputs so every call really rewrites the file.
+        state["turn"] ^= 1
+        return todos.update_html(index_path, batches[state["turn"]])
+
+    return run
+
+
+def _clear_recurrence_caches() -> None:
+    recurrence.compile_rule.cache_clear()
+    recurrence.parse_recurrence.cache_clear()
+    recurrence.year_occurrences.cache_clear()
+
+
+BENCHMARKS = (
+    Benchmark("todos.build_snapshot", "10k todos to snapshot HTML", _setup_todo_snapshot),
+    Benchmark(
+        "focus_cards.build_snapshot",
+        "10k focus-card rows to snapshot HTML",
+        _setup_focus_snapshot,
+    ),
+    Benchmark(
+        "sketches._build_snapshot_html",
+        "50k-item manifest to snapshot HTML",
+        _setup_sketch_snapshot,
+    ),
+    Benchmark("sketches._normalize_items", "50k rows, keep all", _setup_normalize_items),
+    Benchmark(
+        "sketches._normalize_items.newest", "50k rows, keep 30", _setup_normalize_items_newest
+    ),
+    Benchmark(
+        "holidays._build_occurrence_index",
+        "100k events, cold recurrence caches",
+        _setup_occurrence_index,
+    ),
+    Benchmark(
+        "holidays.render_occurrences", "prebuilt 100k-event index, one region", _setup_render_index
+    ),
+    Benchmark(
+        "holidays.render_regions",
+        "prebuilt 100k-event index, every region in one walk",
+        _setup_render_regions,
+    ),
+    Benchmark(
+        "holidays._expand_recurrence_dates",
+        "500 rules over a 5-year window, cold caches",
+        _setup_recurrence_expand,
+    ),
+    Benchmark(
+        "index_render.splice_blocks", "splice into a 4 MB index.html", _setup_splice_blocks
+    ),
+    Benchmark(
+        "index_render.render_index",
+        "render two blocks and atomically rewrite a 4 MB index.html",
+        _setup_render_index_file,
+    ),
+    Benchmark(
+        "todos.update_html",
+        "render and atomically rewrite a 4 MB index.html",
+        _setup_update_html,
+    ),
+)
+
+
+def measure(fn: Runner, min_time: float, max_iterations: int) -> tuple[int, float]:
+    """(iterations, seconds) after one warm-up call, running for at least ``min_time``."""
+    fn()
+    iterations = 0
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    started = time.perf_counter()
+    try:
+        while True:
+            fn()
+            iterations += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_time or iterations >= max_iterations:
+                return iterations, elapsed
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def peak_memory(fn: Runner) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(
+    bench: Benchmark, scale: float, seed: int, min_time: float, max_iterations: int
+) -> Result:
+    workdir = Path(tempfile.mkdtemp(prefix="bench-"))
+    try:
+        fn = bench.setup(scale, random.Random(seed), workdir)
+        iterations, elapsed = measure(fn, min_time, max_iterations)
+        peak = peak_memory(fn)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return Result(
+        name=bench.name,
+        ops_per_sec=iterations / elapsed,
+        mean_ms=elapsed / iterations * 1000,
+        iterations=iterations,
+        peak_bytes=peak,
+    )
+
+
+def load_baseline(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_baseline(path: Path, results: list[Result], scale: float, seed: int) -> None:
+    payload = {
+        "generated_at": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scale": scale,
+        "seed": seed,
+        "results": {
+            result.name: {"ops_per_sec": result.ops_per_sec, "peak_bytes": result.peak_bytes}
+            for result in results
+        },
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_text_atomic(path, json.dumps(payload, indent=2, sort_keys=True) + "\n")
+
+
+def _format_bytes(count: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if count < 1024:
+            return f"{count:.0f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GB"
+
+
+def compare(result: Result, baseline: dict, threshold: float) -> tuple[str, bool]:
+    """Change against the baseline as text, and whether it is a regression."""
+    previous = (baseline.get("results") or {}).get(result.name)
+    if not isinstance(previous, dict) or not previous.get("ops_per_sec"):
+        return "no baseline", False
+    change = result.ops_per_sec / float(previous["ops_per_sec"]) - 1
+    regressed = change < -threshold
+    return f"{change:+.1%}{'  REGRESSION' if regressed else ''}", regressed
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the render and normalize hot paths against a stored baseline."
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        default=[],
+        help="Run benchmarks whose name contains this text (repeatable).",
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiplier for every synthetic input size."
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=DEFAULT_MIN_TIME,
+        help="Seconds each benchmark runs for (after one warm-up call).",
+    )
+    parser.add_argument(
+        "--max-iterations", type=int, default=10_000, help="Stop a benchmark after this many calls."
+    )
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Allowed ops/sec drop against the baseline, as a fraction (0.25 = 25%%).",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write these results to --baseline instead of comparing against it.",
+    )
+    parser.add_argument("--json", type=Path, default=None, help="Also write results as JSON here.")
+    parser.add_argument("--list", action="store_true", help="List benchmarks and exit.")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.scale <= 0:
+        raise SystemExit("--scale must be > 0")
+    if args.min_time <= 0 or args.max_iterations < 1:
+        raise SystemExit("--min-time must be > 0 and --max-iterations >= 1")
+
+    selected = [
+        bench
+        for bench in BENCHMARKS
+        if not args.only or any(text in bench.name for text in args.only)
+    ]
+    if args.list:
+        for bench in selected:
+            print(f"{bench.name:38} {bench.description}")
+        return 0
+    if not selected:
+        raise SystemExit(f"No benchmark matches {', '.join(args.only)}")
+
+    baseline = {} if args.save_baseline else load_baseline(args.baseline)
+    if baseline and (baseline.get("scale"), baseline.get("seed")) != (args.scale, args.seed):
+        print(
+            f"Baseline {args.baseline} was recorded at scale={baseline.get('scale')} "
+            f"seed={baseline.get('seed')}; comparisons may not be meaningful."
+        )
+
+    results: list[Result] = []
+    regressions: list[str] = []
+    print(f"{'benchmark':38} {'ops/sec':>10} {'mean':>11} {'peak mem':>10}  vs baseline")
+    for bench in selected:
+        result = run_benchmark(bench, args.scale, args.seed, args.min_time, args.max_iterations)
+        results.append(result)
+        change, regressed = compare(result, baseline, args.threshold)
+        if regressed:
+            regressions.append(result.name)
+        print(
+            f"{result.name:38} {result.ops_per_sec:10.2f} {result.mean_ms:8.2f} ms "
+            f"{_format_bytes(result.peak_bytes):>10}  {change}"
+        )
+
+    if args.json:
+        args.json.write_text(
+            json.dumps([asdict(result) for result in results], indent=2) + "\n", encoding="utf-8"
+        )
+    if args.save_baseline:
+        save_baseline(args.baseline, results, args.scale, args.seed)
+        print(f"Saved baseline for {len(results)} benchmark(s) to {args.baseline}")
+        return 0
+    if regressions:
+        print(
+            f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: "
+            + ", ".join(regressions)
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""Build a deployable dist/ tree from public/.
+
+HTML, CSS and JSON are minified, and every text asset gets .gz and (when the
+brotli module is installed) .br siblings at maximum compression. Files whose
+source content hash matches the previous build are skipped; the rest are
+processed in a process pool. Images and other binaries are hard-linked (or
+copied) unchanged, and symlinked aliases such as images/hacker-news are
+recreated as symlinks.
+
+The HTML minifier is conservative: whitespace runs collapse to one space,
+whitespace between block-level tags is dropped, <pre>/<textarea>/<script>
+bodies are left alone, and the snapshot marker comments are kept on their own
+lines so index_render can still splice blocks in the built file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from asset_fingerprint import fingerprint_assets
+from index_render import write_bytes_atomic
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_SOURCE = ROOT / "public"
+DEFAULT_DIST = ROOT / "dist"
+DEFAULT_STATE = ROOT / ".cache" / "dist-build-state.json"
+COMPRESSIBLE_SUFFIXES = {".html", ".css", ".js", ".mjs", ".json", ".svg", ".txt", ".xml", ".ico", ".webmanifest"}
+PRECOMPRESSED_SUFFIXES = (".gz", ".br")
+ASSET_MANIFEST_NAME = "asset-manifest.json"
+HEADERS_NAME = "_headers"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+# Below this size a compressed sibling saves less than the extra request header costs.
+MIN_COMPRESS_BYTES = 512
+
+_BLOCK_TAGS = (
+    "html|head|body|title|meta|link|style|script|noscript|main|header|footer|nav|section|"
+    "article|aside|div|p|h[1-6]|ul|ol|li|dl|dt|dd|figure|figcaption|form|fieldset|legend|"
+    "table|thead|tbody|tfoot|tr|td|th|picture|source|template|dialog|details|summary|br|hr"
+)
+_RAW_RE = re.compile(
+    r"(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)", re.IGNORECASE | re.DOTALL
+)
+_MARKER_RE = re.compile(r"<!-- [A-Z0-9_]+_(?:START|END) -->")
+_HTML_TOKEN_RE = re.compile(r"<!--.*?-->|<[^>]*>|[^<]+|<", re.DOTALL)
+_TAG_WS_RE = re.compile(r"(\"[^\"]*\"|'[^']*')|\s+")
+_BETWEEN_BLOCKS_RE = re.compile(
+    rf"(</?(?:{_BLOCK_TAGS})\b[^>]*>|<!doctype[^>]*>) +(?=</?(?:{_BLOCK_TAGS})\b)",
+    re.IGNORECASE,
+)
+_CSS_TOKEN_RE = re.compile(
+    r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|(\s+)", re.DOTALL
+)
+_CSS_PUNCT_RE = re.compile(r"\s*([{};,>])\s*|(:)\s+")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Minify and precompress public/ into dist/.")
+    parser.add_argument("--source", type=Path, default=DEFAULT_SOURCE)
+    parser.add_argument("--dist", type=Path, default=DEFAULT_DIST)
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Worker processes for minify/compress (defaults to the CPU count).",
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        default=DEFAULT_STATE,
+        help="Per-file hashes and sizes from the previous build.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild every file even if its content hash is unchanged.",
+    )
+    parser.add_argument(
+        "--no-fingerprint",
+        action="store_true",
+        help="Keep original file names instead of content-hashed ones.",
+    )
+    parser.add_argument(
+        "--quiet",
+        action="store_true",
+        help="Only print the summary line.",
+    )
+    return parser.parse_args()
+
+
+def _brotli():
+    try:
+        import brotli  # type: ignore
+    except ImportError:
+        return None
+    return brotli
+
+
+def minify_css(css: str) -> str:
+    def collapse(match: re.Match[str]) -> str:
+        string, comment, space = match.groups()
+        if string:
+            return string
+        return "" if comment else " "
+
+    collapsed = _CSS_TOKEN_RE.sub(collapse, css)
+    # Tighten punctuation outside strings only. A space before ":" is left
+    # alone because it is a descendant combinator in selectors (".a :hover").
+    parts = re.split(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')", collapsed)
+    for i in range(0, len(parts), 2):
+        parts[i] = _CSS_PUNCT_RE.sub(lambda m: m.group(1) or m.group(2), parts[i])
+        parts[i] = parts[i].replace(";}", "}")
+    return "".join(parts).strip()
+
+
+def _minify_markup(text: str) -> str:
+    out: list[str] = []
+    for token in _HTML_TOKEN_RE.findall(text):
+        if token.startswith("<!--"):
+            if _MARKER_RE.fullmatch(token):
+                out.append(f"\n{token}\n")
+        elif token.startswith("<") and len(token) > 1:
+            tag = _TAG_WS_RE.sub(lambda m: m.group(1) or " ", token)
+            # Only drop the space before "/>" after a quoted value; after an
+            # unquoted one the slash would become part of the value.
+            out.append(re.sub(r'(["\'])\s*(/?>)$|\s+(>)$', r"\1\2\3", tag))
+        else:
+            out.append(re.sub(r"\s+", " ", token))
+    joined = "".join(out)
+    joined = _BETWEEN_BLOCKS_RE.sub(r"\1", joined)
+    # Whitespace next to a marker line carries no meaning.
+    return re.sub(r"[ \t]*\n[ \t\n]*", "\n", joined)
+
+
+def minify_html(html: str) -> str:
+    parts: list[str] = []
+    cursor = 0
+    for match in _RAW_RE.finditer(html):
+        # The open and close tags stay with the surrounding markup so the
+        # whitespace around them is collapsed like any other block tag.
+        parts.append(_minify_markup(html[cursor : match.end(1)]))
+        body = match.group(3)
+        parts.append(minify_css(body) if match.group(2).lower() == "style" else body)
+        cursor = match.start(4)
+    parts.append(_minify_markup(html[cursor:]))
+    return "".join(parts).strip() + "\n"
+
+
+def minify_json(text: str) -> str:
+    try:
+        payload = json.loads(text)
+    except json.JSONDecodeError:
+        return text
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+MINIFIERS = {".html": minify_html, ".css": minify_css, ".json": minify_json}
+
+
+def _sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def minify_bytes(rel: str, raw: bytes) -> bytes:
+    minifier = MINIFIERS.get(Path(rel).suffix.lower())
+    if minifier is None:
+        return raw
+    try:
+        return minifier(raw.decode("utf-8")).encode("utf-8")
+    except UnicodeDecodeError:
+        return raw
+
+
+def write_text_output(dest: str, data: bytes, use_brotli: bool) -> dict:
+    """Write ``data`` to ``dest`` plus its compressed siblings.
+
+    Runs in a worker process; returns the compressed sizes for the report.
+    """
+    dest_path = Path(dest)
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    write_bytes_atomic(dest_path, data)
+
+    result: dict[str, int | None] = {"gz": None, "br": None}
+    gz_path = dest_path.with_name(dest_path.name + ".gz")
+    br_path = dest_path.with_name(dest_path.name + ".br")
+    if len(data) >= MIN_COMPRESS_BYTES:
+        gz = gzip.compress(data, compresslevel=9, mtime=0)
+        write_bytes_atomic(gz_path, gz)
+        result["gz"] = len(gz)
+        brotli = _brotli() if use_brotli else None
+        if brotli is not None:
+            br = brotli.compress(data, quality=11)
+            write_bytes_atomic(br_path, br)
+            result["br"] = len(br)
+    for path, size in ((gz_path, result["gz"]), (br_path, result["br"])):
+        if size is None:
+            path.unlink(missing_ok=True)
+    return result
+
+
+def _link_or_copy(source: Path, dest: Path) -> None:
+    if dest.exists() and os.path.samefile(source, dest):
+        return
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dest.with_name(f".{dest.name}.tmp")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, dest)
+
+
+def scan_source(source: Path) -> tuple[dict[str, Path], dict[str, str]]:
+    """Return (files, symlinked directories) keyed by source-relative POSIX path."""
+    files: dict[str, Path] = {}
+    links: dict[str, str] = {}
+    for dirpath, dirnames, filenames in os.walk(source):
+        current = Path(dirpath)
+        for name in list(dirnames):
+            path = current / name
+            if path.is_symlink():
+                links[path.relative_to(source).as_posix()] = os.readlink(path)
+                dirnames.remove(name)
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        names = set(filenames)
+        for name in filenames:
+            if name.startswith("."):
+                continue
+            # Precompressed siblings in the source are rebuilt here.
+            if name.endswith(PRECOMPRESSED_SUFFIXES) and name[:-3] in names:
+                continue
+            path = current / name
+            if path.is_symlink():
+                links[path.relative_to(source).as_posix()] = os.readlink(path)
+                continue
+            files[path.relative_to(source).as_posix()] = path
+    return files, links
+
+
+def _load_state(path: Path) -> dict[str, dict]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _is_fresh(entry: dict | None, digest: str, dest: Path, use_brotli: bool) -> bool:
+    if not isinstance(entry, dict) or entry.get("output") != digest or not dest.exists():
+        return False
+    if entry.get("gz") is not None and not dest.with_name(dest.name + ".gz").exists():
+        return False
+    if entry.get("gz") is not None and use_brotli != (entry.get("br") is not None):
+        return False
+    if entry.get("br") is not None and not dest.with_name(dest.name + ".br").exists():
+        return False
+    return True
+
+
+def write_cache_headers(dist: Path, source: Path, names: dict[str, str]) -> bool:
+    """Write a _headers file marking fingerprinted directories immutable.
+
+    Every file below the top level is fingerprinted, so whole directories can
+    be cached for a year; entry points must always be revalidated. Rules from
+    a _headers file in the source tree are kept first.
+    """
+    directories = sorted({out.split("/", 1)[0] for rel, out in names.items() if out != rel})
+    lines = []
+    source_headers = source / HEADERS_NAME
+    if source_headers.exists():
+        lines.append(source_headers.read_text(encoding="utf-8").rstrip("\n"))
+        lines.append("")
+    lines.append("# Generated by scripts/build_dist.py")
+    for directory in directories:
+        lines.extend([f"/{directory}/*", f"  Cache-Control: {IMMUTABLE_CACHE_CONTROL}"])
+    for entry in ("/", "/index.html", f"/{ASSET_MANIFEST_NAME}"):
+        lines.extend([entry, f"  Cache-Control: {REVALIDATE_CACHE_CONTROL}"])
+    content = "\n".join(lines) + "\n"
+    path = dist / HEADERS_NAME
+    if path.exists() and path.read_text(encoding="utf-8") == content:
+        return False
+    path.write_text(content, encoding="utf-8")
+    return True
+
+
+def write_asset_manifest(dist: Path, names: dict[str, str]) -> bool:
+    assets = {rel: out for rel, out in sorted(names.items()) if out != rel}
+    content = json.dumps({"version": 1, "assets": assets}, indent=2) + "\n"
+    path = dist / ASSET_MANIFEST_NAME
+    if path.exists() and path.read_text(encoding="utf-8") == content:
+        return False
+    path.write_text(content, encoding="utf-8")
+    return True
+
+
+def prune(dist: Path, keep: set[str]) -> int:
+    """Remove files in ``dist`` that the current build did not produce."""
+    removed = 0
+    for dirpath, dirnames, filenames in os.walk(dist, topdown=False):
+        current = Path(dirpath)
+        for name in filenames + [d for d in dirnames if (current / d).is_symlink()]:
+            path = current / name
+            rel = path.relative_to(dist).as_posix()
+            if rel in keep:
+                continue
+            path.unlink()
+            removed += 1
+        if current != dist and not any(current.iterdir()):
+            current.rmdir()
+    return removed
+
+
+def _format_result(rel: str, out_rel: str, entry: dict) -> str:
+    target = rel if out_rel == rel else f"{rel} => {out_rel}"
+    parts = [f"{target}: {entry['bytes']} -> {entry['out']}"]
+    if entry.get("gz") is not None:
+        parts.append(f"gz {entry['gz']}")
+    if entry.get("br") is not None:
+        parts.append(f"br {entry['br']}")
+    return ", ".join(parts)
+
+
+def main() -> int:
+    args = parse_args()
+    source: Path = args.source
+    dist: Path = args.dist
+    if not source.is_dir():
+        raise SystemExit(f"Missing source tree: {source}")
+    dist.mkdir(parents=True, exist_ok=True)
+
+    use_brotli = _brotli() is not None
+    previous = {} if args.force else _load_state(args.state)
+    files, links = scan_source(source)
+    files.pop(HEADERS_NAME, None)
+    aliases = {
+        rel: posixpath.normpath(posixpath.join(posixpath.dirname(rel), target))
+        for rel, target in links.items()
+    }
+
+    # Minifying is cheap, so every text file is minified up front; the
+    # per-file state then skips the expensive compression of unchanged output.
+    sizes: dict[str, int] = {}
+    digests: dict[str, str] = {}
+    texts: dict[str, bytes] = {}
+    for rel, path in files.items():
+        raw = path.read_bytes()
+        sizes[rel] = len(raw)
+        if path.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+            texts[rel] = minify_bytes(rel, raw)
+            digests[rel] = _sha256_bytes(texts[rel])
+        else:
+            digests[rel] = _sha256_bytes(raw)
+
+    if args.no_fingerprint:
+        names = {rel: rel for rel in files}
+    else:
+        names = fingerprint_assets(digests, texts, aliases)
+        for rel, data in texts.items():
+            digests[rel] = _sha256_bytes(data)
+
+    state: dict[str, dict] = {}
+    keep: set[str] = set(links) | {ASSET_MANIFEST_NAME, HEADERS_NAME}
+    text_jobs: dict[str, str] = {}
+    copied: list[str] = []
+    skipped = 0
+    for rel, path in files.items():
+        out_rel = names[rel]
+        dest = dist / out_rel
+        keep.update({out_rel, f"{out_rel}.gz", f"{out_rel}.br"})
+        if _is_fresh(previous.get(out_rel), digests[rel], dest, use_brotli):
+            state[out_rel] = previous[out_rel]
+            skipped += 1
+            continue
+        entry = {"source": rel, "output": digests[rel], "bytes": sizes[rel], "gz": None, "br": None}
+        if rel in texts:
+            entry["out"] = len(texts[rel])
+            text_jobs[rel] = out_rel
+        else:
+            _link_or_copy(path, dest)
+            entry["out"] = sizes[rel]
+            copied.append(rel)
+        state[out_rel] = entry
+
+    for rel, target in links.items():
+        dest = dist / rel
+        if dest.is_symlink() and os.readlink(dest) == target:
+            continue
+        if dest.is_dir() and not dest.is_symlink():
+            shutil.rmtree(dest)
+        else:
+            dest.unlink(missing_ok=True)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.symlink(target, dest)
+
+    started = time.monotonic()
+    if text_jobs:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = {
+                rel: pool.submit(write_text_output, str(dist / out_rel), texts[rel], use_brotli)
+                for rel, out_rel in text_jobs.items()
+            }
+            for rel, future in futures.items():
+                state[text_jobs[rel]].update(future.result())
+    elapsed = time.monotonic() - started
+
+    if not args.no_fingerprint:
+        write_asset_manifest(dist, names)
+        write_cache_headers(dist, source, names)
+    removed = prune(dist, keep)
+    args.state.parent.mkdir(parents=True, exist_ok=True)
+    args.state.write_text(json.dumps(state, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    if not args.quiet:
+        for rel in sorted(text_jobs):
+            print(_format_result(rel, text_jobs[rel], state[text_jobs[rel]]))
+    if not use_brotli:
+        print("brotli module not installed; wrote .gz siblings only.", file=sys.stderr)
+
+    text_state = [state[names[rel]] for rel in texts]
+    before = sum(entry["bytes"] for entry in text_state)
+    after = sum(entry["out"] for entry in text_state)
+    gz_total = sum(entry["gz"] or entry["out"] for entry in text_state)
+    fingerprinted = sum(1 for rel, out in names.items() if out != rel)
+    print(
+        f"Built {len(text_jobs)} text file(s) in {elapsed:.2f}s, linked {len(copied)} binary file(s), "
+        f"skipped {skipped} unchanged, pruned {removed}, fingerprinted {fingerprinted}. "
+        f"Text assets: {before} -> {after} bytes minified, {gz_total} gzipped."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
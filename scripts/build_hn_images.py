@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""Build responsive variants of the Hacker News thumbnails used in index.html.
+
+Every ``<img class="hn-image">`` in the page is rewritten into a
+``<picture class="hn-picture">`` with AVIF and WebP ``srcset`` candidates at
+bounded widths, plus intrinsic width/height so the card does not reflow while
+the image loads. The original file name is kept in ``data-source`` so reruns
+can rebuild the picture from the full-size source.
+
+Variants are content-addressed (named after the source's SHA-256), so
+identical sources share one set of files and only new or changed sources are
+re-encoded. Encoding runs in a process pool, one task per source image.
+
+Requires Pillow (``pip install Pillow``); AVIF needs Pillow >= 11.2 or the
+``pillow-avif-plugin`` package and is skipped with a warning otherwise.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import posixpath
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from html import escape
+from pathlib import Path
+
+from index_render import write_bytes_atomic, write_text_atomic
+from sketch_ledger import file_sha256
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_INDEX = ROOT / "public" / "index.html"
+DEFAULT_CACHE = ROOT / ".cache" / "hn-variants.json"
+VARIANT_DIRNAME = "variants"
+DEFAULT_WIDTHS = (320, 640, 960)
+FORMATS = ("avif", "webp")
+QUALITY = {"avif": 50, "webp": 74}
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+# Rendered widths of .hn-image in the page CSS (108px below 900px, 88px otherwise).
+DEFAULT_SIZES = "(max-width: 900px) 108px, 88px"
+
+_TAG_RE = re.compile(
+    r'<picture class="hn-picture">.*?</picture>|<img class="hn-image"[^>]*>',
+    re.DOTALL,
+)
+_IMG_RE = re.compile(r"<img\b[^>]*>", re.DOTALL)
+_ATTR_RE = re.compile(r'([a-zA-Z][a-zA-Z0-9-]*)="([^"]*)"')
+# Attributes the picture markup owns; everything else on the <img> is kept.
+_GENERATED_ATTRS = {"class", "src", "srcset", "sizes", "width", "height", "data-source"}
+
+
+@dataclass(frozen=True)
+class Source:
+    url: str
+    path: Path
+    digest: str
+    width: int
+    height: int
+
+
+@dataclass(frozen=True)
+class Variant:
+    fmt: str
+    width: int
+    height: int
+    path: Path
+    url: str
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Generate AVIF/WebP thumbnail variants and rewrite hn-image tags."
+    )
+    parser.add_argument("--index-path", type=Path, default=DEFAULT_INDEX)
+    parser.add_argument(
+        "--width",
+        dest="widths",
+        type=int,
+        action="append",
+        help=f"Variant width in px (repeatable). Defaults to {', '.join(map(str, DEFAULT_WIDTHS))}.",
+    )
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help="Value of the sizes attribute on each <source>.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Encoder processes (defaults to the CPU count).",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=DEFAULT_CACHE,
+        help="Source fingerprint cache; unchanged files are not re-hashed.",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report what would be encoded without writing anything.",
+    )
+    return parser.parse_args()
+
+
+def _require_pillow() -> None:
+    if not pillow_available():
+        raise SystemExit("Pillow is required to build image variants: pip install Pillow")
+
+
+def available_formats() -> tuple[str, ...]:
+    formats = []
+    for fmt in FORMATS:
+        if fmt == "avif" and not avif_available():
+            print("AVIF encoder not available; building WebP variants only.")
+            continue
+        formats.append(fmt)
+    return tuple(formats)
+
+
+def _tag_attrs(tag: str) -> dict[str, str]:
+    img = _IMG_RE.search(tag)
+    return dict(_ATTR_RE.findall(img.group(0))) if img else {}
+
+
+def _source_url(attrs: dict[str, str]) -> str | None:
+    return attrs.get("data-source") or attrs.get("src") or None
+
+
+class SourceCache:
+    """Maps a source file to its digest and pixel size, keyed by (size, mtime)."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.hits = 0
+        self._dirty = False
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        self._entries: dict[str, dict] = data if isinstance(data, dict) else {}
+
+    def describe(self, url: str, path: Path) -> Source:
+        from PIL import Image
+
+        stat = path.stat()
+        key = str(path.resolve())
+        entry = self._entries.get(key)
+        if (
+            isinstance(entry, dict)
+            and entry.get("size") == stat.st_size
+            and entry.get("mtime_ns") == stat.st_mtime_ns
+        ):
+            self.hits += 1
+            return Source(url, path, entry["sha256"], entry["width"], entry["height"])
+
+        # Image.open only parses the header, so this does not decode pixels.
+        with Image.open(path) as im:
+            width, height = im.size
+        digest = file_sha256(path)
+        self._entries[key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest,
+            "width": width,
+            "height": height,
+        }
+        self._dirty = True
+        return Source(url, path, digest, width, height)
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_text_atomic(self.path, json.dumps(self._entries, indent=2, sort_keys=True) + "\n")
+        self._dirty = False
+
+
+def target_widths(source_width: int, widths: list[int]) -> list[int]:
+    """Requested widths capped at the source width (never upscale)."""
+    return sorted({min(width, source_width) for width in widths if width > 0})
+
+
+def plan_variants(source: Source, widths: list[int], formats: tuple[str, ...]) -> list[Variant]:
+    variant_dir = source.path.parent / VARIANT_DIRNAME
+    url_dir = posixpath.join(posixpath.dirname(source.url), VARIANT_DIRNAME)
+    variants = []
+    for fmt in formats:
+        for width in target_widths(source.width, widths):
+            height = max(1, round(source.height * width / source.width))
+            name = f"{source.digest[:16]}-{width}w.{fmt}"
+            variants.append(
+                Variant(fmt, width, height, variant_dir / name, posixpath.join(url_dir, name))
+            )
+    return variants
+
+
+def encode_variants(source_path: str, jobs: list[tuple[str, str, int, int]]) -> int:
+    """Decode ``source_path`` once and write each (dest, fmt, width, height) job.
+
+    Runs in a worker process; returns the number of bytes written.
+    """
+    from PIL import Image, ImageOps
+
+    if "avif" in {fmt for _, fmt, _, _ in jobs}:
+        # Registers the plugin encoder in this worker process when it is needed.
+        avif_available()
+
+    written = 0
+    with Image.open(source_path) as opened:
+        image = ImageOps.exif_transpose(opened)
+        if image.mode not in {"RGB", "RGBA"}:
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        for dest, fmt, width, height in jobs:
+            if (width, height) == image.size:
+                resized = image
+            else:
+                resized = image.resize((width, height), Image.Resampling.LANCZOS)
+            dest_path = Path(dest)
+            dest_path.parent.mkdir(parents=True, exist_ok=True)
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), quality=QUALITY[fmt])
+            write_bytes_atomic(dest_path, buffer.getvalue())
+            written += buffer.tell()
+    return written
+
+
+def render_picture(attrs: dict[str, str], source: Source, variants: list[Variant], sizes: str) -> str:
+    by_format: dict[str, list[Variant]] = {}
+    for variant in variants:
+        by_format.setdefault(variant.fmt, []).append(variant)
+
+    parts = ['<picture class="hn-picture">']
+    for fmt in FORMATS:
+        if fmt not in by_format:
+            continue
+        srcset = ", ".join(f"{escape(v.url)} {v.width}w" for v in by_format[fmt])
+        parts.append(
+            f'<source type="{MIME_TYPES[fmt]}" srcset="{srcset}" sizes="{escape(sizes)}" />'
+        )
+
+    # The <img> fallback is the smallest WebP variant; browsers that understand
+    # <source> never fetch it.
+    fallback = by_format.get("webp", variants)[0]
+    img_attrs = [
+        ("class", "hn-image"),
+        ("src", escape(fallback.url)),
+        ("data-source", escape(source.url)),
+        ("width", str(fallback.width)),
+        ("height", str(fallback.height)),
+    ]
+    img_attrs.extend((k, v) for k, v in attrs.items() if k not in _GENERATED_ATTRS)
+    parts.append("<img " + " ".join(f'{k}="{v}"' for k, v in img_attrs) + " />")
+    parts.append("</picture>")
+    return "".join(parts)
+
+
+@dataclass
+class BuildStats:
+    sources: int = 0
+    encoded_sources: int = 0
+    encoded_variants: int = 0
+    fingerprints_cached: int = 0
+    source_bytes: int = 0
+    written_bytes: int = 0
+    elapsed: float = 0.0
+    missing: list[str] = field(default_factory=list)
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def avif_available() -> bool:
+    """True if Pillow can encode AVIF, natively or through ``pillow-avif-plugin``."""
+    from PIL import features
+
+    if features.check("avif"):
+        return True
+    try:
+        import pillow_avif  # type: ignore # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_pictures(
+    content: str,
+    index_path: Path,
+    *,
+    widths: list[int] | tuple[int, ...] = DEFAULT_WIDTHS,
+    sizes: str = DEFAULT_SIZES,
+    cache_path: Path = DEFAULT_CACHE,
+    jobs: int | None = None,
+    dry_run: bool = False,
+) -> tuple[str, BuildStats]:
+    """Encode missing variants for every hn-image in ``content`` and rewrite the tags.
+
+    Image URLs are resolved relative to ``index_path``. Returns the rewritten
+    HTML and build statistics; nothing is written when ``dry_run`` is set.
+    """
+    widths = sorted(set(widths))
+    formats = available_formats()
+    if not formats:
+        raise SystemExit("Pillow has no WebP or AVIF encoder available.")
+
+    public_root = index_path.parent.resolve()
+    cache = SourceCache(cache_path)
+    stats = BuildStats()
+
+    sources: dict[str, Source] = {}
+    for match in _TAG_RE.finditer(content):
+        url = _source_url(_tag_attrs(match.group(0)))
+        if not url or url in sources or "://" in url:
+            continue
+        path = (index_path.parent / url).resolve()
+        if not path.is_relative_to(public_root) or not path.is_file():
+            stats.missing.append(url)
+            continue
+        sources[url] = cache.describe(url, path)
+
+    plans = {url: plan_variants(source, widths, formats) for url, source in sources.items()}
+
+    # One encode task per distinct source digest; identical files share variants.
+    pending: dict[str, tuple[Source, list[Variant]]] = {}
+    for url, variants in plans.items():
+        todo = [variant for variant in variants if not variant.path.exists()]
+        if todo and sources[url].digest not in pending:
+            pending[sources[url].digest] = (sources[url], todo)
+
+    started = time.monotonic()
+    if pending and not dry_run:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(
+                    encode_variants,
+                    str(source.path),
+                    [(str(v.path), v.fmt, v.width, v.height) for v in todo],
+                )
+                for source, todo in pending.values()
+            ]
+            stats.written_bytes = sum(future.result() for future in futures)
+    stats.elapsed = time.monotonic() - started
+
+    def replace(match: re.Match[str]) -> str:
+        attrs = _tag_attrs(match.group(0))
+        url = _source_url(attrs)
+        if url not in plans:
+            return match.group(0)
+        return render_picture(attrs, sources[url], plans[url], sizes)
+
+    updated = _TAG_RE.sub(replace, content)
+    if not dry_run:
+        cache.save()
+
+    stats.sources = len(sources)
+    stats.encoded_sources = len(pending)
+    stats.encoded_variants = sum(len(todo) for _, todo in pending.values())
+    stats.fingerprints_cached = cache.hits
+    stats.source_bytes = sum(source.path.stat().st_size for source in sources.values())
+    return updated, stats
+
+
+def main() -> int:
+    args = parse_args()
+    _require_pillow()
+    index_path: Path = args.index_path
+    content = index_path.read_text(encoding="utf-8")
+    updated, stats = build_pictures(
+        content,
+        index_path,
+        widths=args.widths or DEFAULT_WIDTHS,
+        sizes=args.sizes,
+        cache_path=args.cache,
+        jobs=args.jobs,
+        dry_run=args.dry_run,
+    )
+    changed = updated != content
+    if changed and not args.dry_run:
+        write_text_atomic(index_path, updated)
+
+    for url in stats.missing:
+        print(f"hn-image source not found, left as is: {url}", file=sys.stderr)
+    print(
+        f"{'Would encode' if args.dry_run else 'Encoded'} {stats.encoded_variants} variant(s) "
+        f"from {stats.encoded_sources} of {stats.sources} source(s) in {stats.elapsed:.2f}s "
+        f"({stats.fingerprints_cached} fingerprint(s) cached); "
+        f"sources {stats.source_bytes} bytes, new variants {stats.written_bytes} bytes. "
+        f"index changed={str(changed).lower()}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
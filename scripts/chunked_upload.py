@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""Resumable chunked uploads to the sketches API (R2 multipart uploads).
+
+A file is announced with ``POST /sketches/uploads``, its parts are PUT by a
+bounded thread pool and ``POST /sketches/uploads/<id>/complete`` assembles
+them into the sketch object and row. Every part the server acknowledges is
+recorded in a local progress file, so an interrupted sync resumes by sending
+only the parts that were never confirmed.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from api_client import ApiClient
+from index_render import write_text_atomic
+from sketch_ledger import file_sha256
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_PROGRESS = ROOT / ".cache" / "sketch-uploads.json"
+DEFAULT_JOBS = 4
+# Files above this size use the chunked protocol; smaller ones are cheaper as
+# a single /sketches/upload request.
+CHUNKED_THRESHOLD_BYTES = 8 * 1024 * 1024
+REQUEST_TIMEOUT_SECONDS = 30.0
+PART_TIMEOUT_SECONDS = 120.0
+PART_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 1.0
+
+
+class UploadGone(Exception):
+    """The server no longer knows the upload (finished, aborted or expired)."""
+
+
+# One lock per progress file, shared by every UploadProgress in the process,
+# so concurrent saves of the same file are serialized.
+_PROGRESS_LOCKS: dict[Path, threading.Lock] = {}
+_PROGRESS_LOCKS_GUARD = threading.Lock()
+
+
+def _progress_lock(path: Path) -> threading.Lock:
+    with _PROGRESS_LOCKS_GUARD:
+        return _PROGRESS_LOCKS.setdefault(path.resolve(), threading.Lock())
+
+
+def _read_progress(path: Path) -> dict[str, dict]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        data = {}
+    return data if isinstance(data, dict) else {}
+
+
+class UploadProgress:
+    """On-disk map of object key -> pending upload and its acknowledged parts.
+
+    Share one instance between concurrent uploads. ``save`` re-reads the file
+    and applies only the keys this instance changed, so another instance
+    saving the same file does not lose its entries either.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = _progress_lock(path)
+        with self._lock:
+            self._uploads: dict[str, dict] = _read_progress(path)
+        # Keys changed since the last save; None marks a finished upload.
+        self._changed: dict[str, dict | None] = {}
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._uploads.get(key)
+            return json.loads(json.dumps(entry)) if isinstance(entry, dict) else None
+
+    def start(self, key: str, entry: dict) -> None:
+        with self._lock:
+            self._uploads[key] = entry
+            self._changed[key] = entry
+        self.save()
+
+    def record_part(self, key: str, part_number: int, etag: str) -> None:
+        with self._lock:
+            self._uploads[key]["parts"][str(part_number)] = etag
+            self._changed[key] = self._uploads[key]
+        self.save()
+
+    def finish(self, key: str) -> None:
+        with self._lock:
+            if self._uploads.pop(key, None) is None:
+                return
+            self._changed[key] = None
+        self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._changed:
+                return
+            uploads = _read_progress(self.path)
+            for key, entry in self._changed.items():
+                if entry is None:
+                    uploads.pop(key, None)
+                else:
+                    uploads[key] = entry
+            payload = json.dumps(uploads, indent=2, sort_keys=True) + "\n"
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            write_text_atomic(self.path, payload)
+            self._changed.clear()
+            for key, entry in uploads.items():
+                self._uploads.setdefault(key, entry)
+
+
+def _fingerprint(path: Path) -> dict:
+    return {"size": path.stat().st_size, "sha256": file_sha256(path)}
+
+
+def _post_json(client: ApiClient, url: str, payload: dict) -> tuple[int, dict]:
+    status, body = client.request_json(
+        "POST",
+        url,
+        timeout=REQUEST_TIMEOUT_SECONDS,
+        body=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    return status, body if isinstance(body, dict) else {"data": body}
+
+
+def _error_code(payload: dict) -> str:
+    error = payload.get("error")
+    return str(error.get("code") or "") if isinstance(error, dict) else ""
+
+
+def _abort(client: ApiClient, uploads_url: str, upload_id: str) -> None:
+    try:
+        client.request(
+            "DELETE", f"{uploads_url}/{upload_id}", timeout=REQUEST_TIMEOUT_SECONDS
+        )
+    except urllib.error.URLError:
+        pass
+
+
+def _upload_part(
+    client: ApiClient, uploads_url: str, entry: dict, path: Path, part_number: int
+) -> str:
+    part_size = int(entry["part_size"])
+    with path.open("rb") as handle:
+        handle.seek((part_number - 1) * part_size)
+        data = handle.read(part_size)
+    url = f"{uploads_url}/{entry['upload_id']}/parts/{part_number}"
+
+    last_error = ""
+    for attempt in range(PART_ATTEMPTS):
+        if attempt:
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+        try:
+            status, payload = client.request_json(
+                "PUT",
+                url,
+                timeout=PART_TIMEOUT_SECONDS,
+                body=data,
+                headers={"Content-Type": "application/octet-stream"},
+            )
+        except (urllib.error.URLError, TimeoutError) as exc:
+            last_error = str(exc)
+            continue
+        if status == 200 and isinstance(payload, dict):
+            etag = str((payload.get("data") or {}).get("etag") or "")
+            if etag:
+                return etag
+            last_error = "response had no etag"
+            continue
+        if status == 404:
+            raise UploadGone(entry["upload_id"])
+        last_error = f"HTTP {status}: {json.dumps(payload)[:200]}"
+        if status != 429 and status < 500:
+            break
+    raise RuntimeError(f"Part {part_number} failed: {last_error}")
+
+
+def _create(
+    client: ApiClient, uploads_url: str, fields: dict, fingerprint: dict
+) -> tuple[int, dict, dict | None]:
+    status, payload = _post_json(client, uploads_url, fields)
+    if status == 409 and _error_code(payload) == "UPLOAD_IN_PROGRESS":
+        # Started elsewhere (or its progress file was lost): the part etags
+        # are unknown here, so abort it and start over.
+        _abort(client, uploads_url, str(payload["error"].get("upload_id") or ""))
+        status, payload = _post_json(client, uploads_url, fields)
+    if status != 201:
+        return status, payload, None
+    data = payload.get("data") or {}
+    entry = {
+        "upload_id": str(data["upload_id"]),
+        "part_size": int(data["part_size"]),
+        "part_count": int(data["part_count"]),
+        "parts": {},
+        **fingerprint,
+    }
+    return status, payload, entry
+
+
+def upload_chunked(
+    client: ApiClient,
+    api_base: str,
+    path: Path,
+    *,
+    sketch_at: str,
+    content_type: str,
+    object_key: str,
+    note: str,
+    jobs: int = DEFAULT_JOBS,
+    progress: UploadProgress | None = None,
+) -> tuple[int, dict]:
+    """Upload ``path`` in parts; returns the (status, payload) of the final step.
+
+    A 201 carries the new sketch row and a 409 means the object key already
+    exists, as with ``POST /sketches/upload``. Failed parts raise
+    RuntimeError after their retries, leaving the progress file in place so
+    the next run resumes.
+    """
+    uploads_url = f"{api_base.rstrip('/')}/sketches/uploads"
+    progress = progress or UploadProgress(DEFAULT_PROGRESS)
+    fingerprint = _fingerprint(path)
+    fields = {
+        "sketch_at": sketch_at,
+        "content_type": content_type,
+        "size_bytes": fingerprint["size"],
+        "object_key": object_key,
+        "note": note,
+    }
+
+    for _ in range(2):
+        entry = progress.get(object_key)
+        if entry and (entry.get("size"), entry.get("sha256")) != (
+            fingerprint["size"],
+            fingerprint["sha256"],
+        ):
+            _abort(client, uploads_url, entry["upload_id"])
+            progress.finish(object_key)
+            entry = None
+        if entry is None:
+            status, payload, entry = _create(client, uploads_url, fields, fingerprint)
+            if entry is None:
+                return status, payload
+            progress.start(object_key, entry)
+
+        missing = [
+            number
+            for number in range(1, entry["part_count"] + 1)
+            if str(number) not in entry["parts"]
+        ]
+        failures: list[str] = []
+        gone = False
+        with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(missing) or 1))) as pool:
+            futures = {
+                pool.submit(_upload_part, client, uploads_url, entry, path, number): number
+                for number in missing
+            }
+            for future in as_completed(futures):
+                number = futures[future]
+                try:
+                    etag = future.result()
+                except UploadGone:
+                    gone = True
+                    continue
+                except RuntimeError as exc:
+                    failures.append(str(exc))
+                    continue
+                entry["parts"][str(number)] = etag
+                progress.record_part(object_key, number, etag)
+        if gone:
+            progress.finish(object_key)
+            continue
+        if failures:
+            raise RuntimeError(
+                f"{len(failures)} of {entry['part_count']} part(s) failed; "
+                f"rerun to resume. First error: {failures[0]}"
+            )
+
+        status, payload = _post_json(
+            client,
+            f"{uploads_url}/{entry['upload_id']}/complete",
+            {
+                "parts": [
+                    {"part_number": int(number), "etag": etag}
+                    for number, etag in sorted(entry["parts"].items(), key=lambda p: int(p[0]))
+                ]
+            },
+        )
+        if status == 404:
+            progress.finish(object_key)
+            continue
+        if status in {201, 409}:
+            progress.finish(object_key)
+        return status, payload
+
+    raise RuntimeError(f"Upload for {object_key} expired twice on the server; giving up.")
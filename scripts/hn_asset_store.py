@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Content-addressed housekeeping for the Hacker News images in public/images/hn.
+
+The page reaches these files through alias directories (public/images/hacker-news
+is a symlink to hn). This tool:
+
+- hashes every stored file and groups identical contents,
+- computes the reachable set from references in the public HTML/JS/CSS/JSON,
+  following any alias that resolves to the store,
+- points references to duplicate copies at one canonical file, and
+- moves everything unreachable into a compressed, content-addressed cold
+  archive directory (or deletes it with --delete).
+
+Nothing is changed without --apply. Archived files can be brought back with
+--restore.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import lzma
+import os
+import re
+from pathlib import Path
+
+from sketch_ledger import file_sha256
+from index_render import write_bytes_atomic, write_text_atomic
+
+ROOT = Path(__file__).resolve().parents[1]
+PUBLIC_ROOT = ROOT / "public"
+DEFAULT_STORE = PUBLIC_ROOT / "images" / "hn"
+DEFAULT_ARCHIVE = ROOT / "archive" / "hn-images"
+NAMES_FILE = "names.json"
+REFERENCE_SUFFIXES = {".html", ".js", ".css", ".json"}
+
+_REF_CHARS = r"[^\s\"'()<>,]+"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Deduplicate HN images and archive the ones no page references."
+    )
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE)
+    parser.add_argument("--public-root", type=Path, default=PUBLIC_ROOT)
+    parser.add_argument(
+        "--archive",
+        type=Path,
+        default=DEFAULT_ARCHIVE,
+        help="Cold archive directory that unreferenced images are moved into.",
+    )
+    parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="Rewrite duplicate references and move unreferenced images. Default is a dry run.",
+    )
+    parser.add_argument(
+        "--delete",
+        action="store_true",
+        help="With --apply, delete unreferenced images instead of archiving them.",
+    )
+    parser.add_argument(
+        "--restore",
+        action="append",
+        metavar="NAME",
+        help="Extract an archived image (path relative to the store) back into place. Repeatable.",
+    )
+    return parser.parse_args()
+
+
+def alias_prefixes(public_root: Path, store: Path) -> list[str]:
+    """URL prefixes (relative to the public root) that resolve to ``store``."""
+    store = store.resolve()
+    prefixes = {f"{store.relative_to(public_root.resolve()).as_posix()}/"}
+    for entry in store.parent.iterdir():
+        if entry.is_symlink() and entry.resolve() == store:
+            prefixes.add(f"{entry.relative_to(public_root).as_posix()}/")
+    return sorted(prefixes, key=len, reverse=True)
+
+
+def reference_pattern(prefixes: list[str]) -> re.Pattern[str]:
+    alternatives = "|".join(re.escape(prefix) for prefix in prefixes)
+    return re.compile(rf"(?P<prefix>/?(?:{alternatives}))(?P<name>{_REF_CHARS})")
+
+
+def referencing_files(public_root: Path, store: Path) -> list[Path]:
+    store = store.resolve()
+    files = []
+    for dirpath, dirnames, filenames in os.walk(public_root):
+        current = Path(dirpath)
+        # Do not descend into the store itself or any alias of it.
+        dirnames[:] = [d for d in dirnames if (current / d).resolve() != store]
+        files.extend(
+            current / name for name in filenames if Path(name).suffix in REFERENCE_SUFFIXES
+        )
+    return sorted(files)
+
+
+def stored_files(store: Path) -> dict[str, Path]:
+    """Every regular file in the store keyed by its store-relative POSIX path."""
+    return {
+        path.relative_to(store).as_posix(): path
+        for path in sorted(store.rglob("*"))
+        if path.is_file() and not path.is_symlink() and not path.name.startswith(".")
+    }
+
+
+def find_references(files: list[Path], pattern: re.Pattern[str]) -> dict[Path, set[str]]:
+    found: dict[Path, set[str]] = {}
+    for path in files:
+        names = {m.group("name") for m in pattern.finditer(path.read_text(encoding="utf-8"))}
+        if names:
+            found[path] = names
+    return found
+
+
+def group_by_digest(files: dict[str, Path]) -> dict[str, list[str]]:
+    groups: dict[str, list[str]] = {}
+    for name, path in files.items():
+        groups.setdefault(file_sha256(path), []).append(name)
+    return groups
+
+
+def canonical_names(groups: dict[str, list[str]], reachable: set[str]) -> dict[str, str]:
+    """Map each reachable duplicate name to the copy every reference should use."""
+    renames: dict[str, str] = {}
+    for names in groups.values():
+        referenced = sorted(name for name in names if name in reachable)
+        for name in referenced[1:]:
+            renames[name] = referenced[0]
+    return renames
+
+
+def rewrite_references(
+    references: dict[Path, set[str]], pattern: re.Pattern[str], renames: dict[str, str]
+) -> list[Path]:
+    changed = []
+    for path, names in references.items():
+        if not names & renames.keys():
+            continue
+        text = path.read_text(encoding="utf-8")
+        updated = pattern.sub(
+            lambda m: m.group("prefix") + renames.get(m.group("name"), m.group("name")), text
+        )
+        if updated != text:
+            write_text_atomic(path, updated)
+            changed.append(path)
+    return changed
+
+
+def _read_names(archive: Path) -> dict[str, str]:
+    """names.json of ``archive``: original store path -> object path inside the archive."""
+    try:
+        names = json.loads((archive / NAMES_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return names if isinstance(names, dict) else {}
+
+
+def _object_member(digest: str, name: str) -> str:
+    return f"objects/{digest}{Path(name).suffix.lower()}.xz"
+
+
+def archive_files(archive: Path, files: dict[str, tuple[str, Path]]) -> int:
+    """Add ``files`` ({name: (digest, path)}) to ``archive``; returns the bytes added.
+
+    Each distinct content is stored once, xz-compressed, as
+    objects/<sha256><ext>.xz and names.json maps every original store path to
+    its object. Objects already archived are left alone, so a run only
+    compresses and writes the contents that are new.
+    """
+    names = _read_names(archive)
+    added = 0
+    for name, (digest, path) in files.items():
+        member = _object_member(digest, name)
+        names[name] = member
+        target = archive / member
+        if target.exists():
+            continue
+        data = lzma.compress(path.read_bytes(), preset=9)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        write_bytes_atomic(target, data)
+        added += len(data)
+    write_text_atomic(
+        archive / NAMES_FILE, json.dumps(names, indent=2, sort_keys=True) + "\n"
+    )
+    return added
+
+
+def restore_files(archive: Path, store: Path, requested: list[str]) -> int:
+    names = _read_names(archive)
+    restored = 0
+    for name in requested:
+        member = names.get(name)
+        source = archive / member if member else None
+        if source is None or not source.is_file():
+            print(f"not in archive: {name}")
+            continue
+        target = store / name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        write_bytes_atomic(target, lzma.decompress(source.read_bytes()))
+        restored += 1
+        print(f"restored {target}")
+    return restored
+
+
+def main() -> int:
+    args = parse_args()
+    store: Path = args.store
+    public_root: Path = args.public_root
+    if not store.is_dir():
+        raise SystemExit(f"Missing image store: {store}")
+
+    if args.restore:
+        restore_files(args.archive, store, args.restore)
+        return 0
+
+    prefixes = alias_prefixes(public_root, store)
+    pattern = reference_pattern(prefixes)
+    files = stored_files(store)
+    groups = group_by_digest(files)
+    references = find_references(referencing_files(public_root, store), pattern)
+
+    referenced = set().union(*references.values()) if references else set()
+    missing = sorted(name for name in referenced if name not in files)
+    reachable = {name for name in referenced if name in files}
+    renames = canonical_names(groups, reachable)
+    keep = reachable - renames.keys()
+    digest_of = {name: digest for digest, names in groups.items() for name in names}
+    garbage = {name: (digest_of[name], files[name]) for name in files if name not in keep}
+
+    total_bytes = sum(path.stat().st_size for path in files.values())
+    garbage_bytes = sum(path.stat().st_size for _, path in garbage.values())
+    duplicate_groups = sum(1 for names in groups.values() if len(names) > 1)
+    print(
+        f"{len(files)} file(s), {len(groups)} distinct content(s), "
+        f"{duplicate_groups} duplicated; aliases: {', '.join(prefixes)}"
+    )
+    print(
+        f"{len(reachable)} referenced, {len(renames)} duplicate reference(s) to collapse, "
+        f"{len(garbage)} unreferenced ({garbage_bytes} of {total_bytes} bytes)."
+    )
+    for name in missing:
+        print(f"referenced but missing: {name}")
+
+    if not args.apply:
+        print("Dry run; pass --apply to rewrite references and move unreferenced files.")
+        return 0
+
+    for path in rewrite_references(references, pattern, renames):
+        print(f"rewrote duplicate references in {path}")
+    if garbage and not args.delete:
+        added = archive_files(args.archive, garbage)
+        print(f"archived {len(garbage)} file(s) into {args.archive} ({added} bytes added)")
+    for _, path in garbage.values():
+        path.unlink()
+    for directory in sorted({path.parent for _, path in garbage.values()}, reverse=True):
+        if directory != store and not any(directory.iterdir()):
+            directory.rmdir()
+    print(f"{'deleted' if args.delete else 'removed'} {len(garbage)} file(s); {total_bytes - garbage_bytes} bytes remain.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Streaming iCalendar (.ics) reader for the holidays block.
+
+Yields VEVENTs one at a time, in the same shape as the rows written by
+export_calendar_json.swift (``uid``, ``calendar``, ``title``, ``start``,
+``end``, ``allDay``, ``date``), plus ``recurrence`` (the RRULE value),
+``exdates`` and, for a moved instance of a recurring event, ``recurrenceId``.
+The file is read line by line and continuation lines are unfolded on the
+fly, so multi-year public holiday feeds never have to fit in memory:
+
+    python3 scripts/ics_reader.py holidays.ics
+
+Times are converted to UTC like the macOS exporter does; a TZID that the
+local zoneinfo database does not know, or a floating time, is read as UTC.
+Cancelled events and RDATEs are skipped.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Iterable, Iterator, TextIO
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+_DATE_TIME_RE = re.compile(r"^(\d{8})(?:T(\d{6})(Z)?)?$")
+_TEXT_ESCAPES = {"n": "\n", "N": "\n", "\\": "\\", ";": ";", ",": ","}
+_TEXT_ESCAPE_RE = re.compile(r"\\(.)")
+
+
+def unfold_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Logical content lines: CRLF stripped and folded continuations joined (RFC 5545 3.1)."""
+    pending: str | None = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t"):
+            if pending is not None:
+                pending += line[1:]
+            continue
+        if pending:
+            yield pending
+        pending = line
+    if pending:
+        yield pending
+
+
+def parse_content_line(line: str) -> tuple[str, dict[str, str], str]:
+    """Split "NAME;PARAM=x;PARAM2=\"y:z\":value" into (NAME, params, value)."""
+    params: dict[str, str] = {}
+    quoted = False
+    split_at = len(line)
+    for pos, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ":" and not quoted:
+            split_at = pos
+            break
+    head, value = line[:split_at], line[split_at + 1 :]
+    name, *raw_params = head.split(";")
+    for param in raw_params:
+        key, _, param_value = param.partition("=")
+        params[key.strip().upper()] = param_value.strip().strip('"')
+    return name.strip().upper(), params, value
+
+
+def _unescape_text(value: str) -> str:
+    return _TEXT_ESCAPE_RE.sub(lambda m: _TEXT_ESCAPES.get(m.group(1), m.group(1)), value)
+
+
+def _zone(tzid: str | None) -> dt.tzinfo:
+    if tzid:
+        try:
+            return ZoneInfo(tzid)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return dt.timezone.utc
+
+
+def parse_date_value(value: str, params: dict[str, str]) -> dt.date | dt.datetime | None:
+    """A DATE (all-day) or a UTC DATE-TIME; None when the value is malformed."""
+    match = _DATE_TIME_RE.match(value.strip())
+    if not match:
+        return None
+    day_s, time_s, utc = match.groups()
+    try:
+        day = dt.datetime.strptime(day_s, "%Y%m%d").date()
+        if time_s is None or params.get("VALUE") == "DATE":
+            return day
+        moment = dt.datetime.combine(day, dt.datetime.strptime(time_s, "%H%M%S").time())
+    except ValueError:
+        return None
+    moment = moment.replace(tzinfo=dt.timezone.utc if utc else _zone(params.get("TZID")))
+    return moment.astimezone(dt.timezone.utc)
+
+
+def _iso_utc(moment: dt.datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _as_day(value: dt.date | dt.datetime) -> dt.date:
+    return value.date() if isinstance(value, dt.datetime) else value
+
+
+def _event_row(
+    props: dict[str, tuple[dict[str, str], str]], exdates: list[str], calendar: str
+) -> dict | None:
+    start_prop = props.get("DTSTART")
+    if start_prop is None:
+        return None
+    start = parse_date_value(start_prop[1], start_prop[0])
+    if start is None:
+        return None
+    end_prop = props.get("DTEND")
+    end = parse_date_value(end_prop[1], end_prop[0]) if end_prop else None
+
+    all_day = not isinstance(start, dt.datetime)
+    if all_day:
+        start_dt = dt.datetime.combine(start, dt.time(), dt.timezone.utc)
+        end_dt = (
+            dt.datetime.combine(_as_day(end), dt.time(), dt.timezone.utc)
+            if end
+            else start_dt + dt.timedelta(days=1)
+        )
+    else:
+        start_dt = start
+        end_dt = end if isinstance(end, dt.datetime) else start
+
+    row: dict = {
+        "uid": props.get("UID", ({}, ""))[1].strip(),
+        "calendar": calendar,
+        "title": _unescape_text(props.get("SUMMARY", ({}, ""))[1]).strip(),
+        "start": _iso_utc(start_dt),
+        "end": _iso_utc(end_dt),
+        "allDay": all_day,
+        "date": start.isoformat() if all_day else None,
+    }
+    if "RRULE" in props:
+        row["recurrence"] = props["RRULE"][1].strip()
+        if exdates:
+            row["exdates"] = exdates
+    if "RECURRENCE-ID" in props:
+        recurrence_id = parse_date_value(props["RECURRENCE-ID"][1], props["RECURRENCE-ID"][0])
+        if recurrence_id is not None:
+            row["recurrenceId"] = _as_day(recurrence_id).isoformat()
+    return row
+
+
+def iter_events(stream: TextIO) -> Iterator[dict]:
+    """Yield each VEVENT of ``stream`` as an export row, as soon as its END is read."""
+    calendar = ""
+    props: dict[str, tuple[dict[str, str], str]] | None = None
+    exdates: list[str] = []
+    nested = 0
+    for line in unfold_lines(stream):
+        if not line:
+            continue
+        name, params, value = parse_content_line(line)
+        if props is None:
+            if name == "BEGIN" and value.strip().upper() == "VEVENT":
+                props, exdates, nested = {}, [], 0
+            elif name == "X-WR-CALNAME":
+                calendar = _unescape_text(value).strip()
+            continue
+
+        if name == "BEGIN":
+            # VALARM and friends carry their own SUMMARY/DESCRIPTION; ignore them.
+            nested += 1
+        elif name == "END" and nested:
+            nested -= 1
+        elif name == "END":
+            status = props.get("STATUS", ({}, ""))[1].strip().upper()
+            row = _event_row(props, exdates, calendar) if status != "CANCELLED" else None
+            props = None
+            if row is not None:
+                yield row
+        elif nested:
+            continue
+        elif name == "EXDATE":
+            for part in value.split(","):
+                day = parse_date_value(part, params)
+                if day is not None:
+                    exdates.append(_as_day(day).isoformat())
+        else:
+            props.setdefault(name, (params, value))
+
+
+def read_events(path: Path) -> Iterator[dict]:
+    """Stream the VEVENTs of the .ics file at ``path``."""
+    with path.open("r", encoding="utf-8", errors="replace", newline="") as stream:
+        yield from iter_events(stream)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Print the VEVENTs of an .ics file as JSON lines in the calendar export shape."
+    )
+    parser.add_argument("path", type=Path)
+    args = parser.parse_args()
+    if not args.path.exists():
+        raise SystemExit(f"Missing calendar file: {args.path}")
+    for row in read_events(args.path):
+        sys.stdout.write(json.dumps(row, sort_keys=True) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
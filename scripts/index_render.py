@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Single-pass renderer for the snapshot marker blocks in public/index.html.
+
+Every refresh script owns one block delimited by a pair of HTML comments:
+
+    <!-- TODO_SNAPSHOT_START -->
+    ...
+    <!-- TODO_SNAPSHOT_END -->
+
+Instead of each script reading, scanning and rewriting the whole document,
+callers hand ``render_index`` a mapping of block name to provider. The file is
+read once, every marker pair is located in one regex scan, each requested block
+is spliced in place (re-indented to its start marker), and the result is
+written once through an atomic temp-file-plus-rename.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+import textwrap
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Mapping
+
+import refresh_metrics
+
+if TYPE_CHECKING:
+    # Annotations only: render_cache writes through this module.
+    from render_cache import RenderCache
+
+TODO_SNAPSHOT = "TODO_SNAPSHOT"
+FOCUS_CARDS_SNAPSHOT = "FOCUS_CARDS_SNAPSHOT"
+SKETCH_SNAPSHOT = "SKETCH_SNAPSHOT"
+UPCOMING_HOLIDAYS = "UPCOMING_HOLIDAYS"
+HN_DIGEST = "HN_DIGEST"
+HN_DIGEST_META = "HN_DIGEST_META"
+
+BLOCK_NAMES = (
+    FOCUS_CARDS_SNAPSHOT,
+    HN_DIGEST,
+    HN_DIGEST_META,
+    SKETCH_SNAPSHOT,
+    TODO_SNAPSHOT,
+    UPCOMING_HOLIDAYS,
+)
+
+# A provider returns the block's inner HTML, or None to keep the block as it is.
+# Indentation is normalized, so providers may return either flush-left or
+# already-indented fragments.
+BlockProvider = Callable[[], "str | None"]
+
+_BLOCK_RE = re.compile(
+    r"^(?P<indent>[ \t]*)<!-- (?P<name>[A-Z0-9_]+)_START -->[^\n]*\n"
+    r"(?P<body>.*?)"
+    r"^(?P<end_indent>[ \t]*)<!-- (?P=name)_END -->",
+    re.DOTALL | re.MULTILINE,
+)
+
+
+def start_marker(name: str) -> str:
+    return f"<!-- {name}_START -->"
+
+
+def end_marker(name: str) -> str:
+    return f"<!-- {name}_END -->"
+
+
+def block_cache_key(index_path: Path, name: str) -> str:
+    """Stable identifier for one block of one index file, used by caches."""
+    return f"{index_path.resolve()}#{name}"
+
+
+def find_blocks(text: str) -> dict[str, re.Match[str]]:
+    """Locate every marker pair in ``text`` with a single scan."""
+    blocks: dict[str, re.Match[str]] = {}
+    for match in _BLOCK_RE.finditer(text):
+        blocks.setdefault(match.group("name"), match)
+    return blocks
+
+
+def intact_blocks(index_path: Path, names: Iterable[str], cache: RenderCache) -> set[str]:
+    """Names of the blocks whose body on disk is still the one ``cache`` recorded.
+
+    Only these may be fetched conditionally: a 304 keeps the block as it is,
+    so a block edited or checked out since its last render needs a full fetch.
+    """
+    try:
+        blocks = find_blocks(index_path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return set()
+    return {
+        name
+        for name in names
+        if name in blocks
+        and cache.output_intact(block_cache_key(index_path, name), blocks[name].group("body"))
+    }
+
+
+def indent_fragment(fragment: str, indent: str) -> str:
+    body = textwrap.dedent(fragment).strip("\n")
+    if not body:
+        return ""
+    return "\n".join(
+        (indent + line) if line.strip() else ""
+        for line in body.splitlines()
+    )
+
+
+def splice_blocks(text: str, fragments: Mapping[str, str]) -> str:
+    """Replace the body of each named block in ``text``.
+
+    Raises ValueError if any requested block has no marker pair.
+    """
+    blocks = find_blocks(text)
+    missing = [name for name in fragments if name not in blocks]
+    if missing:
+        raise ValueError(
+            "Could not find snapshot markers in index.html: "
+            + ", ".join(f"{start_marker(name)} ... {end_marker(name)}" for name in missing)
+        )
+
+    ordered = sorted(
+        (blocks[name] for name in fragments), key=lambda match: match.start("body")
+    )
+    parts: list[str] = []
+    cursor = 0
+    for match in ordered:
+        body = indent_fragment(fragments[match.group("name")], match.group("indent"))
+        parts.append(text[cursor : match.start("body")])
+        if body:
+            parts.append(body + "\n")
+        cursor = match.start("end_indent")
+    parts.append(text[cursor:])
+    return "".join(parts)
+
+
+def write_text_atomic(path: Path, text: str) -> None:
+    """Write ``text`` to ``path`` via a sibling temp file and os.replace."""
+    write_bytes_atomic(path, text.encode("utf-8"))
+
+
+def write_bytes_atomic(path: Path, data: bytes) -> None:
+    """Write ``data`` to ``path`` via a sibling temp file and os.replace."""
+    with refresh_metrics.phase("write"):
+        _write_atomic(path, data)
+    refresh_metrics.count("bytes_written", len(data))
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    try:
+        mode = path.stat().st_mode & 0o777
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=f".{path.name}.", suffix=".tmp", dir=str(path.parent)
+    )
+    tmp_path = Path(tmp_name)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def render_index(
+    index_path: Path,
+    providers: Mapping[str, BlockProvider],
+    *,
+    digests: Mapping[str, str] | None = None,
+    cache: RenderCache | None = None,
+) -> list[str]:
+    """Render every provider's block into ``index_path`` with one read and one write.
+
+    With ``digests`` and ``cache``, a provider is skipped when its input digest
+    matches the cached one and the block on disk is what was last rendered.
+    Returns the names of the blocks whose markup changed. The file is left
+    untouched when nothing changed.
+    """
+    content = index_path.read_text(encoding="utf-8")
+    blocks = find_blocks(content)
+    digests = digests if cache is not None else None
+
+    fragments: dict[str, str] = {}
+    for name, provider in providers.items():
+        digest = digests.get(name) if digests else None
+        if (
+            digest
+            and name in blocks
+            and cache.is_fresh(
+                block_cache_key(index_path, name), digest, blocks[name].group("body")
+            )
+        ):
+            continue
+        with refresh_metrics.phase("render"):
+            fragment = provider()
+        if fragment is not None:
+            fragments[name] = fragment
+    if not fragments:
+        return []
+
+    with refresh_metrics.phase("render"):
+        updated = splice_blocks(content, fragments)
+        new_blocks = find_blocks(updated)
+    changed = [
+        name
+        for name in fragments
+        if new_blocks[name].group("body") != blocks[name].group("body")
+    ]
+    if changed:
+        write_text_atomic(index_path, updated)
+    if digests:
+        for name in fragments:
+            if name in digests:
+                cache.update(
+                    block_cache_key(index_path, name),
+                    digests[name],
+                    new_blocks[name].group("body"),
+                )
+    return changed
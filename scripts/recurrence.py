@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""Date-level RRULE expansion (RFC 5545) for calendar exports.
+
+Supports FREQ=YEARLY/MONTHLY/WEEKLY/DAILY with INTERVAL, COUNT, UNTIL, WKST,
+multi-valued BYMONTH, BYMONTHDAY (including negative days), BYDAY (with
+ordinals such as 3MO or -1FR, relative to the month or, for YEARLY rules
+without BYMONTH, to the year) and BYSETPOS, plus EXDATE. Times of day are
+ignored: every occurrence is a date. A rule with any other part (BYYEARDAY,
+BYWEEKNO, BYHOUR, ...) or an out-of-range value is reported as unsupported
+rather than expanded to the wrong dates.
+
+Parsed rules are cached per recurrence string, and the occurrences of a rule
+are memoized per (rule, dtstart, year), so expanding many events over a
+multi-year window only computes each year of each distinct rule once.
+"""
+
+from __future__ import annotations
+
+import calendar
+import datetime as dt
+import functools
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+FREQUENCIES = ("YEARLY", "MONTHLY", "WEEKLY", "DAILY")
+RULE_PARTS = frozenset(
+    {"FREQ", "INTERVAL", "COUNT", "UNTIL", "WKST", "BYMONTH", "BYMONTHDAY", "BYDAY", "BYSETPOS"}
+)
+WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+
+_BYDAY_RE = re.compile(r"^([+-]?\d{1,2})?(MO|TU|WE|TH|FR|SA|SU)$")
+_DATE_RE = re.compile(r"^(\d{4})-?(\d{2})-?(\d{2})")
+
+
+@dataclass(frozen=True)
+class Rule:
+    freq: str
+    interval: int = 1
+    count: int | None = None
+    until: dt.date | None = None
+    wkst: int = 0
+    bymonth: tuple[int, ...] = ()
+    bymonthday: tuple[int, ...] = ()
+    byday: tuple[tuple[int | None, int], ...] = ()
+    bysetpos: tuple[int, ...] = ()
+
+
+def _parse_date(value: str) -> dt.date | None:
+    match = _DATE_RE.match(value.strip())
+    if not match:
+        return None
+    try:
+        return dt.date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    except ValueError:
+        return None
+
+
+def _int_list(value: str, low: int, high: int, *, signed: bool = True) -> tuple[int, ...] | None:
+    """Values of a BYxxx list; None if any is malformed or outside +/-[low, high]."""
+    out = []
+    for token in value.split(","):
+        try:
+            number = int(token.strip())
+        except ValueError:
+            return None
+        if not low <= (abs(number) if signed else number) <= high:
+            return None
+        out.append(number)
+    return tuple(out)
+
+
+def _positive_int(value: str) -> int | None:
+    """A plain positive integer such as INTERVAL or COUNT; None if anything else."""
+    if not (value.isascii() and value.isdigit()) or int(value) < 1:
+        return None
+    return int(value)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_rule(rrule: str) -> Rule | None:
+    """Parse an RRULE value ("FREQ=YEARLY;BYMONTH=7;BYMONTHDAY=1"); None if unsupported."""
+    parts: dict[str, str] = {}
+    for part in rrule.strip().removeprefix("RRULE:").split(";"):
+        key, sep, value = part.partition("=")
+        if sep:
+            parts[key.strip().upper()] = value.strip().upper()
+
+    freq = parts.get("FREQ", "")
+    # Ignoring a part would still yield dates, just the wrong ones.
+    if freq not in FREQUENCIES or not parts.keys() <= RULE_PARTS:
+        return None
+
+    byday = []
+    for token in parts["BYDAY"].split(",") if "BYDAY" in parts else ():
+        match = _BYDAY_RE.match(token.strip())
+        nth = int(match.group(1)) if match and match.group(1) else None
+        if not match or (nth is not None and not 1 <= abs(nth) <= 53):
+            return None
+        byday.append((nth, WEEKDAYS[match.group(2)]))
+
+    bymonth = _int_list(parts["BYMONTH"], 1, 12, signed=False) if "BYMONTH" in parts else ()
+    bymonthday = _int_list(parts["BYMONTHDAY"], 1, 31) if "BYMONTHDAY" in parts else ()
+    bysetpos = _int_list(parts["BYSETPOS"], 1, 366) if "BYSETPOS" in parts else ()
+    if bymonth is None or bymonthday is None or bysetpos is None:
+        return None
+
+    # A bad INTERVAL, COUNT or UNTIL would change which dates the rule yields.
+    interval = _positive_int(parts.get("INTERVAL", "1"))
+    count = _positive_int(parts["COUNT"]) if "COUNT" in parts else None
+    until = _parse_date(parts["UNTIL"]) if "UNTIL" in parts else None
+    if interval is None or ("COUNT" in parts and count is None):
+        return None
+    if "UNTIL" in parts and until is None:
+        return None
+    return Rule(
+        freq=freq,
+        interval=interval,
+        count=count,
+        until=until,
+        wkst=WEEKDAYS.get(parts.get("WKST", "MO"), 0),
+        bymonth=tuple(sorted(set(bymonth))),
+        bymonthday=bymonthday,
+        byday=tuple(byday),
+        bysetpos=bysetpos,
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_recurrence(text: str) -> tuple[Rule | None, frozenset[dt.date]]:
+    """Rule and EXDATEs of a recurrence value.
+
+    ``text`` is a bare RRULE value or iCalendar lines such as
+    "RRULE:FREQ=YEARLY" and "EXDATE;VALUE=DATE:20261226,20271227".
+    """
+    rule: Rule | None = None
+    exdates: set[dt.date] = set()
+    for line in text.replace("\\n", "\n").splitlines():
+        line = line.strip()
+        name = line.split(":", 1)[0].split(";", 1)[0].upper() if ":" in line else ""
+        if name == "EXDATE":
+            for value in line.split(":", 1)[1].split(","):
+                day = _parse_date(value)
+                if day:
+                    exdates.add(day)
+        elif name == "RRULE" or (not name and "FREQ=" in line.upper()):
+            rule = rule or compile_rule(line)
+    return rule, frozenset(exdates)
+
+
+def _nth_weekday(days: list[dt.date], weekday: int, nth: int | None) -> list[dt.date]:
+    """Every ``weekday`` in ``days`` (ascending), or only the nth (negative from the end)."""
+    matches = [day for day in days if day.weekday() == weekday]
+    if nth is None:
+        return matches
+    index = nth - 1 if nth > 0 else nth
+    return [matches[index]] if -len(matches) <= index < len(matches) else []
+
+
+def _month_days(year: int, month: int) -> list[dt.date]:
+    return [dt.date(year, month, day) for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+
+
+def _month_candidates(rule: Rule, year: int, month: int, dtstart: dt.date) -> set[dt.date]:
+    days = _month_days(year, month)
+    last = len(days)
+    if not rule.bymonthday and not rule.byday:
+        return {days[dtstart.day - 1]} if dtstart.day <= last else set()
+
+    selected: set[dt.date] | None = None
+    if rule.bymonthday:
+        selected = {
+            days[(day if day > 0 else last + 1 + day) - 1]
+            for day in rule.bymonthday
+            if 1 <= (day if day > 0 else last + 1 + day) <= last
+        }
+    if rule.byday:
+        weekdays = {day for nth, weekday in rule.byday for day in _nth_weekday(days, weekday, nth)}
+        selected = weekdays if selected is None else selected & weekdays
+    return selected or set()
+
+
+def _apply_setpos(rule: Rule, candidates: Iterable[dt.date]) -> list[dt.date]:
+    ordered = sorted(candidates)
+    if not rule.bysetpos:
+        return ordered
+    picked = set()
+    for position in rule.bysetpos:
+        index = position - 1 if position > 0 else position
+        if -len(ordered) <= index < len(ordered):
+            picked.add(ordered[index])
+    return sorted(picked)
+
+
+def _yearly_period(rule: Rule, year: int, dtstart: dt.date) -> list[dt.date]:
+    if (year - dtstart.year) % rule.interval:
+        return []
+    if rule.byday and not rule.bymonth and not rule.bymonthday:
+        # Ordinals count within the whole year (20MO = 20th Monday of the year).
+        first = dt.date(year, 1, 1)
+        days = [first + dt.timedelta(days=n) for n in range(366 if calendar.isleap(year) else 365)]
+        candidates = {
+            day for nth, weekday in rule.byday for day in _nth_weekday(days, weekday, nth)
+        }
+    else:
+        if rule.bymonth:
+            months: Iterable[int] = rule.bymonth
+        elif rule.bymonthday or rule.byday:
+            months = range(1, 13)
+        else:
+            months = (dtstart.month,)
+        candidates = set()
+        for month in months:
+            candidates |= _month_candidates(rule, year, month, dtstart)
+    return _apply_setpos(rule, candidates)
+
+
+def _monthly_periods(rule: Rule, year: int, dtstart: dt.date) -> list[dt.date]:
+    out: list[dt.date] = []
+    for month in range(1, 13):
+        if ((year - dtstart.year) * 12 + month - dtstart.month) % rule.interval:
+            continue
+        if rule.bymonth and month not in rule.bymonth:
+            continue
+        out.extend(_apply_setpos(rule, _month_candidates(rule, year, month, dtstart)))
+    return out
+
+
+def _week_start(day: dt.date, wkst: int) -> dt.date:
+    return day - dt.timedelta(days=(day.weekday() - wkst) % 7)
+
+
+def _weekly_periods(rule: Rule, year: int, dtstart: dt.date) -> list[dt.date]:
+    weekdays = {weekday for _, weekday in rule.byday} or {dtstart.weekday()}
+    anchor = _week_start(dtstart, rule.wkst)
+    out: list[dt.date] = []
+    # Weeks that start in the last days of the previous year can still land
+    # occurrences (and BYSETPOS picks) in this one.
+    week = _week_start(dt.date(year, 1, 1), rule.wkst)
+    while week.year <= year:
+        if ((week - anchor).days // 7) % rule.interval == 0:
+            days = [week + dt.timedelta(days=n) for n in range(7)]
+            candidates = [
+                day
+                for day in days
+                if day.weekday() in weekdays and (not rule.bymonth or day.month in rule.bymonth)
+            ]
+            out.extend(day for day in _apply_setpos(rule, candidates) if day.year == year)
+        week += dt.timedelta(days=7)
+    return out
+
+
+def _daily_periods(rule: Rule, year: int, dtstart: dt.date) -> list[dt.date]:
+    out: list[dt.date] = []
+    day = dt.date(year, 1, 1)
+    while day.year == year:
+        if (day - dtstart).days % rule.interval == 0 and _daily_matches(rule, day):
+            out.append(day)
+        day += dt.timedelta(days=1)
+    return out
+
+
+def _daily_matches(rule: Rule, day: dt.date) -> bool:
+    if rule.bymonth and day.month not in rule.bymonth:
+        return False
+    if rule.byday and day.weekday() not in {weekday for _, weekday in rule.byday}:
+        return False
+    if rule.bymonthday:
+        last = calendar.monthrange(day.year, day.month)[1]
+        if day.day not in {md if md > 0 else last + 1 + md for md in rule.bymonthday}:
+            return False
+    return True
+
+
+_PERIODS = {
+    "YEARLY": _yearly_period,
+    "MONTHLY": _monthly_periods,
+    "WEEKLY": _weekly_periods,
+    "DAILY": _daily_periods,
+}
+
+
+@functools.lru_cache(maxsize=8192)
+def year_occurrences(rule: Rule, dtstart: dt.date, year: int) -> tuple[dt.date, ...]:
+    """Occurrences of ``rule`` in ``year`` on or after ``dtstart``, before COUNT/UNTIL/EXDATE."""
+    if year < dtstart.year:
+        return ()
+    return tuple(day for day in _PERIODS[rule.freq](rule, year, dtstart) if day >= dtstart)
+
+
+def iter_occurrences(rule: Rule, dtstart: dt.date) -> Iterator[dt.date]:
+    """Every occurrence in order, honouring COUNT and UNTIL (EXDATEs still count)."""
+    emitted = 0
+    year = dtstart.year
+    last_year = rule.until.year if rule.until else dt.MAXYEAR
+    empty_years = 0
+    while year <= last_year:
+        days = year_occurrences(rule, dtstart, year)
+        # A rule that cannot match (e.g. BYMONTHDAY=31;BYMONTH=2) must not loop forever.
+        empty_years = 0 if days else empty_years + 1
+        if empty_years > 400:
+            return
+        for day in days:
+            if rule.until and day > rule.until:
+                return
+            if rule.count is not None and emitted >= rule.count:
+                return
+            emitted += 1
+            yield day
+        year += 1
+
+
+def expand(
+    recurrence: str,
+    dtstart: dt.date,
+    window_start: dt.date,
+    window_end: dt.date,
+    exdates: Iterable[dt.date] = (),
+) -> list[dt.date]:
+    """Occurrence dates of ``recurrence`` within [window_start, window_end]."""
+    rule, rule_exdates = parse_recurrence(recurrence)
+    if rule is None or window_end < window_start:
+        return []
+    excluded = rule_exdates | frozenset(exdates)
+    out: list[dt.date] = []
+    if rule.count is None:
+        # Without COUNT nothing before the window matters, so start there.
+        for year in range(max(dtstart.year, window_start.year), window_end.year + 1):
+            for day in year_occurrences(rule, dtstart, year):
+                if rule.until and day > rule.until:
+                    return out
+                if window_start <= day <= window_end and day not in excluded:
+                    out.append(day)
+        return out
+    for day in iter_occurrences(rule, dtstart):
+        if day > window_end:
+            break
+        if day >= window_start and day not in excluded:
+            out.append(day)
+    return out
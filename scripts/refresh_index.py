@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""Refresh every snapshot block in public/index.html with one read and one write.
+
+The API-backed blocks (todos, focus cards, sketches) are fetched concurrently
+under a single deadline; blocks whose data did not arrive in time keep their
+previous snapshot.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import socket
+import sys
+import threading
+import time
+import urllib.error
+from concurrent.futures import Future, wait
+from pathlib import Path
+from typing import Callable
+
+import refresh_metrics
+import sync_daily_sketch_from_photos as sketch_sync
+import update_focus_cards_snapshot as focus_cards
+import update_hn_digest as hn_digest
+import update_sketches_manifest as sketches_manifest
+import update_todo_snapshot as todos
+import update_upcoming_holidays as holidays
+from api_client import DEFAULT_VALIDATOR_CACHE, NotModified, ValidatorCache, get_client
+from index_render import (
+    BLOCK_NAMES,
+    FOCUS_CARDS_SNAPSHOT,
+    HN_DIGEST,
+    HN_DIGEST_META,
+    SKETCH_SNAPSHOT,
+    TODO_SNAPSHOT,
+    UPCOMING_HOLIDAYS,
+    BlockProvider,
+    block_cache_key,
+    intact_blocks,
+    render_index,
+)
+from render_cache import DEFAULT_RENDER_CACHE, RenderCache, input_digest
+from sketch_ledger import file_sha256
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_INDEX = ROOT / "public" / "index.html"
+DEFAULT_MANIFEST = ROOT / "public" / "data" / "sketch.json"
+DEFAULT_SKETCH_LIMIT = 200
+
+FETCH_ERRORS = (
+    TimeoutError,
+    socket.timeout,
+    urllib.error.URLError,
+    json.JSONDecodeError,
+    OSError,
+    ValueError,
+)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Render all snapshot blocks into public/index.html in a single pass."
+    )
+    parser.add_argument("--index-path", type=Path, default=DEFAULT_INDEX)
+    parser.add_argument(
+        "--todos-url",
+        default="https://api.adamjones.ca/todos",
+        help="Todos API URL.",
+    )
+    parser.add_argument(
+        "--focus-cards-url",
+        default="https://api.adamjones.ca/focus-cards",
+        help="Focus-cards API URL.",
+    )
+    parser.add_argument(
+        "--sketches-url",
+        default=f"https://api.adamjones.ca/sketches?limit={DEFAULT_SKETCH_LIMIT}",
+        help="Sketches API URL.",
+    )
+    parser.add_argument(
+        "--sketch-source",
+        choices=["api", "manifest"],
+        default="api",
+        help=(
+            "Where the SKETCH_SNAPSHOT block comes from. 'api' also rewrites the "
+            "sketch manifest; 'manifest' renders the existing manifest without fetching."
+        ),
+    )
+    parser.add_argument(
+        "--manifest-path",
+        type=Path,
+        default=DEFAULT_MANIFEST,
+        help="Sketch manifest used for the SKETCH_SNAPSHOT block.",
+    )
+    parser.add_argument(
+        "--calendar-input",
+        type=Path,
+        default=holidays.DEFAULT_INPUT,
+        help="Calendar export (JSON or .ics) used for the UPCOMING_HOLIDAYS block.",
+    )
+    parser.add_argument(
+        "--hn-digest-input",
+        type=Path,
+        default=hn_digest.DEFAULT_INPUT,
+        help="Structured digest used for the HN_DIGEST blocks.",
+    )
+    parser.add_argument(
+        "--hn-stories-path",
+        type=Path,
+        default=hn_digest.DEFAULT_STORIES,
+        help="Where the lazily loaded HN story bodies are written.",
+    )
+    parser.add_argument(
+        "--block",
+        dest="blocks",
+        action="append",
+        choices=BLOCK_NAMES,
+        help="Only refresh this block (repeatable). Defaults to all blocks.",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=8.0,
+        help="Overall budget in seconds for all API requests together.",
+    )
+    parser.add_argument("--horizon-days", type=int, default=180)
+    parser.add_argument("--holiday-limit", type=int, default=8)
+    parser.add_argument(
+        "--today",
+        default=None,
+        help="Override 'today' as YYYY-MM-DD for the holidays block.",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="Exit non-zero if any block could not be refreshed.",
+    )
+    parser.add_argument(
+        "--ca-bundle",
+        default=None,
+        help=(
+            "Path to CA bundle for TLS verification. "
+            "If omitted, uses SSL_CERT_FILE, then certifi, then system defaults."
+        ),
+    )
+    parser.add_argument(
+        "--validator-cache",
+        type=Path,
+        default=DEFAULT_VALIDATOR_CACHE,
+        help="ETag cache used for conditional GETs.",
+    )
+    parser.add_argument(
+        "--no-conditional",
+        action="store_true",
+        help="Always download and re-render, ignoring cached ETags.",
+    )
+    parser.add_argument(
+        "--render-cache",
+        type=Path,
+        default=DEFAULT_RENDER_CACHE,
+        help="Sidecar state file used to skip re-rendering unchanged inputs.",
+    )
+    refresh_metrics.add_arguments(parser)
+    return parser.parse_args()
+
+
+def describe_failure(exc: BaseException) -> str:
+    if isinstance(exc, urllib.error.HTTPError):
+        return f"HTTP {exc.code} (cf_ray={exc.headers.get('cf-ray', '') or 'n/a'})"
+    return str(exc) or type(exc).__name__
+
+
+def fetch_concurrently(
+    tasks: dict[str, Callable[[], object]], deadline: float
+) -> tuple[dict[str, object], dict[str, str], list[str]]:
+    """Run every task on its own daemon thread and wait at most ``deadline`` seconds.
+
+    Returns (results, failures, not_modified). Tasks still running at the
+    deadline are reported as failures and abandoned; daemon threads never hold
+    up exit.
+    """
+    futures: dict[str, Future] = {}
+    for name, task in tasks.items():
+        future: Future = Future()
+
+        def run(task: Callable[[], object] = task, future: Future = future) -> None:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(task())
+            except BaseException as exc:
+                future.set_exception(exc)
+
+        threading.Thread(target=run, name=f"fetch-{name}", daemon=True).start()
+        futures[name] = future
+
+    wait(futures.values(), timeout=max(deadline, 0.0))
+
+    results: dict[str, object] = {}
+    failures: dict[str, str] = {}
+    not_modified: list[str] = []
+    for name, future in futures.items():
+        if not future.done():
+            failures[name] = f"missed the {deadline:g}s deadline"
+            continue
+        exc = future.exception()
+        if exc is None:
+            results[name] = future.result()
+        elif isinstance(exc, NotModified):
+            not_modified.append(name)
+        elif isinstance(exc, FETCH_ERRORS):
+            failures[name] = describe_failure(exc)
+        else:
+            raise exc
+    return results, failures, not_modified
+
+
+def build_providers(
+    args: argparse.Namespace,
+    validators: ValidatorCache | None,
+    cache: RenderCache | None,
+) -> tuple[dict[str, BlockProvider], dict[str, str], dict[str, str], dict[str, str]]:
+    """Fetch the API data and prepare a provider and input digest per block.
+
+    Returns (providers, digests, failures, validator_keys). A block that fails,
+    or whose API answered 304, gets no provider so its previous snapshot stays
+    in place. ``failures`` is also filled in by providers that fail to render.
+    """
+    requested = args.blocks or BLOCK_NAMES
+    client = get_client(args.ca_bundle)
+    # Socket timeouts never exceed the overall budget.
+    timeout = max(args.deadline, 0.1)
+
+    urls = {
+        TODO_SNAPSHOT: args.todos_url,
+        FOCUS_CARDS_SNAPSHOT: args.focus_cards_url,
+    }
+    if args.sketch_source == "api":
+        urls[SKETCH_SNAPSHOT] = args.sketches_url
+    keys = {
+        name: f"{block_cache_key(args.index_path, name)} {url}" for name, url in urls.items()
+    }
+    manifest_intact = cache is not None and sketches_manifest.manifest_intact(
+        args.manifest_path, cache
+    )
+    if validators and cache is not None:
+        # A 304 keeps a block as it is, so an edited block must be fetched in full.
+        intact = intact_blocks(args.index_path, keys, cache)
+        if not manifest_intact:
+            intact.discard(SKETCH_SNAPSHOT)
+        for name, key in keys.items():
+            if name not in intact:
+                validators.discard(key)
+
+    fetchers: dict[str, Callable[[], object]] = {
+        TODO_SNAPSHOT: lambda: todos.fetch_items(
+            args.todos_url, timeout, client, validators, keys[TODO_SNAPSHOT]
+        ),
+        FOCUS_CARDS_SNAPSHOT: lambda: focus_cards.fetch_cards(
+            args.focus_cards_url, timeout, client, validators, keys[FOCUS_CARDS_SNAPSHOT]
+        ),
+    }
+
+    def fetch_sketches() -> tuple[list, list[str], bool, dict | None]:
+        """(rows, deleted ids, merge, cursor): the change feed since the manifest's cursor,
+        else the newest rows and no cursor."""
+        cursor = sketches_manifest.read_cursor(args.manifest_path) if manifest_intact else None
+        if cursor is not None:
+            rows, deleted, cursor = sketches_manifest.fetch_changes(
+                client, args.sketches_url, cursor, timeout
+            )
+            return rows, deleted, True, cursor
+        rows = sketches_manifest.fetch_rows(
+            args.sketches_url, timeout, client, validators, keys[SKETCH_SNAPSHOT]
+        )
+        return rows, [], False, None
+
+    if args.sketch_source == "api":
+        fetchers[SKETCH_SNAPSHOT] = fetch_sketches
+
+    started = time.monotonic()
+    payloads, failures, not_modified = fetch_concurrently(
+        {name: fetcher for name, fetcher in fetchers.items() if name in requested},
+        args.deadline,
+    )
+    elapsed = time.monotonic() - started
+    for payload in payloads.values():
+        if isinstance(payload, list):
+            refresh_metrics.count("items", len(payload))
+
+    today = holidays.parse_iso_date(args.today) if args.today else dt.date.today()
+
+    # Each builder loads its block's inputs and returns (input digest, renderer);
+    # the renderer only runs when the digest misses the render cache.
+    def todos_block() -> tuple[str, Callable[[], str]]:
+        items = payloads[TODO_SNAPSHOT]
+        return todos.snapshot_digest(items), lambda: todos.build_snapshot(items)
+
+    def focus_cards_block() -> tuple[str, Callable[[], str]]:
+        cards = payloads[FOCUS_CARDS_SNAPSHOT]
+        return focus_cards.snapshot_digest(cards), lambda: focus_cards.build_snapshot(cards)
+
+    def sketch_block() -> tuple[str, Callable[[], str]]:
+        if SKETCH_SNAPSHOT in payloads:
+            rows, deleted, merge, cursor = payloads[SKETCH_SNAPSHOT]
+            with refresh_metrics.phase("normalize"):
+                sketches_manifest.refresh_manifest(
+                    args.manifest_path,
+                    rows,
+                    deleted,
+                    cache,
+                    merge=merge,
+                    limit=DEFAULT_SKETCH_LIMIT,
+                    cursor=cursor,
+                )
+        items = sketch_sync.load_manifest_items(args.manifest_path)
+        return sketch_sync.snapshot_digest(items), lambda: sketch_sync.render_snapshot_items(items)
+
+    def holidays_block() -> tuple[str, Callable[[], str]]:
+        if not args.calendar_input.exists():
+            raise ValueError(f"Missing calendar export: {args.calendar_input}")
+        source_sha256 = file_sha256(args.calendar_input)
+
+        def render() -> str:
+            end = today + dt.timedelta(days=args.horizon_days)
+            with refresh_metrics.phase("normalize"):
+                index = holidays.load_occurrence_index(args.calendar_input, end, source_sha256)
+            return holidays.render_occurrences(
+                index, today=today, horizon_days=args.horizon_days, limit=args.holiday_limit
+            )
+
+        digest = holidays.render_digest(
+            source_sha256, today, args.horizon_days, args.holiday_limit
+        )
+        return digest, render
+
+    hn_state: dict[str, object] = {}
+
+    def load_hn_digest() -> tuple[dict, str, bool]:
+        # Both HN blocks share one digest load and one payload write.
+        if not hn_state:
+            try:
+                digest = hn_digest.load_digest(args.hn_digest_input)
+            except SystemExit as exc:
+                raise ValueError(str(exc)) from None
+            payload = hn_digest.build_stories_payload(digest)
+            hn_digest.write_stories(args.hn_stories_path, payload)
+            hn_state["digest"] = digest
+            hn_state["href"] = hn_digest.stories_url(args.index_path, args.hn_stories_path, payload)
+            hn_state["variants"] = hn_digest.pillow_available()
+        return hn_state["digest"], hn_state["href"], hn_state["variants"]
+
+    def hn_cards_block() -> tuple[str, Callable[[], str]]:
+        digest, href, variants = load_hn_digest()
+
+        def render() -> str:
+            cards = hn_digest.build_cards(digest, href)
+            if variants:
+                cards, _ = hn_digest.build_pictures(cards, args.index_path)
+            return cards
+
+        return hn_digest.cards_digest(digest, href, variants), render
+
+    def hn_meta_block() -> tuple[str, Callable[[], str]]:
+        meta = hn_digest.build_meta(load_hn_digest()[0])
+        return input_digest(hn_digest.RENDERER_VERSION, meta), lambda: meta
+
+    builders: dict[str, Callable[[], tuple[str, Callable[[], str]]]] = {
+        TODO_SNAPSHOT: todos_block,
+        FOCUS_CARDS_SNAPSHOT: focus_cards_block,
+        SKETCH_SNAPSHOT: sketch_block,
+        UPCOMING_HOLIDAYS: holidays_block,
+        HN_DIGEST: hn_cards_block,
+        HN_DIGEST_META: hn_meta_block,
+    }
+
+    providers: dict[str, BlockProvider] = {}
+    digests: dict[str, str] = {}
+    for name in requested:
+        if name in failures or name in not_modified:
+            continue
+        try:
+            digests[name], render = builders[name]()
+        except FETCH_ERRORS as exc:
+            failures[name] = describe_failure(exc)
+            continue
+
+        def provide(name: str = name, render: Callable[[], str] = render) -> str | None:
+            try:
+                return render()
+            except FETCH_ERRORS as exc:
+                failures[name] = describe_failure(exc)
+                return None
+
+        providers[name] = provide
+
+    print(
+        f"Fetched {len(payloads)} API block(s) in {elapsed:.2f}s; "
+        f"{len(not_modified)} served from 304."
+    )
+    return providers, digests, failures, keys
+
+
+@refresh_metrics.instrumented("refresh_index")
+def main() -> int:
+    args = parse_args()
+    refresh_metrics.configure(args)
+    if args.deadline <= 0:
+        raise SystemExit("--deadline must be > 0")
+
+    validators = None if args.no_conditional else ValidatorCache(args.validator_cache)
+    cache = RenderCache(args.render_cache)
+    providers, digests, failures, validator_keys = build_providers(args, validators, cache)
+
+    try:
+        changed = render_index(args.index_path, providers, digests=digests, cache=cache)
+    except ValueError as exc:
+        print(f"Index render failed: {exc}", file=sys.stderr)
+        return 1
+    cache.save()
+    for name, reason in failures.items():
+        print(f"{name} refresh skipped: {reason}", file=sys.stderr if args.strict else sys.stdout)
+    rendered = [name for name in providers if name not in failures]
+    if validators:
+        for name in rendered:
+            if name in validator_keys:
+                validators.commit(validator_keys[name])
+        validators.save()
+
+    print(
+        f"Refreshed {len(rendered)} block(s) in {args.index_path} "
+        f"({cache.hits} unchanged input(s) skipped). "
+        f"changed={','.join(changed) or 'none'}"
+    )
+    refresh_metrics.count("blocks_failed", len(failures))
+    if failures and args.strict:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Per-phase timing metrics for the refresh scripts.
+
+A script's ``main`` is wrapped with ``instrumented``, which records one run:
+
+    @refresh_metrics.instrumented("update_todo_snapshot")
+    def main() -> int:
+        args = parse_args()
+        refresh_metrics.configure(args)
+        ...
+
+Shared code marks phases and counters on the run in progress, from any
+thread, and does nothing when no run is active:
+
+    with refresh_metrics.phase("render"):
+        ...
+    refresh_metrics.count("items", len(items))
+
+The phases are connect (TCP + TLS), fetch (request until the body is read),
+decode (JSON parsing), normalize, render and write. Phase times are
+exclusive: time spent in a nested phase is not also charged to the one
+around it. Phases running concurrently in several threads are summed, so
+they can add up to more than the run's wall time.
+
+At exit the run is appended as a JSON line to ``--metrics-log`` and, with
+``--metrics-textfile-dir``, written as ``<script>.prom`` for the node
+exporter's textfile collector.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime as dt
+import functools
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterator
+
+# A module import: index_render imports this module while it initializes.
+import index_render
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_METRICS_LOG = ROOT / ".cache" / "refresh-metrics.jsonl"
+PHASES = ("connect", "fetch", "decode", "normalize", "render", "write")
+PROMETHEUS_PREFIX = "adamjones_refresh"
+
+
+class RunMetrics:
+    """Phase timings and counters of one script run. Safe to share between threads."""
+
+    def __init__(self, script: str) -> None:
+        self.script = script
+        self.started_at = dt.datetime.now(dt.timezone.utc)
+        self.log_path: Path | None = None
+        self.textfile_dir: Path | None = None
+        self.configured = False
+        self.phases: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        stack = self._local.__dict__.setdefault("stack", [])
+        now = time.perf_counter()
+        if stack:
+            parent = stack[-1]
+            self._add_time(parent[0], now - parent[1])
+        stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _, started = stack.pop()
+            self._add_time(name, now - started)
+            if stack:
+                stack[-1][1] = now
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def _add_time(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def snapshot(self, exit_code: int) -> dict:
+        with self._lock:
+            phases = {name: round(seconds, 6) for name, seconds in self.phases.items()}
+            counters = dict(self.counters)
+        return {
+            "ts": self.started_at.isoformat(timespec="seconds").replace("+00:00", "Z"),
+            "script": self.script,
+            "status": "ok" if exit_code == 0 else "error",
+            "exit_code": exit_code,
+            "duration_seconds": round(time.perf_counter() - self._started, 6),
+            "phases": phases,
+            "counters": counters,
+        }
+
+
+_active: RunMetrics | None = None
+_active_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time the enclosed block as ``name`` on the active run, if any."""
+    run = _active
+    if run is None:
+        yield
+        return
+    with run.phase(name):
+        yield
+
+
+def count(name: str, value: int = 1) -> None:
+    """Add ``value`` to counter ``name`` (items, bytes_in, cache_hits, ...) on the active run."""
+    run = _active
+    if run is not None:
+        run.count(name, value)
+
+
+def _optional_path(value: str) -> Path | None:
+    return Path(value) if value else None
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--metrics-log",
+        type=_optional_path,
+        default=DEFAULT_METRICS_LOG,
+        help="Append per-phase timings of this run as a JSON line here ('' disables).",
+    )
+    parser.add_argument(
+        "--metrics-textfile-dir",
+        type=_optional_path,
+        default=None,
+        help="Also write <script>.prom here for the Prometheus node exporter textfile collector.",
+    )
+
+
+def configure(args: argparse.Namespace) -> None:
+    """Take the output paths for the active run from ``add_arguments`` options."""
+    run = _active
+    if run is None:
+        return
+    run.log_path = getattr(args, "metrics_log", DEFAULT_METRICS_LOG)
+    run.textfile_dir = getattr(args, "metrics_textfile_dir", None)
+    run.configured = True
+
+
+def _exit_code(code: object) -> int:
+    if code is None:
+        return 0
+    return code if isinstance(code, int) else 1
+
+
+def instrumented(script: str) -> Callable[[Callable[[], int]], Callable[[], int]]:
+    """Record a run of the decorated ``main`` and write its metrics when it returns or exits."""
+
+    def decorator(main: Callable[[], int]) -> Callable[[], int]:
+        @functools.wraps(main)
+        def wrapper() -> int:
+            global _active
+            run = RunMetrics(script)
+            with _active_lock:
+                previous, _active = _active, run
+            exit_code = 1
+            try:
+                exit_code = _exit_code(main())
+                return exit_code
+            except SystemExit as exc:
+                exit_code = _exit_code(exc.code)
+                raise
+            finally:
+                with _active_lock:
+                    _active = previous
+                # --help and argument errors exit before configure(); nothing to record.
+                if run.configured:
+                    write_metrics(run, exit_code)
+
+        return wrapper
+
+    return decorator
+
+
+def write_metrics(run: RunMetrics, exit_code: int) -> None:
+    record = run.snapshot(exit_code)
+    try:
+        if run.log_path is not None:
+            run.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with run.log_path.open("a", encoding="utf-8") as handle:
+                handle.write(json.dumps(record, sort_keys=True) + "\n")
+        if run.textfile_dir is not None:
+            _write_textfile(run.textfile_dir / f"{run.script}.prom", record)
+    except OSError as exc:
+        # Metrics must never turn a successful refresh into a failed one.
+        print(f"Could not write refresh metrics: {exc}")
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(record: dict) -> str:
+    script = _label(record["script"])
+    lines = [
+        f"# HELP {PROMETHEUS_PREFIX}_phase_seconds Time spent in each phase of the last run.",
+        f"# TYPE {PROMETHEUS_PREFIX}_phase_seconds gauge",
+    ]
+    for name in sorted(set(PHASES) | set(record["phases"])):
+        seconds = record["phases"].get(name, 0.0)
+        lines.append(
+            f'{PROMETHEUS_PREFIX}_phase_seconds{{script="{script}",phase="{_label(name)}"}} '
+            f"{seconds:.6f}"
+        )
+    lines.extend(
+        [
+            f"# HELP {PROMETHEUS_PREFIX}_counter Counters of the last run (items, bytes, cache).",
+            f"# TYPE {PROMETHEUS_PREFIX}_counter gauge",
+        ]
+    )
+    for name, value in sorted(record["counters"].items()):
+        lines.append(
+            f'{PROMETHEUS_PREFIX}_counter{{script="{script}",name="{_label(name)}"}} {value}'
+        )
+    started = dt.datetime.fromisoformat(record["ts"].replace("Z", "+00:00")).timestamp()
+    lines.extend(
+        [
+            f"# HELP {PROMETHEUS_PREFIX}_duration_seconds Wall time of the last run.",
+            f"# TYPE {PROMETHEUS_PREFIX}_duration_seconds gauge",
+            f'{PROMETHEUS_PREFIX}_duration_seconds{{script="{script}"}} '
+            f"{record['duration_seconds']:.6f}",
+            f"# HELP {PROMETHEUS_PREFIX}_success Whether the last run exited 0.",
+            f"# TYPE {PROMETHEUS_PREFIX}_success gauge",
+            f'{PROMETHEUS_PREFIX}_success{{script="{script}"}} '
+            f"{1 if record['exit_code'] == 0 else 0}",
+            f"# HELP {PROMETHEUS_PREFIX}_last_run_timestamp_seconds Start of the last run.",
+            f"# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge",
+            f'{PROMETHEUS_PREFIX}_last_run_timestamp_seconds{{script="{script}"}} {started:.0f}',
+        ]
+    )
+    return "\n".join(lines) + "\n"
+
+
+def _write_textfile(path: Path, record: dict) -> None:
+    # The collector may read at any moment, so never expose a half-written file.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    index_render.write_text_atomic(path, prometheus_text(record))
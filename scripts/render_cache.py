@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Input-hash memoization for rendered blocks and generated files.
+
+The sidecar state file maps a target key (an index block or an output file) to
+two digests: one over the renderer version plus the normalized inputs, and one
+over the output that was written from them. A target is rebuilt only when its
+input digest changes or its current output no longer matches what was written
+(for example after a manual edit or a git checkout).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+
+import refresh_metrics
+from index_render import write_text_atomic
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_RENDER_CACHE = ROOT / ".cache" / "render-state.json"
+
+
+def input_digest(version: str, *inputs: object) -> str:
+    """Digest of a renderer version and its JSON-serializable inputs."""
+    payload = json.dumps(
+        [version, *inputs], sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def output_digest(text: str | bytes) -> str:
+    data = text.encode("utf-8") if isinstance(text, str) else text
+    return hashlib.sha256(data).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, path: Path = DEFAULT_RENDER_CACHE) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        self._entries: dict[str, dict[str, str]] = data if isinstance(data, dict) else {}
+
+    def is_fresh(self, key: str, digest: str, current_output: str | bytes | None) -> bool:
+        """True when ``digest`` matches and the output on disk is the one we wrote."""
+        entry = self._entries.get(key)
+        fresh = (
+            current_output is not None
+            and isinstance(entry, dict)
+            and entry.get("input") == digest
+            and entry.get("output") == output_digest(current_output)
+        )
+        if fresh:
+            self.hits += 1
+        else:
+            self.misses += 1
+        refresh_metrics.count("cache_hits" if fresh else "cache_misses")
+        return fresh
+
+    def output_intact(self, key: str, current_output: str | bytes | None) -> bool:
+        """True when the output on disk is still the one last written for ``key``."""
+        entry = self._entries.get(key)
+        return (
+            current_output is not None
+            and isinstance(entry, dict)
+            and entry.get("output") == output_digest(current_output)
+        )
+
+    def update(self, key: str, digest: str, output: str | bytes) -> None:
+        entry = {"input": digest, "output": output_digest(output)}
+        if self._entries.get(key) != entry:
+            self._entries[key] = entry
+            self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_text_atomic(self.path, json.dumps(self._entries, indent=2, sort_keys=True) + "\n")
+        self._dirty = False
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Local ledger of sketch files that have already been uploaded.
+
+The SQLite file keeps three mappings:
+
+- files:   (path, size, mtime) -> sha256, so an unchanged file is not re-hashed,
+- uploads: sha256 of the source file -> the object key it was uploaded as
+  (the uploaded bytes differ from the source when a HEIC is converted),
+- remote:  object key -> sketch id, mirrored from the sketches API change feed.
+
+A file is known to be uploaded when its hash maps to an object key that the
+API still lists, either through ``uploads`` or through the short content hash
+that ``build_object_key`` embeds in every key. A cold ledger is rebuilt by
+replaying the change feed from the start and hashing a set of files in bulk:
+
+    python3 scripts/sketch_ledger.py --rebuild ~/Pictures/Sketches
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import update_sketches_manifest as sketches_manifest
+from api_client import ApiClient, get_client
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_LEDGER = ROOT / ".cache" / "sketch-ledger.sqlite3"
+DEFAULT_API_BASE = "https://api.adamjones.ca"
+DEFAULT_HASH_JOBS = 4
+FEED_PAGE_LIMIT = 200
+API_TIMEOUT_SECONDS = 30.0
+USER_AGENT = "adamjones.ca-sketch-ledger/1.0"
+# Replaying the change feed from here returns every sketch.
+EPOCH_CURSOR = {"updated_since": "1970-01-01T00:00:00.000Z", "after": ""}
+CURSOR_KEYS = ("updated_since", "after", "deleted_since", "deleted_after")
+SHORT_HASH_LENGTH = 10
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".heic", ".heif"}
+
+_KEY_HASH_RE = re.compile(r"-([0-9a-f]{%d})\.[A-Za-z0-9]+$" % SHORT_HASH_LENGTH)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+  path TEXT PRIMARY KEY,
+  size INTEGER NOT NULL,
+  mtime_ns INTEGER NOT NULL,
+  sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS uploads (
+  sha256 TEXT PRIMARY KEY,
+  object_key TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS remote (
+  object_key TEXT PRIMARY KEY,
+  id TEXT NOT NULL,
+  key_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_remote_id ON remote (id);
+CREATE INDEX IF NOT EXISTS idx_remote_key_hash ON remote (key_hash);
+CREATE TABLE IF NOT EXISTS meta (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+"""
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def key_hash(object_key: str) -> str | None:
+    """Short content hash embedded in an object key by ``build_object_key``."""
+    match = _KEY_HASH_RE.search(object_key)
+    return match.group(1) if match else None
+
+
+class SketchLedger:
+    """Thread-safe handle on the ledger database; one connection, one lock."""
+
+    def __init__(self, path: Path = DEFAULT_LEDGER) -> None:
+        self.path = path
+        self.hashed = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self) -> SketchLedger:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def sha256(self, path: Path) -> str:
+        """Hash of ``path``, reused from the ledger while its size and mtime are unchanged."""
+        resolved = str(path.resolve())
+        stat = path.stat()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sha256 FROM files WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (resolved, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+        if row:
+            return row[0]
+        digest = file_sha256(path)
+        with self._lock, self._db:
+            self.hashed += 1
+            self._db.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (resolved, stat.st_size, stat.st_mtime_ns, digest),
+            )
+        return digest
+
+    def find_remote(self, sha256: str) -> dict | None:
+        """The remote sketch already holding this file's content, if any."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT r.object_key, r.id FROM uploads u"
+                " JOIN remote r ON r.object_key = u.object_key WHERE u.sha256 = ?",
+                (sha256,),
+            ).fetchone()
+            if row is None:
+                row = self._db.execute(
+                    "SELECT object_key, id FROM remote WHERE key_hash = ? LIMIT 1",
+                    (sha256[:SHORT_HASH_LENGTH],),
+                ).fetchone()
+        return {"object_key": row[0], "id": row[1]} if row else None
+
+    def record_upload(self, sha256: str, object_key: str, row: dict | None = None) -> None:
+        """Remember that ``sha256`` lives at ``object_key`` (and its new row, after a 201)."""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO uploads (sha256, object_key) VALUES (?, ?)",
+                (sha256, object_key),
+            )
+            if row:
+                self._apply_rows([row], [])
+
+    def sync_remote(self, client: ApiClient, api_base: str, *, full: bool = False) -> int:
+        """Mirror the API's sketches from the change feed; returns the rows applied."""
+        cursor = None if full else self.read_cursor()
+        api_url = f"{api_base.rstrip('/')}/sketches?limit={FEED_PAGE_LIMIT}"
+        rows, deleted, next_cursor = sketches_manifest.fetch_changes(
+            client, api_url, cursor or EPOCH_CURSOR, API_TIMEOUT_SECONDS
+        )
+        with self._lock, self._db:
+            if full:
+                self._db.execute("DELETE FROM remote")
+            self._apply_rows(rows, deleted)
+            if next_cursor and next_cursor != EPOCH_CURSOR:
+                for key in CURSOR_KEYS:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                        (f"cursor_{key}", str(next_cursor.get(key) or "")),
+                    )
+        return len(rows)
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                table: self._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("files", "uploads", "remote")
+            }
+
+    def read_cursor(self) -> dict | None:
+        with self._lock:
+            values = dict(
+                self._db.execute("SELECT key, value FROM meta WHERE key LIKE 'cursor_%'").fetchall()
+            )
+        if not values.get("cursor_updated_since"):
+            return None
+        cursor = {key: values.get(f"cursor_{key}", "") for key in CURSOR_KEYS}
+        # Ledgers written before the tombstone cursor existed have no deleted_since.
+        return {key: value for key, value in cursor.items() if value or key == "after"}
+
+    def _apply_rows(self, rows: list, deleted: list[str]) -> None:
+        # Callers hold the lock and the transaction.
+        for row in rows:
+            if not isinstance(row, dict):
+                continue
+            object_key = str(row.get("object_key") or "").strip()
+            row_id = str(row.get("id") or "").strip()
+            if object_key and row_id:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO remote (object_key, id, key_hash) VALUES (?, ?, ?)",
+                    (object_key, row_id, key_hash(object_key)),
+                )
+        for row_id in deleted:
+            self._db.execute("DELETE FROM remote WHERE id = ?", (row_id,))
+
+
+def _image_files(paths: list[Path]) -> list[Path]:
+    files: list[Path] = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(
+                p
+                for p in sorted(path.rglob("*"))
+                if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES
+            )
+        elif path.is_file():
+            files.append(path)
+        else:
+            raise SystemExit(f"Path does not exist: {path}")
+    return files
+
+
+def index_files(
+    ledger: SketchLedger, paths: list[Path], jobs: int = DEFAULT_HASH_JOBS
+) -> tuple[int, int]:
+    """Hash ``paths`` in bulk and link them to remote sketches; returns (files, matched)."""
+    files = _image_files(paths)
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        digests = list(pool.map(ledger.sha256, files))
+    matched = 0
+    for digest in digests:
+        remote = ledger.find_remote(digest)
+        if remote is not None:
+            ledger.record_upload(digest, remote["object_key"])
+            matched += 1
+    return len(files), matched
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Maintain the local ledger of uploaded sketch files."
+    )
+    parser.add_argument("paths", nargs="*", type=Path, help="Image files or directories to hash.")
+    parser.add_argument("--ledger", type=Path, default=DEFAULT_LEDGER)
+    parser.add_argument("--api-base", default=DEFAULT_API_BASE)
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Replay the full change feed instead of continuing from the stored cursor.",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=DEFAULT_HASH_JOBS, help="Files hashed concurrently."
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if args.jobs < 1:
+        raise SystemExit("--jobs must be >= 1")
+    client = get_client(user_agent=USER_AGENT)
+    with SketchLedger(args.ledger) as ledger:
+        rows = ledger.sync_remote(client, args.api_base, full=args.rebuild)
+        files, matched = index_files(ledger, args.paths, args.jobs)
+        counts = ledger.counts()
+        hashed = ledger.hashed
+    print(
+        f"Sketch ledger {args.ledger}: {rows} remote row(s) applied, {files} file(s) indexed "
+        f"({hashed} hashed, {matched} already uploaded); "
+        + ", ".join(f"{table}={count}" for table, count in counts.items())
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
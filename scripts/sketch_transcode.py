@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Cross-platform transcoding for uploaded sketches.
+
+Every sketch gets a size-bounded primary (long edge at most
+``PRIMARY_MAX_EDGE`` and, where the quality floor allows, at most
+``PRIMARY_MAX_BYTES``) plus fixed-width thumbnails, all in one web format. The
+card and the index snapshot use them as a ``srcset`` instead of downloading
+the original. EXIF, XMP and other metadata are dropped; only the ICC profile
+is kept so colours render the same.
+
+Pillow and the AVIF encoder are probed as in build_hn_images. HEIC/HEIF
+input also needs the ``pillow-heif`` package; without it ``convert_to_jpeg`` is
+unavailable for HEIC.
+"""
+
+from __future__ import annotations
+
+import io
+from dataclasses import dataclass
+from pathlib import Path
+
+from build_hn_images import avif_available, pillow_available  # noqa: F401
+from index_render import write_bytes_atomic
+
+PRIMARY_MAX_EDGE = 2048
+PRIMARY_MAX_BYTES = 1_500_000
+THUMB_WIDTHS = (320, 640, 960)
+FORMATS = ("webp", "avif")
+DEFAULT_FORMAT = "webp"
+QUALITY = {"webp": 80, "avif": 55}
+MIN_QUALITY = {"webp": 50, "avif": 35}
+QUALITY_STEP = 8
+JPEG_QUALITY = 90
+MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+
+
+@dataclass(frozen=True)
+class Derivative:
+    name: str
+    path: Path
+    content_type: str
+    width: int
+    height: int
+
+
+def heif_available() -> bool:
+    """Register the pillow-heif opener when installed; True if HEIC can be decoded."""
+    try:
+        import pillow_heif  # type: ignore
+    except ImportError:
+        return False
+    pillow_heif.register_heif_opener()
+    return True
+
+
+def output_format(preferred: str = DEFAULT_FORMAT) -> str:
+    """``preferred`` if this Pillow can encode it, otherwise WebP."""
+    if preferred != "avif":
+        return "webp"
+    if avif_available():
+        return "avif"
+    print("AVIF encoder not available; building WebP derivatives instead.")
+    return "webp"
+
+
+def _load(path: Path):
+    """Decode ``path`` upright, in RGB(A), with all metadata but the ICC profile dropped."""
+    from PIL import Image, ImageOps
+
+    if path.suffix.lower() in {".heic", ".heif"}:
+        heif_available()
+    with Image.open(path) as opened:
+        icc_profile = opened.info.get("icc_profile")
+        image = ImageOps.exif_transpose(opened)
+        if image.mode not in {"RGB", "RGBA"}:
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        image.load()
+    image.info = {"icc_profile": icc_profile} if icc_profile else {}
+    return image
+
+
+def _encode(image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    options = {"format": fmt.upper(), "quality": quality, "exif": b""}
+    if image.info.get("icc_profile"):
+        options["icc_profile"] = image.info["icc_profile"]
+    image.save(buffer, **options)
+    return buffer.getvalue()
+
+
+def _write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_bytes_atomic(path, data)
+
+
+def _resized(image, width: int):
+    from PIL import Image
+
+    if width >= image.width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    resized = image.resize((width, height), Image.Resampling.LANCZOS)
+    resized.info = image.info
+    return resized
+
+
+def convert_to_jpeg(source: Path, output: Path) -> None:
+    """Re-encode ``source`` (typically HEIC) as a metadata-free JPEG at ``output``."""
+    image = _load(source)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    options = {"format": "JPEG", "quality": JPEG_QUALITY, "optimize": True}
+    if image.info.get("icc_profile"):
+        options["icc_profile"] = image.info["icc_profile"]
+    image.save(buffer, **options)
+    _write(output, buffer.getvalue())
+
+
+def build_derivatives(
+    source: Path,
+    output_dir: Path,
+    *,
+    fmt: str = DEFAULT_FORMAT,
+    widths: tuple[int, ...] = THUMB_WIDTHS,
+    max_edge: int = PRIMARY_MAX_EDGE,
+    max_bytes: int = PRIMARY_MAX_BYTES,
+) -> list[Derivative]:
+    """Write thumbnails (``w<width>.<fmt>``) and ``primary.<fmt>`` for ``source``.
+
+    The source is decoded once. Thumbnails never upscale, so a small source
+    yields fewer of them. The primary is re-encoded at lower quality, down to
+    ``MIN_QUALITY``, until it fits in ``max_bytes``. Returned narrowest first.
+    """
+    image = _load(source)
+    derivatives: list[Derivative] = []
+
+    scale = min(1.0, max_edge / max(image.size))
+    primary = _resized(image, max(1, round(image.width * scale)))
+    for width in sorted({width for width in widths if 0 < width < primary.width}):
+        thumb = _resized(image, width)
+        path = output_dir / f"w{width}.{fmt}"
+        _write(path, _encode(thumb, fmt, QUALITY[fmt]))
+        derivatives.append(Derivative(path.name, path, MIME_TYPES[fmt], thumb.width, thumb.height))
+
+    quality = QUALITY[fmt]
+    data = _encode(primary, fmt, quality)
+    while len(data) > max_bytes and quality - QUALITY_STEP >= MIN_QUALITY[fmt]:
+        quality -= QUALITY_STEP
+        data = _encode(primary, fmt, quality)
+    path = output_dir / f"primary.{fmt}"
+    _write(path, data)
+    derivatives.append(Derivative(path.name, path, MIME_TYPES[fmt], primary.width, primary.height))
+    return derivatives
@@ -12,8 +12,26 @@ import re
 import subprocess
 import sys
 import tempfile
-import textwrap
+import time
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from urllib.parse import quote, urlencode
+
+import refresh_metrics
+import sketch_transcode
+import update_sketches_manifest as sketches_manifest
+from api_client import ApiClient, encode_multipart, get_client
+from chunked_upload import (
+  CHUNKED_THRESHOLD_BYTES,
+  DEFAULT_JOBS,
+  DEFAULT_PROGRESS,
+  UploadProgress,
+  upload_chunked,
+)
+from index_render import SKETCH_SNAPSHOT, render_index
+from render_cache import DEFAULT_RENDER_CACHE, RenderCache, input_digest
+from sketch_ledger import DEFAULT_LEDGER, SketchLedger
 
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -23,9 +41,16 @@ DEFAULT_INDEX = ROOT / "public" / "index.html"
 DEFAULT_ALBUM_NAME = "Daily Sketch"
 DEFAULT_FETCH_LIMIT = 200
 DEFAULT_CONVERT_HEIC_TO_JPEG = True
-
-SKETCH_START_MARK = "<!-- SKETCH_SNAPSHOT_START -->"
-SKETCH_END_MARK = "<!-- SKETCH_SNAPSHOT_END -->"
+API_TIMEOUT_SECONDS = 30.0
+UPLOAD_TIMEOUT_SECONDS = 120.0
+USER_AGENT = "adamjones.ca-daily-sketch-sync/1.0"
+SNAPSHOT_LIMIT = 4
+SNAPSHOT_RENDERER_VERSION = "2"
+# Rendered width of .sketch-image: the full card on narrow screens, otherwise
+# one of three page columns.
+SNAPSHOT_IMAGE_SIZES = "(max-width: 900px) 92vw, 30vw"
+# The <img src> fallback is the narrowest derivative at least this wide.
+SNAPSHOT_FALLBACK_WIDTH = 640
 
 ALLOWED_MIME_TYPES = {
   "image/jpeg",
@@ -112,6 +137,10 @@ def detect_content_type(path: Path) -> str:
 def convert_heic_file_to_jpeg(source_file: Path, output_dir: Path) -> tuple[Path, str]:
   base_name = sanitize_slug(source_file.stem)
   output_file = output_dir / f"{base_name}-converted.jpg"
+  # Pillow with pillow-heif works anywhere; sips is the macOS fallback.
+  if sketch_transcode.pillow_available() and sketch_transcode.heif_available():
+    sketch_transcode.convert_to_jpeg(source_file, output_file)
+    return output_file, "image/jpeg"
   run_command(
     [
       "sips",
@@ -141,7 +170,12 @@ def pick_exported_file(export_dir: Path, preferred_filename: str) -> Path:
   return max(files, key=lambda p: p.stat().st_mtime)
 
 
-def build_object_key(sketch_at: dt.datetime, exported_file: Path, content_type: str) -> str:
+def build_object_key(
+  sketch_at: dt.datetime,
+  exported_file: Path,
+  content_type: str,
+  file_sha256: str | None = None,
+) -> str:
   year = f"{sketch_at.year:04d}"
   month = f"{sketch_at.month:02d}"
   day = f"{sketch_at.day:02d}"
@@ -154,7 +188,7 @@ def build_object_key(sketch_at: dt.datetime, exported_file: Path, content_type:
     ext = exported_file.suffix.lower().lstrip(".") or "img"
 
   slug = sanitize_slug(exported_file.stem)
-  file_hash = short_sha256(exported_file)
+  file_hash = file_sha256[:10] if file_sha256 else short_sha256(exported_file)
   return (
     f"sketches/{year}/{month}/"
     f"{year}-{month}-{day}-{hh}{mm}{ss}-{slug}-{file_hash}.{ext}"
@@ -179,104 +213,139 @@ def parse_json_output(value: str) -> dict:
 
 
 def fetch_sketches_snapshot(
+  client: ApiClient,
   api_base: str,
-  client_id: str,
-  client_secret: str,
   limit: int,
-  output_file: Path,
-) -> None:
+  cursor: dict | None = None,
+) -> tuple[list, list[str]]:
+  """Rows and deleted ids of the newest ``limit`` sketches, or of the changes since ``cursor``."""
   api_url = f"{api_base.rstrip('/')}/sketches?limit={limit}"
-  cmd = [
-    "curl",
-    "-sS",
-    api_url,
-    "-H",
-    f"CF-Access-Client-Id: {client_id}",
-    "-H",
-    f"CF-Access-Client-Secret: {client_secret}",
-    "-o",
-    str(output_file),
-    "-w",
-    "%{http_code}",
-  ]
-  result = run_command(cmd)
-  status = result.stdout.strip()
-  if status != "200":
-    body = output_file.read_text(encoding="utf-8", errors="replace")[:400]
-    raise RuntimeError(f"Failed to fetch sketches snapshot (HTTP {status}): {body}")
+  if cursor is not None:
+    rows, deleted, _ = sketches_manifest.fetch_changes(
+      client, api_url, cursor, API_TIMEOUT_SECONDS
+    )
+    return rows, deleted
+  status, payload = client.request_json("GET", api_url, timeout=API_TIMEOUT_SECONDS)
+  if status != 200:
+    raise RuntimeError(
+      f"Failed to fetch sketches snapshot (HTTP {status}): {json.dumps(payload)[:400]}"
+    )
+  return sketches_manifest._payload_rows(payload)
 
 
 def upload_sketch(
+  client: ApiClient,
   api_base: str,
-  client_id: str,
-  client_secret: str,
   exported_file: Path,
   sketch_at_iso: str,
   content_type: str,
   object_key: str,
   note: str,
+  jobs: int = DEFAULT_JOBS,
+  progress: UploadProgress | None = None,
 ) -> tuple[int, dict]:
-  with tempfile.NamedTemporaryFile(prefix="sketch-upload-", suffix=".json", delete=False) as f:
-    body_path = Path(f.name)
-
+  if exported_file.stat().st_size > CHUNKED_THRESHOLD_BYTES:
+    # Large photos go up in resumable parts instead of one request.
+    return upload_chunked(
+      client,
+      api_base,
+      exported_file,
+      sketch_at=sketch_at_iso,
+      content_type=content_type,
+      object_key=object_key,
+      note=note,
+      jobs=jobs,
+      progress=progress,
+    )
+  body, multipart_type = encode_multipart(
+    {
+      "sketch_at": sketch_at_iso,
+      "note": note,
+      "object_key": object_key,
+    },
+    {"file": (exported_file.name, content_type, exported_file)},
+  )
   try:
-    cmd = [
-      "curl",
-      "-sS",
-      "-X",
+    status, payload = client.request_json(
       "POST",
       f"{api_base.rstrip('/')}/sketches/upload",
-      "-H",
-      f"CF-Access-Client-Id: {client_id}",
-      "-H",
-      f"CF-Access-Client-Secret: {client_secret}",
-      "-F",
-      f"file=@{exported_file};type={content_type}",
-      "-F",
-      f"sketch_at={sketch_at_iso}",
-      "-F",
-      f"note={note}",
-      "-F",
-      f"object_key={object_key}",
-      "-o",
-      str(body_path),
-      "-w",
-      "%{http_code}",
-    ]
-    result = run_command(cmd)
-    status_text = result.stdout.strip()
-    try:
-      status = int(status_text)
-    except ValueError as exc:
-      raise RuntimeError(f"Unexpected curl status output: {status_text}") from exc
-
-    body_text = body_path.read_text(encoding="utf-8", errors="replace")
-    try:
-      payload = json.loads(body_text)
-    except json.JSONDecodeError:
-      payload = {"raw": body_text}
-    return status, payload
+      timeout=UPLOAD_TIMEOUT_SECONDS,
+      body=body,
+      headers={"Content-Type": multipart_type},
+    )
   finally:
-    try:
-      body_path.unlink(missing_ok=True)
-    except Exception:
-      pass
+    body.close()
+  return status, payload if isinstance(payload, dict) else {"data": payload}
+
+
+def build_sketch_derivatives(
+  upload_file: Path, output_dir: Path, fmt: str
+) -> list[sketch_transcode.Derivative]:
+  """Primary and thumbnails for ``upload_file``; [] (with a warning) if they cannot be built."""
+  if fmt == "none":
+    return []
+  if not sketch_transcode.pillow_available():
+    print("Pillow is not installed; uploading without derivatives (pip install Pillow).")
+    return []
+  try:
+    return sketch_transcode.build_derivatives(
+      upload_file, output_dir, fmt=sketch_transcode.output_format(fmt)
+    )
+  except (OSError, ValueError) as exc:
+    print(f"Could not build derivatives for {upload_file.name}: {exc}", file=sys.stderr)
+    return []
 
 
-def refresh_manifest_from_snapshot(snapshot_file: Path, manifest_path: Path) -> None:
-  run_command(
-    [
-      "python3",
-      str(ROOT / "scripts" / "update_sketches_manifest.py"),
-      "--source",
-      "file",
-      "--input",
-      str(snapshot_file),
-      "--output",
-      str(manifest_path),
-    ],
-    cwd=ROOT,
+def upload_derivatives(
+  client: ApiClient,
+  api_base: str,
+  row: dict,
+  derivatives: list[sketch_transcode.Derivative],
+) -> dict:
+  """PUT each derivative onto the sketch ``row``; returns the row as last updated.
+
+  The original is already stored by now, so a failure is reported and the
+  sketch is kept without the remaining derivatives instead of failing the sync.
+  """
+  sketch_url = f"{api_base.rstrip('/')}/sketches/{quote(str(row['id']))}/derivatives"
+  for derivative in derivatives:
+    query = urlencode({"width": derivative.width, "height": derivative.height})
+    try:
+      status, payload = client.request_json(
+        "PUT",
+        f"{sketch_url}/{derivative.name}?{query}",
+        timeout=UPLOAD_TIMEOUT_SECONDS,
+        body=derivative.path.read_bytes(),
+        headers={"Content-Type": derivative.content_type},
+      )
+    except (urllib.error.URLError, TimeoutError) as exc:
+      status, payload = 0, {"error": str(exc)}
+    if status != 200:
+      print(
+        f"Derivative {derivative.name} upload failed (HTTP {status}): "
+        f"{json.dumps(payload)[:300]}",
+        file=sys.stderr,
+      )
+      return row
+    data = payload.get("data") if isinstance(payload, dict) else None
+    if isinstance(data, dict):
+      row = data
+  names = ", ".join(derivative.name for derivative in derivatives)
+  print(f"Uploaded {len(derivatives)} derivative(s) for {row.get('id')}: {names}")
+  return row
+
+
+def refresh_manifest_from_snapshot(
+  rows: list,
+  deleted: list[str],
+  manifest_path: Path,
+  merge: bool = False,
+  cache: RenderCache | None = None,
+) -> bool:
+  changed, _ = sketches_manifest.refresh_manifest(
+    manifest_path, rows, deleted, cache, merge=merge
   )
+  return changed
 
 
 def _format_snapshot_date(value: str) -> str:
@@ -284,12 +353,54 @@ def _format_snapshot_date(value: str) -> str:
   return parsed.strftime("%a, %b %d, %Y · %-I:%M %p")
 
 
-def _build_snapshot_html(manifest_path: Path, limit: int = 4) -> str:
+def load_manifest_items(manifest_path: Path) -> list[dict]:
   payload = json.loads(manifest_path.read_text(encoding="utf-8"))
   items = payload.get("items", []) if isinstance(payload, dict) else []
   if not isinstance(items, list):
     items = []
+  return items
 
+
+def snapshot_digest(items: list[dict], limit: int = SNAPSHOT_LIMIT) -> str:
+  # Captions are rendered in local time, so the zone is part of the input.
+  return input_digest(
+    SNAPSHOT_RENDERER_VERSION,
+    [time.tzname, time.timezone],
+    [
+      [str(item.get(field, "")).strip() for field in ("image_url", "sketch_at", "note")]
+      + [item.get("variants") or []]
+      for item in items[:limit]
+      if isinstance(item, dict)
+    ],
+  )
+
+
+def _build_snapshot_html(manifest_path: Path, limit: int = SNAPSHOT_LIMIT) -> str:
+  return render_snapshot_items(load_manifest_items(manifest_path), limit)
+
+
+def _snapshot_image_attrs(item: dict) -> str:
+  """src (plus srcset/sizes when the sketch has derivatives) for a snapshot <img>."""
+  image_url = str(item.get("image_url", "")).strip()
+  variants = [
+    variant
+    for variant in item.get("variants") or []
+    if isinstance(variant, dict) and variant.get("url") and variant.get("width")
+  ]
+  if not variants:
+    return f'src="{html.escape(image_url, quote=True)}"'
+  fallback = next(
+    (v for v in variants if int(v["width"]) >= SNAPSHOT_FALLBACK_WIDTH), variants[-1]
+  )
+  srcset = ", ".join(f"{v['url']} {int(v['width'])}w" for v in variants)
+  return (
+    f'src="{html.escape(str(fallback["url"]), quote=True)}"\n'
+    f'    srcset="{html.escape(srcset, quote=True)}"\n'
+    f'    sizes="{SNAPSHOT_IMAGE_SIZES}"'
+  )
+
+
+def render_snapshot_items(items: list[dict], limit: int = SNAPSHOT_LIMIT) -> str:
   if not items:
     return """<figure class="sketch-figure">
   <img
@@ -307,7 +418,7 @@ def _build_snapshot_html(manifest_path: Path, limit: int = 4) -> str:
 
   parts: list[str] = []
   for item in items[:limit]:
-    image_url = html.escape(str(item.get("image_url", "")).strip(), quote=True)
+    image_url = str(item.get("image_url", "")).strip()
     sketch_at = str(item.get("sketch_at", "")).strip()
     note = str(item.get("note", "")).strip()
     if not image_url or not sketch_at:
@@ -316,7 +427,7 @@ def _build_snapshot_html(manifest_path: Path, limit: int = 4) -> str:
       f"""<figure class="sketch-figure">
   <img
     class="sketch-image"
-    src="{image_url}"
+    {_snapshot_image_attrs(item)}
     alt="Daily sketch from {html.escape(_format_snapshot_date(sketch_at), quote=True)}"
     loading="lazy"
     decoding="async"
@@ -331,17 +442,62 @@ def _build_snapshot_html(manifest_path: Path, limit: int = 4) -> str:
   return "\n".join(parts)
 
 
-def refresh_index_snapshot(manifest_path: Path, index_path: Path) -> None:
-  content = index_path.read_text(encoding="utf-8")
-  pattern = re.compile(
-    rf"({re.escape(SKETCH_START_MARK)}\n)(.*?)(\n\s*{re.escape(SKETCH_END_MARK)})",
-    re.DOTALL,
-  )
-  snapshot_html = textwrap.indent(_build_snapshot_html(manifest_path), "                ")
-  updated, count = pattern.subn(rf"\1{snapshot_html}\3", content, count=1)
-  if count != 1:
-    raise RuntimeError("Could not find sketch snapshot markers in index.html.")
-  index_path.write_text(updated, encoding="utf-8")
+def refresh_index_snapshot(
+  manifest_path: Path,
+  index_path: Path,
+  cache: RenderCache | None = None,
+) -> bool:
+  items = load_manifest_items(manifest_path)
+  try:
+    changed = render_index(
+      index_path,
+      {SKETCH_SNAPSHOT: lambda: render_snapshot_items(items)},
+      digests={SKETCH_SNAPSHOT: snapshot_digest(items)},
+      cache=cache,
+    )
+  except ValueError as exc:
+    raise RuntimeError("Could not find sketch snapshot markers in index.html.") from exc
+  return bool(changed)
+
+
+def require_access_credentials() -> None:
+  client_id = os.getenv("CF_ACCESS_CLIENT_ID", "").strip()
+  client_secret = os.getenv("CF_ACCESS_CLIENT_SECRET", "").strip()
+  if not client_id or not client_secret:
+    raise RuntimeError(
+      "CF_ACCESS_CLIENT_ID and CF_ACCESS_CLIENT_SECRET are required in environment."
+    )
+
+
+def refresh_after_uploads(
+  client: ApiClient,
+  api_base: str,
+  limit: int,
+  manifest_path: Path,
+  index_path: Path,
+  created_rows: list[dict],
+  needs_fetch: bool,
+) -> bool:
+  """Bring the manifest and index snapshot up to date once after uploading.
+
+  Rows returned by 201 responses go straight into the manifest. The sync
+  cursor is left alone, so the next feed read picks them up again along with
+  anything else that changed in the meantime. ``needs_fetch`` (a 409 or a 201
+  without a usable row) reads the change feed instead.
+  """
+  render_cache = RenderCache(DEFAULT_RENDER_CACHE)
+  rows = [row for row in created_rows if sketches_manifest._normalize_items([row], 1)]
+  if rows:
+    sketches_manifest._apply_changes(manifest_path, rows, cache=render_cache)
+  if needs_fetch or len(rows) < len(created_rows):
+    cursor = sketches_manifest.read_cursor(manifest_path)
+    fetched, deleted = fetch_sketches_snapshot(client, api_base, limit, cursor)
+    refresh_manifest_from_snapshot(
+      fetched, deleted, manifest_path, merge=cursor is not None, cache=render_cache
+    )
+  changed = refresh_index_snapshot(manifest_path, index_path, render_cache)
+  render_cache.save()
+  return changed
 
 
 def sync_daily_sketch(
@@ -353,13 +509,11 @@ def sync_daily_sketch(
   limit: int,
   note: str,
   convert_heic_to_jpeg: bool,
+  upload_jobs: int = DEFAULT_JOBS,
+  ledger_path: Path = DEFAULT_LEDGER,
+  derivative_format: str = sketch_transcode.DEFAULT_FORMAT,
 ) -> int:
-  client_id = os.getenv("CF_ACCESS_CLIENT_ID", "").strip()
-  client_secret = os.getenv("CF_ACCESS_CLIENT_SECRET", "").strip()
-  if not client_id or not client_secret:
-    raise RuntimeError(
-      "CF_ACCESS_CLIENT_ID and CF_ACCESS_CLIENT_SECRET are required in environment."
-    )
+  require_access_credentials()
 
   export_script = ROOT / "scripts" / "export_latest_photo_from_album.applescript"
   if not export_script.exists():
@@ -383,6 +537,7 @@ def sync_daily_sketch(
         print(f'No items in Photos album "{album_name}".')
         return 0
       raise RuntimeError(f"Photos export did not return success: {metadata}")
+    refresh_metrics.count("items")
 
     preferred_filename = str(metadata.get("filename") or "")
     sketch_at_text = str(metadata.get("sketch_at") or "").strip()
@@ -398,46 +553,317 @@ def sync_daily_sketch(
       raise RuntimeError(
         f"Unsupported exported file type: {exported_file.name} ({content_type or 'unknown'})"
       )
+
+    client = get_client(user_agent=USER_AGENT)
+    created: dict = {}
+    with SketchLedger(ledger_path) as ledger:
+      # Photos exports land in a fresh temp dir, so this always hashes; the
+      # ledger still saves the HEIC conversion and the upload of a known photo.
+      source_sha256 = ledger.sha256(exported_file)
+      known = ledger.find_remote(source_sha256)
+      if known is None:
+        # Only a miss needs the API's view, so a known photo is skipped offline.
+        ledger.sync_remote(client, api_base)
+        known = ledger.find_remote(source_sha256)
+      if known is not None:
+        print(f"Sketch already uploaded as {known['object_key']}; skipping upload.")
+        return 0
+      upload_hash = source_sha256
+      if convert_heic_to_jpeg and content_type in {"image/heic", "image/heif"}:
+        converted_file, converted_type = convert_heic_file_to_jpeg(exported_file, export_dir)
+        print(f"Converted {exported_file.name} to {converted_file.name} for web compatibility.")
+        exported_file = converted_file
+        content_type = converted_type
+        upload_hash = None
+
+      object_key = build_object_key(sketch_at, exported_file, content_type, upload_hash)
+      derivatives = build_sketch_derivatives(
+        exported_file, export_dir / "derivatives", derivative_format
+      )
+      status, payload = upload_sketch(
+        client=client,
+        api_base=api_base,
+        exported_file=exported_file,
+        sketch_at_iso=sketch_at_iso,
+        content_type=content_type,
+        object_key=object_key,
+        note=note.strip(),
+        jobs=upload_jobs,
+      )
+
+      if status == 201:
+        data = payload.get("data") if isinstance(payload, dict) else None
+        created = data if isinstance(data, dict) else {}
+        print(
+          "Uploaded sketch:",
+          created.get("id"),
+          created.get("sketch_at"),
+          created.get("image_url"),
+        )
+        if derivatives and created.get("id"):
+          created = upload_derivatives(client, api_base, created, derivatives)
+      elif status == 409:
+        print(f"Sketch already uploaded for object key: {object_key}")
+      else:
+        raise RuntimeError(f"Upload failed (HTTP {status}): {json.dumps(payload)}")
+      ledger.record_upload(source_sha256, object_key, created)
+
+    changed = refresh_after_uploads(
+      client,
+      api_base,
+      limit,
+      manifest_path,
+      index_path,
+      [created] if created else [],
+      needs_fetch=not created,
+    )
+    print(f"Updated sketch manifest: {manifest_path}")
+    print(f"Updated sketch snapshot in: {index_path} (changed={str(changed).lower()})")
+    return 0
+
+
+def collect_batch_files(
+  paths: list[Path], list_file: Path | None
+) -> list[tuple[Path, dt.datetime]]:
+  """Resolve backfill inputs to (image file, sketch_at) pairs.
+
+  ``list_file`` lines are "<ISO-8601 timestamp>,<path>" (paths relative to
+  the list file; blank lines and # comments are skipped). Files given
+  directly, or found under a directory, use their modification time.
+  """
+  entries: list[tuple[Path, dt.datetime]] = []
+  if list_file is not None:
+    for number, line in enumerate(list_file.read_text(encoding="utf-8").splitlines(), start=1):
+      text = line.strip()
+      if not text or text.startswith("#"):
+        continue
+      stamp, _, raw_path = text.partition(",")
+      try:
+        sketch_at = parse_iso_utc(stamp)
+      except ValueError:
+        raise RuntimeError(f"{list_file}:{number}: invalid timestamp {stamp!r}") from None
+      path = Path(raw_path.strip()).expanduser()
+      if not path.is_absolute():
+        path = list_file.parent / path
+      if not path.is_file():
+        raise RuntimeError(f"{list_file}:{number}: missing file {path}")
+      entries.append((path, sketch_at))
+
+  for path in paths:
+    if path.is_dir():
+      files = sorted(
+        p for p in path.rglob("*") if p.is_file() and p.suffix.lower() in EXTENSION_TO_MIME
+      )
+    elif path.is_file():
+      files = [path]
+    else:
+      raise RuntimeError(f"Batch input does not exist: {path}")
+    for file in files:
+      mtime = dt.datetime.fromtimestamp(file.stat().st_mtime, dt.timezone.utc)
+      entries.append((file, mtime.replace(microsecond=0)))
+
+  seen: set[Path] = set()
+  unique = []
+  for path, sketch_at in entries:
+    resolved = path.resolve()
+    if resolved not in seen:
+      seen.add(resolved)
+      unique.append((path, sketch_at))
+  return unique
+
+
+def backfill_one(
+  client: ApiClient,
+  ledger: SketchLedger,
+  api_base: str,
+  source_file: Path,
+  sketch_at: dt.datetime,
+  work_dir: Path,
+  note: str,
+  convert_heic_to_jpeg: bool,
+  upload_jobs: int,
+  derivative_format: str = sketch_transcode.DEFAULT_FORMAT,
+  progress: UploadProgress | None = None,
+) -> dict:
+  """Hash, convert and upload one file; never raises, failures are in the result."""
+  started = time.perf_counter()
+  result = {
+    "file": source_file,
+    "status": None,
+    "row": None,
+    "bytes": 0,
+    "error": "",
+    "skipped": None,
+  }
+  try:
+    upload_file = source_file
+    content_type = detect_content_type(upload_file)
+    if content_type not in ALLOWED_MIME_TYPES:
+      raise RuntimeError(f"unsupported file type ({content_type or 'unknown'})")
+    source_sha256 = ledger.sha256(source_file)
+    known = ledger.find_remote(source_sha256)
+    if known is not None:
+      result["skipped"] = known["object_key"]
+      result["seconds"] = time.perf_counter() - started
+      return result
+    upload_hash = source_sha256
     if convert_heic_to_jpeg and content_type in {"image/heic", "image/heif"}:
-      converted_file, converted_type = convert_heic_file_to_jpeg(exported_file, export_dir)
-      print(f"Converted {exported_file.name} to {converted_file.name} for web compatibility.")
-      exported_file = converted_file
-      content_type = converted_type
+      work_dir.mkdir(parents=True, exist_ok=True)
+      upload_file, content_type = convert_heic_file_to_jpeg(upload_file, work_dir)
+      upload_hash = None
 
-    object_key = build_object_key(sketch_at, exported_file, content_type)
+    object_key = build_object_key(sketch_at, upload_file, content_type, upload_hash)
+    derivatives = build_sketch_derivatives(upload_file, work_dir / "derivatives", derivative_format)
+    result["bytes"] = upload_file.stat().st_size
     status, payload = upload_sketch(
+      client=client,
       api_base=api_base,
-      client_id=client_id,
-      client_secret=client_secret,
-      exported_file=exported_file,
-      sketch_at_iso=sketch_at_iso,
+      exported_file=upload_file,
+      sketch_at_iso=sketch_at.isoformat(timespec="seconds").replace("+00:00", "Z"),
       content_type=content_type,
       object_key=object_key,
-      note=note.strip(),
+      note=note,
+      jobs=upload_jobs,
+      progress=progress,
     )
-
+    result["status"] = status
     if status == 201:
-      created = payload.get("data") if isinstance(payload, dict) else {}
-      print(
-        "Uploaded sketch:",
-        created.get("id"),
-        created.get("sketch_at"),
-        created.get("image_url"),
-      )
-    elif status == 409:
-      print(f"Sketch already uploaded for object key: {object_key}")
-    else:
-      raise RuntimeError(f"Upload failed (HTTP {status}): {json.dumps(payload)}")
+      data = payload.get("data") if isinstance(payload, dict) else None
+      result["row"] = data if isinstance(data, dict) else {}
+      if derivatives and result["row"].get("id"):
+        result["row"] = upload_derivatives(client, api_base, result["row"], derivatives)
+        result["bytes"] += sum(derivative.path.stat().st_size for derivative in derivatives)
+    elif status != 409:
+      result["error"] = f"HTTP {status}: {json.dumps(payload)[:300]}"
+    if status in {201, 409}:
+      ledger.record_upload(source_sha256, object_key, result["row"])
+  except Exception as exc:
+    result["error"] = str(exc) or type(exc).__name__
+  result["seconds"] = time.perf_counter() - started
+  return result
 
-    snapshot_file = export_dir / "sketches-api.json"
-    fetch_sketches_snapshot(api_base, client_id, client_secret, limit, snapshot_file)
-    refresh_manifest_from_snapshot(snapshot_file, manifest_path)
-    refresh_index_snapshot(manifest_path, index_path)
-    print(f"Updated sketch manifest: {manifest_path}")
-    print(f"Updated sketch snapshot in: {index_path}")
+
+def _known_remote(ledger: SketchLedger, path: Path) -> bool:
+  """Whether the ledger already maps ``path`` to a remote sketch; unreadable files are misses."""
+  try:
+    return ledger.find_remote(ledger.sha256(path)) is not None
+  except OSError:
+    return False
+
+
+def _format_rate(size: int, seconds: float) -> str:
+  return f"{size / 1e6:.1f} MB in {seconds:.1f}s ({size / 1e6 / max(seconds, 1e-6):.1f} MB/s)"
+
+
+def sync_batch(
+  *,
+  files: list[tuple[Path, dt.datetime]],
+  api_base: str,
+  index_path: Path,
+  manifest_path: Path,
+  limit: int,
+  note: str,
+  convert_heic_to_jpeg: bool,
+  jobs: int,
+  upload_jobs: int = DEFAULT_JOBS,
+  ledger_path: Path = DEFAULT_LEDGER,
+  derivative_format: str = sketch_transcode.DEFAULT_FORMAT,
+) -> int:
+  """Upload many sketches concurrently, then refresh the manifest and index once.
+
+  Files the ledger already maps to a remote sketch are skipped without being
+  hashed again (when unchanged on disk) or uploaded. The ledger is synced from
+  the API once, and only when some file is not known locally.
+  """
+  require_access_credentials()
+  if not files:
+    print("No sketch files to backfill.")
     return 0
 
+  client = get_client(user_agent=USER_AGENT)
+  started = time.perf_counter()
+  results: list[dict] = []
+  ledger = SketchLedger(ledger_path)
+  # One progress file shared by every upload, so their saves never clobber
+  # each other's pending parts.
+  progress = UploadProgress(DEFAULT_PROGRESS)
+  try:
+    with tempfile.TemporaryDirectory(prefix="daily-sketch-batch-") as tmp:
+      with ThreadPoolExecutor(max_workers=jobs) as pool:
+        misses = sum(
+          not known for known in pool.map(lambda entry: _known_remote(ledger, entry[0]), files)
+        )
+        if misses:
+          try:
+            ledger.sync_remote(client, api_base)
+          except (urllib.error.URLError, TimeoutError) as exc:
+            # Known files are still skipped; the uploads report their own errors.
+            print(f"Could not sync the ledger from the API: {exc}", file=sys.stderr)
+        futures = [
+          pool.submit(
+            backfill_one,
+            client,
+            ledger,
+            api_base,
+            path,
+            sketch_at,
+            Path(tmp) / str(position),
+            note,
+            convert_heic_to_jpeg,
+            upload_jobs,
+            derivative_format,
+            progress,
+          )
+          for position, (path, sketch_at) in enumerate(files)
+        ]
+        for future in as_completed(futures):
+          result = future.result()
+          results.append(result)
+          name = result["file"].name
+          if result["error"]:
+            print(f"FAIL    {name}: {result['error']}")
+          elif result["skipped"]:
+            print(f"skip    {name}: {result['skipped']}")
+          elif result["status"] == 409:
+            print(f"exists  {name}")
+          else:
+            row_id = (result["row"] or {}).get("id", "?")
+            print(f"ok      {name}: {_format_rate(result['bytes'], result['seconds'])} -> {row_id}")
+  finally:
+    ledger.close()
+
+  elapsed = time.perf_counter() - started
+  refresh_metrics.count("items", len(files))
+  created = [r for r in results if r["status"] == 201]
+  existing = [r for r in results if r["status"] == 409 and not r["error"]]
+  failed = [r for r in results if r["error"]]
+  skipped = [r for r in results if r["skipped"]]
+  uploaded_bytes = sum(r["bytes"] for r in created)
+  print(
+    f"Backfilled {len(files)} file(s) with {jobs} worker(s): {len(created)} uploaded, "
+    f"{len(existing)} already present, {len(skipped)} skipped by the ledger, "
+    f"{len(failed)} failed; "
+    f"{_format_rate(uploaded_bytes, elapsed)} overall."
+  )
+
+  if created or existing:
+    changed = refresh_after_uploads(
+      client,
+      api_base,
+      limit,
+      manifest_path,
+      index_path,
+      [r["row"] for r in created],
+      needs_fetch=bool(existing),
+    )
+    print(f"Updated sketch manifest: {manifest_path}")
+    print(f"Updated sketch snapshot in: {index_path} (changed={str(changed).lower()})")
+  for result in failed:
+    print(f"failed: {result['file']}: {result['error']}", file=sys.stderr)
+  return 1 if failed else 0
 
+
+@refresh_metrics.instrumented("sync_daily_sketch_from_photos")
 def main() -> int:
   parser = argparse.ArgumentParser()
   parser.add_argument("--album-name", default=DEFAULT_ALBUM_NAME)
@@ -451,17 +877,75 @@ def main() -> int:
     action="store_true",
     help="Do not auto-convert HEIC/HEIF to JPEG before upload.",
   )
+  parser.add_argument(
+    "--derivative-format",
+    choices=[*sketch_transcode.FORMATS, "none"],
+    default=sketch_transcode.DEFAULT_FORMAT,
+    help="Format of the web primary and thumbnails uploaded with each sketch (needs Pillow).",
+  )
+  parser.add_argument(
+    "--ledger",
+    type=Path,
+    default=DEFAULT_LEDGER,
+    help="SQLite ledger of uploaded files (rebuild with scripts/sketch_ledger.py --rebuild).",
+  )
+  parser.add_argument(
+    "--batch",
+    type=Path,
+    nargs="+",
+    default=[],
+    metavar="PATH",
+    help="Backfill these image files or directories (sketch_at = file mtime) instead of Photos.",
+  )
+  parser.add_argument(
+    "--batch-list",
+    type=Path,
+    default=None,
+    help='Backfill from a file of "<ISO-8601 timestamp>,<image path>" lines.',
+  )
+  parser.add_argument(
+    "--jobs",
+    type=int,
+    default=4,
+    help="Files processed concurrently in batch mode.",
+  )
+  parser.add_argument(
+    "--upload-jobs",
+    type=int,
+    default=DEFAULT_JOBS,
+    help="Parallel part uploads for large photos (resumable chunked upload).",
+  )
   parser.add_argument(
     "--best-effort",
     action="store_true",
     help="On any failure, print warning and exit 0.",
   )
+  refresh_metrics.add_arguments(parser)
   args = parser.parse_args()
+  refresh_metrics.configure(args)
 
   if args.limit < 1:
     raise SystemExit("--limit must be >= 1")
+  if args.upload_jobs < 1:
+    raise SystemExit("--upload-jobs must be >= 1")
+  if args.jobs < 1:
+    raise SystemExit("--jobs must be >= 1")
 
   try:
+    if args.batch or args.batch_list:
+      return sync_batch(
+        files=collect_batch_files(args.batch, args.batch_list),
+        api_base=args.api_base.strip(),
+        index_path=args.index_path,
+        manifest_path=args.manifest_path,
+        limit=args.limit,
+        note=args.note,
+        convert_heic_to_jpeg=DEFAULT_CONVERT_HEIC_TO_JPEG and (not args.keep_heic),
+        jobs=args.jobs,
+        upload_jobs=args.upload_jobs,
+        ledger_path=args.ledger,
+        derivative_format=args.derivative_format,
+      )
     return sync_daily_sketch(
       album_name=args.album_name.strip(),
       api_base=args.api_base.strip(),
@@ -470,6 +954,9 @@ def main() -> int:
       limit=args.limit,
       note=args.note,
       convert_heic_to_jpeg=DEFAULT_CONVERT_HEIC_TO_JPEG and (not args.keep_heic),
+      upload_jobs=args.upload_jobs,
+      ledger_path=args.ledger,
+      derivative_format=args.derivative_format,
     )
   except Exception as exc:
     if args.best_effort:
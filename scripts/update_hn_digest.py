@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Render the Hacker News panel in public/index.html from data/hn/digest.json.
+
+The cards (kicker, title and thumbnail) are rendered into the HN_DIGEST block
+and the panel label into HN_DIGEST_META. The long "From link" / "From
+comments" summaries are not inlined: they are written to a separate JSON
+fragment that public/js/hn-stories.js fetches the first time a card is
+expanded; build_dist.py precompresses it with the rest of the site.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import html
+import json
+from pathlib import Path
+
+import refresh_metrics
+from build_hn_images import build_pictures, pillow_available
+from index_render import HN_DIGEST, HN_DIGEST_META, render_index, write_bytes_atomic
+from render_cache import DEFAULT_RENDER_CACHE, RenderCache, input_digest
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_INPUT = ROOT / "data" / "hn" / "digest.json"
+DEFAULT_INDEX = ROOT / "public" / "index.html"
+DEFAULT_STORIES = ROOT / "public" / "data" / "hn-stories.json"
+RENDERER_VERSION = "1"
+STORY_FIELDS = ("link_summary", "comments_summary")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Render HN digest cards into public/index.html and write the story payload."
+    )
+    parser.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    parser.add_argument("--index-path", type=Path, default=DEFAULT_INDEX)
+    parser.add_argument(
+        "--stories-path",
+        type=Path,
+        default=DEFAULT_STORIES,
+        help="Where the lazily loaded story bodies are written (inside public/).",
+    )
+    parser.add_argument(
+        "--no-variants",
+        action="store_true",
+        help="Render plain <img> thumbnails instead of building responsive variants.",
+    )
+    parser.add_argument(
+        "--render-cache",
+        type=Path,
+        default=DEFAULT_RENDER_CACHE,
+        help="Sidecar state file used to skip re-rendering unchanged digests.",
+    )
+    refresh_metrics.add_arguments(parser)
+    return parser.parse_args()
+
+
+def load_digest(path: Path) -> dict:
+    if not path.exists():
+        raise SystemExit(f"Missing HN digest: {path}")
+    payload = json.loads(path.read_text(encoding="utf-8"))
+    stories = payload.get("stories") if isinstance(payload, dict) else None
+    if not isinstance(stories, list):
+        raise SystemExit(f"Expected a stories array in {path}")
+    for index, story in enumerate(stories, start=1):
+        if not isinstance(story, dict) or not str(story.get("id", "")).strip():
+            raise SystemExit(f"Story {index} in {path} has no id")
+    return payload
+
+
+def build_stories_payload(digest: dict) -> str:
+    stories = {
+        str(story["id"]): {field: str(story.get(field, "")).strip() for field in STORY_FIELDS}
+        for story in digest["stories"]
+    }
+    payload = {"version": 1, "date": digest.get("date"), "stories": stories}
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":")) + "\n"
+
+
+def stories_url(index_path: Path, stories_path: Path, payload: str) -> str:
+    """URL of the payload relative to the page, versioned by its content hash."""
+    relative = stories_path.resolve().relative_to(index_path.resolve().parent).as_posix()
+    version = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:12]
+    return f"{relative}?v={version}"
+
+
+def write_stories(path: Path, text: str) -> bool:
+    """Write the story payload unless ``path`` already holds it; returns True if written.
+
+    The .gz/.br siblings are built with the rest of the site by build_dist.py.
+    """
+    data = text.encode("utf-8")
+    if path.exists() and path.read_bytes() == data:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_bytes_atomic(path, data)
+    return True
+
+
+def build_meta(digest: dict) -> str:
+    label = str(digest.get("label") or digest.get("date") or "").strip()
+    return f'<span class="panel-meta">{html.escape(label)}</span>'
+
+
+def build_cards(digest: dict, stories_href: str) -> str:
+    parts = [f'<div class="hn-grid" data-hn-stories="{html.escape(stories_href)}">']
+    for index, story in enumerate(digest["stories"], start=1):
+        rank = html.escape(str(story.get("rank", index)))
+        title = html.escape(str(story.get("title", "")).strip() or f"Story {index}")
+        url = html.escape(str(story.get("url", "")).strip())
+        hn_url = html.escape(str(story.get("hn_url", "")).strip())
+        story_id = html.escape(str(story["id"]))
+        image = str(story.get("image", "")).strip()
+        thumbnail = ""
+        if image:
+            thumbnail = (
+                f'<img class="hn-image" src="{html.escape(image)}" '
+                f'alt="{html.escape(str(story.get("image_alt", "")).strip())}" '
+                'loading="lazy" decoding="async" />'
+            )
+        parts.append(
+            f"""  <article class="hn-card">
+    <p class="hn-kicker">No. {rank} · <a href="{hn_url}" rel="noopener">HN</a></p>
+    <h3 class="hn-title"><a href="{url}" rel="noopener">{title}</a></h3>
+    <input class="hn-toggle" type="checkbox" id="hn-more-{index}" />
+    <div class="hn-story" id="hn-story-{index}" data-hn-story="{story_id}">{thumbnail}</div><label class="hn-more" for="hn-more-{index}" aria-controls="hn-story-{index}"><span class="more">More</span><span class="less">Less</span></label>
+  </article>"""
+        )
+    parts.append("</div>")
+    return "\n".join(parts)
+
+
+def cards_digest(digest: dict, stories_href: str, variants: bool) -> str:
+    return input_digest(
+        RENDERER_VERSION,
+        [
+            [
+                str(story.get(field, "")).strip()
+                for field in ("id", "rank", "title", "url", "hn_url", "image", "image_alt")
+            ]
+            for story in digest["stories"]
+        ],
+        stories_href,
+        variants,
+    )
+
+
+@refresh_metrics.instrumented("update_hn_digest")
+def main() -> int:
+    args = parse_args()
+    refresh_metrics.configure(args)
+    with refresh_metrics.phase("decode"):
+        digest = load_digest(args.input)
+    index_path: Path = args.index_path
+    refresh_metrics.count("items", len(digest["stories"]))
+
+    with refresh_metrics.phase("normalize"):
+        payload = build_stories_payload(digest)
+    written = write_stories(args.stories_path, payload)
+    href = stories_url(index_path, args.stories_path, payload)
+    variants = not args.no_variants and pillow_available()
+
+    def render_cards() -> str:
+        cards = build_cards(digest, href)
+        if variants:
+            cards, _ = build_pictures(cards, index_path)
+        return cards
+
+    cache = RenderCache(args.render_cache)
+    try:
+        changed = render_index(
+            index_path,
+            {HN_DIGEST: render_cards, HN_DIGEST_META: lambda: build_meta(digest)},
+            digests={
+                HN_DIGEST: cards_digest(digest, href, variants),
+                HN_DIGEST_META: input_digest(RENDERER_VERSION, build_meta(digest)),
+            },
+            cache=cache,
+        )
+    except ValueError as exc:
+        raise SystemExit(str(exc)) from None
+    cache.save()
+
+    if not args.no_variants and not variants:
+        print("Pillow not installed; rendered plain <img> thumbnails.")
+    print(
+        f"Rendered {len(digest['stories'])} HN card(s); "
+        f"story payload {'written' if written else 'unchanged'} "
+        f"({len(payload.encode('utf-8'))} bytes). "
+        f"changed={','.join(changed) or 'none'}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
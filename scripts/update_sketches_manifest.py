@@ -3,22 +3,40 @@ from __future__ import annotations
 
 import argparse
 import datetime as dt
+import hashlib
+import heapq
 import json
-import os
 import ssl
 import sys
 import urllib.error
-import urllib.request
 from pathlib import Path
-from urllib.parse import urlparse
+from typing import Iterable, Iterator, TextIO
+from urllib.parse import parse_qsl, urlencode, urlparse, urlsplit, urlunsplit
+
+import refresh_metrics
+from api_client import (
+  DEFAULT_VALIDATOR_CACHE,
+  ApiClient,
+  NotModified,
+  ValidatorCache,
+  get_client,
+)
+from index_render import write_text_atomic
+from render_cache import DEFAULT_RENDER_CACHE, RenderCache, input_digest
 
 
 ROOT = Path(__file__).resolve().parents[1]
-DEFAULT_OUTPUT = ROOT / "public" / "data" / "sketch.json"
+SITE_ROOT = ROOT / "public"
+DEFAULT_OUTPUT = SITE_ROOT / "data" / "sketch.json"
+SHARD_DIRNAME = "sketches"
 DEFAULT_INPUT = ROOT / "data" / "sketches" / "sketches-snapshot.json"
 DEFAULT_API_URL = "https://api.adamjones.ca/sketches?limit=200"
 
+DEFAULT_LIMIT = 200
 MAX_NOTE_LENGTH = 280
+STREAM_CHUNK_SIZE = 64 * 1024
+MANIFEST_RENDERER_VERSION = "3"
+DEFAULT_INDEX_ITEMS = 12
 
 
 def _parse_iso_datetime(value: str) -> dt.datetime | None:
@@ -46,9 +64,35 @@ def _is_valid_http_url(value: str) -> bool:
   return parsed.scheme in {"http", "https"} and bool(parsed.netloc)
 
 
-def _normalize_items(items: list[dict], limit: int) -> list[dict]:
-  normalized: list[tuple[dt.datetime, dict]] = []
-  for raw in items:
+def _normalize_variants(derivatives: object) -> list[dict]:
+  """Web-format derivatives of a row as [{url, width}], narrowest first."""
+  if not isinstance(derivatives, list):
+    return []
+  variants = {}
+  for derivative in derivatives:
+    if not isinstance(derivative, dict):
+      continue
+    url = str(derivative.get("url") or "").strip()
+    try:
+      width = int(derivative.get("width") or 0)
+    except (TypeError, ValueError):
+      continue
+    if width > 0 and _is_valid_http_url(url):
+      variants.setdefault(width, {"url": url, "width": width})
+  return [variants[width] for width in sorted(variants)]
+
+
+def _normalize_items(items: Iterable, limit: int) -> list[dict]:
+  """Validate rows and return the newest ``limit`` of them, newest first.
+
+  Only ``limit`` candidates are held in a heap, and a row older than the
+  current cut-off is dropped before its URL is validated, so time and memory
+  stay flat for archive exports with thousands of rows.
+  """
+  if limit < 1:
+    return []
+  heap: list[tuple[dt.datetime, int, dict]] = []
+  for position, raw in enumerate(items):
     if not isinstance(raw, dict):
       continue
 
@@ -60,59 +104,187 @@ def _normalize_items(items: list[dict], limit: int) -> list[dict]:
     if not sketch_at_dt:
       continue
 
+    # Earlier rows win ties, as they would in a stable newest-first sort.
+    rank = (sketch_at_dt, -position)
+    if len(heap) >= limit and rank <= heap[0][:2]:
+      continue
+
     image_url = str(raw.get("image_url") or "").strip()
     if not image_url or not _is_valid_http_url(image_url):
       continue
 
     note = str(raw.get("note") or "").strip()[:MAX_NOTE_LENGTH]
 
-    normalized.append(
-      (
-        sketch_at_dt,
-        {
-          "id": item_id,
-          "sketch_at": sketch_at_dt.isoformat().replace("+00:00", "Z"),
-          "image_url": image_url,
-          "note": note,
-        },
-      )
-    )
-
-  normalized.sort(key=lambda item: item[0], reverse=True)
-  return [item for _, item in normalized[:limit]]
-
-
-def _load_from_file(path: Path, limit: int) -> list[dict]:
-  payload = json.loads(path.read_text(encoding="utf-8"))
+    item = {
+      "id": item_id,
+      "sketch_at": sketch_at_dt.isoformat().replace("+00:00", "Z"),
+      "image_url": image_url,
+      "note": note,
+    }
+    variants = _normalize_variants(raw.get("derivatives") or raw.get("variants"))
+    if variants:
+      item["variants"] = variants
+    entry = (*rank, item)
+    if len(heap) < limit:
+      heapq.heappush(heap, entry)
+    else:
+      heapq.heapreplace(heap, entry)
+
+  heap.sort(reverse=True)
+  return [item for _, _, item in heap]
+
+
+class _JsonStream:
+  """Pull reader that decodes one JSON value at a time from a text file."""
+
+  def __init__(self, handle: TextIO, chunk_size: int = STREAM_CHUNK_SIZE) -> None:
+    self._handle = handle
+    self._chunk_size = chunk_size
+    self._decoder = json.JSONDecoder()
+    self._buffer = ""
+    self._pos = 0
+    self._eof = False
+
+  def _fill(self) -> bool:
+    if self._eof:
+      return False
+    chunk = self._handle.read(self._chunk_size)
+    if not chunk:
+      self._eof = True
+      return False
+    self._buffer = self._buffer[self._pos :] + chunk
+    self._pos = 0
+    return True
+
+  def peek(self) -> str:
+    """Next non-whitespace character, or "" at end of input."""
+    while True:
+      while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+        self._pos += 1
+      if self._pos < len(self._buffer):
+        return self._buffer[self._pos]
+      if not self._fill():
+        return ""
+
+  def take(self, expected: str) -> None:
+    if self.peek() != expected:
+      raise json.JSONDecodeError(f"Expecting {expected!r}", self._buffer, self._pos)
+    self._pos += 1
+
+  def value(self) -> object:
+    self.peek()
+    while True:
+      try:
+        value, end = self._decoder.raw_decode(self._buffer, self._pos)
+      except json.JSONDecodeError:
+        if self._fill():
+          continue
+        raise
+      # A number that ends the buffer may continue in the next chunk.
+      if end == len(self._buffer) and self._fill():
+        continue
+      self._pos = end
+      return value
+
+  def array(self) -> Iterator[object]:
+    self.take("[")
+    if self.peek() == "]":
+      self._pos += 1
+      return
+    while True:
+      yield self.value()
+      if self.peek() == "]":
+        self._pos += 1
+        return
+      self.take(",")
+
+
+def _clean_ids(values: object) -> list[str]:
+  if not isinstance(values, list):
+    return []
+  return [str(item_id).strip() for item_id in values if str(item_id).strip()]
+
+
+def _payload_rows(payload: object) -> tuple[list, list[str]]:
+  """Rows and deleted ids of a list response, change feed or snapshot file."""
   if isinstance(payload, dict):
-    items = payload.get("data") or payload.get("items") or []
+    rows = payload.get("data") or payload.get("items") or []
+    deleted = payload.get("deleted") or []
   elif isinstance(payload, list):
-    items = payload
+    rows, deleted = payload, []
   else:
-    items = []
-  return _normalize_items(items, limit)
+    rows, deleted = [], []
+  return rows, _clean_ids(deleted)
+
+
+def _stream_rows(path: Path, deleted: list[str]) -> Iterator[object]:
+  """Yield the rows of a snapshot file one at a time, like ``_payload_rows``.
+
+  The first non-empty "data" or "items" array is streamed; "deleted" ids are
+  appended to ``deleted`` as they are read, which may be after the last row.
+  """
+  with path.open(encoding="utf-8") as handle:
+    stream = _JsonStream(handle)
+    if stream.peek() == "[":
+      yield from stream.array()
+      return
+    if stream.peek() != "{":
+      stream.value()
+      return
+
+    stream.take("{")
+    found_rows = False
+    while stream.peek() != "}":
+      key = stream.value()
+      stream.take(":")
+      if key in {"data", "items"} and not found_rows and stream.peek() == "[":
+        for row in stream.array():
+          found_rows = True
+          yield row
+      elif key == "deleted":
+        deleted.extend(_clean_ids(stream.value()))
+      else:
+        stream.value()
+      if stream.peek() != "}":
+        stream.take(",")
+
+
+def _read_rows_from_file(path: Path) -> tuple[Iterator[object], list[str]]:
+  """Streamed rows and deleted ids; the ids are complete once the rows are consumed."""
+  deleted: list[str] = []
+  return _stream_rows(path, deleted), deleted
+
+
+def _load_from_file(path: Path, limit: int) -> list[dict]:
+  rows, _ = _read_rows_from_file(path)
+  return _normalize_items(rows, limit)
+
+
+def fetch_rows(
+  api_url: str,
+  timeout: float,
+  client: ApiClient,
+  validators: ValidatorCache | None = None,
+  validator_key: str | None = None,
+) -> list:
+  payload = client.get_json(
+    api_url, timeout=timeout, validators=validators, validator_key=validator_key
+  )
+  rows, _ = _payload_rows(payload)
+  return rows
 
 
 def _load_from_api(
   api_url: str,
   timeout: float,
   limit: int,
-  ssl_context: ssl.SSLContext,
+  client: ApiClient,
+  validators: ValidatorCache | None = None,
+  validator_key: str | None = None,
 ) -> list[dict]:
-  headers = {"accept": "application/json"}
-  client_id = os.getenv("CF_ACCESS_CLIENT_ID")
-  client_secret = os.getenv("CF_ACCESS_CLIENT_SECRET")
-  if client_id and client_secret:
-    headers["CF-Access-Client-Id"] = client_id
-    headers["CF-Access-Client-Secret"] = client_secret
-
-  req = urllib.request.Request(api_url, headers=headers, method="GET")
-  with urllib.request.urlopen(req, timeout=timeout, context=ssl_context) as resp:
-    body = resp.read().decode("utf-8")
-
-  payload = json.loads(body)
-  items = payload.get("data") or payload.get("items") or []
-  return _normalize_items(items, limit)
+  rows = fetch_rows(api_url, timeout, client, validators, validator_key)
+  with refresh_metrics.phase("normalize"):
+    return _normalize_items(rows, limit)
 
 
 def _load_items(
@@ -120,33 +292,437 @@ def _load_items(
   input_path: Path,
   api_url: str,
   timeout: float,
-  limit: int,
-  ssl_context: ssl.SSLContext,
-) -> tuple[list[dict], str]:
+  client: ApiClient,
+  validators: ValidatorCache | None = None,
+  validator_key: str | None = None,
+) -> tuple[Iterable, list[str], str]:
+  """Raw rows and deleted ids from the snapshot file or the API, plus the source used.
+
+  Snapshot files are streamed, so ``rows`` can only be iterated once.
+  """
   if source == "file":
     if not input_path.exists():
       raise SystemExit(f"Missing input snapshot file: {input_path}")
-    return _load_from_file(input_path, limit), "file"
+    return (*_read_rows_from_file(input_path), "file")
 
   if source == "api":
-    return _load_from_api(api_url, timeout, limit, ssl_context), "api"
+    return fetch_rows(api_url, timeout, client, validators, validator_key), [], "api"
 
   # auto mode: local file first, then API.
   if input_path.exists():
-    return _load_from_file(input_path, limit), "file"
-  return _load_from_api(api_url, timeout, limit, ssl_context), "api"
+    return (*_read_rows_from_file(input_path), "file")
+  return fetch_rows(api_url, timeout, client, validators, validator_key), [], "api"
+
+
+class _CursorTracker:
+  """Running maximum of (updated_at, id) over rows, seeded with a previous cursor.
+
+  Other keys of the seed, such as the tombstone position, are kept as they are.
+  """
+
+  def __init__(self, cursor: dict | None = None) -> None:
+    self._best: tuple[dt.datetime, str] | None = None
+    self.cursor: dict | None = None
+    if cursor:
+      since = _parse_iso_datetime(str(cursor.get("updated_since") or ""))
+      if since is not None:
+        self._best = (since, str(cursor.get("after") or ""))
+        self.cursor = cursor
+
+  def observe(self, row: object) -> None:
+    if not isinstance(row, dict):
+      return
+    updated_text = str(row.get("updated_at") or "").strip()
+    updated_at = _parse_iso_datetime(updated_text)
+    row_id = str(row.get("id") or "").strip()
+    if updated_at is None or not row_id:
+      return
+    if self._best is None or (updated_at, row_id) > self._best:
+      self._best = (updated_at, row_id)
+      self.cursor = {**(self.cursor or {}), "updated_since": updated_text, "after": row_id}
+
+  def watch(self, rows: Iterable) -> Iterator:
+    for row in rows:
+      self.observe(row)
+      yield row
+
+
+def _row_cursor(rows: Iterable, cursor: dict | None = None) -> dict | None:
+  """Latest (updated_at, id) among ``rows``, or ``cursor`` when that is later."""
+  tracker = _CursorTracker(cursor)
+  for row in rows:
+    tracker.observe(row)
+  return tracker.cursor
+
+
+def _changes_url(api_url: str, cursor: dict) -> str:
+  parts = urlsplit(api_url)
+  query = [
+    (key, value)
+    for key, value in parse_qsl(parts.query)
+    if key not in {"before", "updated_since", "after", "deleted_since", "deleted_after"}
+  ]
+  query += [
+    ("updated_since", str(cursor["updated_since"])),
+    ("after", str(cursor.get("after") or "")),
+  ]
+  if cursor.get("deleted_since"):
+    query += [
+      ("deleted_since", str(cursor["deleted_since"])),
+      ("deleted_after", str(cursor.get("deleted_after") or "")),
+    ]
+  return urlunsplit(parts._replace(query=urlencode(query)))
 
 
-def _build_ssl_context(cafile: Path | None, insecure: bool) -> ssl.SSLContext:
-  if insecure:
-    return ssl._create_unverified_context()
-  if cafile:
+def fetch_changes(
+  client: ApiClient,
+  api_url: str,
+  cursor: dict,
+  timeout: float,
+) -> tuple[list, list[str], dict]:
+  """Follow the worker's change feed from ``cursor``; returns (rows, deleted, new cursor).
+
+  The new cursor is the feed's own, which also moves past the tombstones
+  read; a feed that does not send one only advances the row position.
+  """
+  rows: list = []
+  deleted: list[str] = []
+  page = cursor
+  reached: dict | None = None
+  while True:
+    payload = client.get_json(_changes_url(api_url, page), timeout=timeout)
+    page_rows, page_deleted = _payload_rows(payload)
+    rows.extend(page_rows)
+    deleted.extend(page_deleted)
+    if isinstance(payload, dict) and isinstance(payload.get("cursor"), dict):
+      if payload["cursor"].get("updated_since"):
+        reached = payload["cursor"]
+    following = payload.get("next") if isinstance(payload, dict) else None
+    if not isinstance(following, dict) or not following.get("updated_since"):
+      break
+    if not page_rows and not page_deleted:
+      break
+    page = following
+  return rows, list(dict.fromkeys(deleted)), reached or _row_cursor(rows, cursor) or cursor
+
+
+def _build_client(cafile: Path | None, insecure: bool) -> ApiClient:
+  if cafile and not insecure:
     if not cafile.exists():
       raise SystemExit(f"--cafile does not exist: {cafile}")
     if not cafile.is_file():
       raise SystemExit(f"--cafile must point to a file: {cafile}")
-    return ssl.create_default_context(cafile=str(cafile))
-  return ssl.create_default_context()
+  return get_client(str(cafile) if cafile else None, insecure=insecure)
+
+
+def _read_manifest_items(path: Path) -> list[dict] | None:
+  try:
+    payload = json.loads(path.read_text(encoding="utf-8"))
+  except (FileNotFoundError, json.JSONDecodeError):
+    return None
+  items = payload.get("items") if isinstance(payload, dict) else None
+  return items if isinstance(items, list) else None
+
+
+def _month_of(item: dict) -> str:
+  # sketch_at is normalized to UTC ISO text, so its first seven characters
+  # are the shard month.
+  return item["sketch_at"][:7].replace("-", "/")
+
+
+def _sort_key(item: dict) -> dt.datetime:
+  return _parse_iso_datetime(str(item.get("sketch_at") or "")) or dt.datetime.min.replace(
+    tzinfo=dt.timezone.utc
+  )
+
+
+def _shard_path(shard_dir: Path, month: str) -> Path:
+  return shard_dir / f"{month}.json"
+
+
+def _shard_url(path: Path, output: Path) -> str:
+  """URL of a shard as the page sees it; site-root absolute when inside public/."""
+  resolved = path.resolve()
+  try:
+    return "/" + resolved.relative_to(SITE_ROOT.resolve()).as_posix()
+  except ValueError:
+    return resolved.relative_to(output.resolve().parent).as_posix()
+
+
+def _read_shards(shard_dir: Path) -> dict[str, list[dict]]:
+  shards: dict[str, list[dict]] = {}
+  for path in sorted(shard_dir.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9].json")):
+    items = _read_manifest_items(path)
+    if items is not None:
+      shards[f"{path.parent.name}/{path.stem}"] = items
+  return shards
+
+
+def _group_by_month(items: list[dict], existing: dict[str, list[dict]]) -> dict[str, list[dict]]:
+  """Bucket items into month shards, keeping history older than the fetched window.
+
+  The API only returns the newest ``--limit`` sketches, so existing shard
+  items older than the oldest fetched one are carried over. Inside the window
+  the fetched items win, which drops sketches deleted upstream.
+  """
+  months: dict[str, list[dict]] = {}
+  for item in items:
+    months.setdefault(_month_of(item), []).append(item)
+
+  fetched_ids = {item["id"] for item in items}
+  oldest = min((_sort_key(item) for item in items), default=None)
+  for shard_items in existing.values():
+    for item in shard_items:
+      if not isinstance(item, dict) or item.get("id") in fetched_ids:
+        continue
+      if oldest is not None and _sort_key(item) >= oldest:
+        continue
+      months.setdefault(_month_of(item), []).append(item)
+
+  for shard_items in months.values():
+    shard_items.sort(key=_sort_key, reverse=True)
+  return dict(sorted(months.items(), reverse=True))
+
+
+def _write_if_changed(path: Path, text: str) -> bool:
+  if path.exists() and path.read_text(encoding="utf-8") == text:
+    return False
+  path.parent.mkdir(parents=True, exist_ok=True)
+  write_text_atomic(path, text)
+  return True
+
+
+def _write_shards(
+  output: Path, shard_dir: Path, months: dict[str, list[dict]]
+) -> tuple[list[dict], int]:
+  """Write one shard per month; returns (index shard entries, files changed).
+
+  Shards carry no timestamp, so a month whose sketches did not change keeps
+  byte-identical content and is not rewritten.
+  """
+  entries: list[dict] = []
+  changed = 0
+  for month, month_items in months.items():
+    path = _shard_path(shard_dir, month)
+    text = json.dumps({"version": 1, "month": month, "items": month_items}, indent=2) + "\n"
+    changed += _write_if_changed(path, text)
+    entries.append(
+      {
+        "month": month,
+        "path": _shard_url(path, output),
+        "count": len(month_items),
+        "sha256": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+      }
+    )
+
+  for path in shard_dir.glob("[0-9][0-9][0-9][0-9]/[0-9][0-9].json"):
+    if f"{path.parent.name}/{path.stem}" not in months:
+      path.unlink()
+      changed += 1
+      if not any(path.parent.iterdir()):
+        path.parent.rmdir()
+  return entries, changed
+
+
+def _read_manifest(path: Path) -> dict | None:
+  try:
+    payload = json.loads(path.read_text(encoding="utf-8"))
+  except (FileNotFoundError, json.JSONDecodeError):
+    return None
+  return payload if isinstance(payload, dict) else None
+
+
+def read_cursor(path: Path) -> dict | None:
+  """The change-feed cursor recorded by the last sync, if the manifest has one."""
+  cursor = (_read_manifest(path) or {}).get("cursor")
+  if not isinstance(cursor, dict) or not str(cursor.get("updated_since") or "").strip():
+    return None
+  return cursor
+
+
+def _shard_dir(output: Path, shard_dir: Path | None) -> Path:
+  return shard_dir or output.parent / SHARD_DIRNAME
+
+
+def _manifest_output(output: Path, shard_dir: Path) -> bytes | None:
+  """The index as written, or None when it or any shard it lists is missing or edited.
+
+  The index records each shard's sha256, so its digest in the render cache
+  covers the shards too as long as they still match those hashes.
+  """
+  try:
+    current = output.read_bytes()
+    shards = json.loads(current).get("shards") or []
+    for entry in shards:
+      path = _shard_path(shard_dir, str(entry["month"]))
+      if hashlib.sha256(path.read_bytes()).hexdigest() != entry["sha256"]:
+        return None
+  except (OSError, ValueError, AttributeError, TypeError, KeyError):
+    return None
+  return current
+
+
+def manifest_intact(output: Path, cache: RenderCache, shard_dir: Path | None = None) -> bool:
+  """True when the manifest and its shards are still the ones ``cache`` recorded writing.
+
+  A 304 or an empty change feed leaves the files alone, so an edited or
+  missing manifest has to be refetched in full instead.
+  """
+  current = _manifest_output(output, _shard_dir(output, shard_dir))
+  return cache.output_intact(str(output.resolve()), current)
+
+
+def _read_history(output: Path, shard_dir: Path) -> list[dict]:
+  shards = _read_shards(shard_dir)
+  if shards:
+    return [item for items in shards.values() for item in items if isinstance(item, dict)]
+  # Manifests written before sharding only have the inline items.
+  return [item for item in _read_manifest_items(output) or [] if isinstance(item, dict)]
+
+
+def _merge_changes(history: list[dict], rows: list, deleted: list[str]) -> list[dict]:
+  merged = {str(item.get("id")): item for item in history if item.get("id")}
+  for item in _normalize_items(rows, len(rows)):
+    merged[item["id"]] = item
+  for item_id in deleted:
+    merged.pop(item_id, None)
+  return sorted(merged.values(), key=_sort_key, reverse=True)
+
+
+def _write_manifest(
+  output: Path,
+  items: list[dict],
+  cache: RenderCache | None = None,
+  *,
+  shard_dir: Path | None = None,
+  index_items: int = DEFAULT_INDEX_ITEMS,
+  cursor: dict | None = None,
+  complete: bool = False,
+) -> bool:
+  """Write the month shards and the index; returns True if any file was written.
+
+  ``output`` becomes a small index holding the newest ``index_items`` sketches
+  and one entry per month shard (path, count and content hash), so first
+  paint only needs the index and older months load on demand. Skipping an
+  unchanged index keeps the previous generated_at, so unchanged data does not
+  churn the file's mtime, deploys or CDN caches.
+
+  ``complete`` means ``items`` is the whole history rather than the newest
+  window, so nothing is carried over from the existing shards. ``cursor`` is
+  the change-feed position to record; None keeps the previous one.
+  """
+  shard_dir = _shard_dir(output, shard_dir)
+  digest = input_digest(
+    MANIFEST_RENDERER_VERSION, items, index_items, str(shard_dir.resolve()), cursor, complete
+  )
+  key = str(output.resolve())
+  if cache is not None and cache.is_fresh(key, digest, _manifest_output(output, shard_dir)):
+    return False
+
+  previous = _read_manifest(output)
+  cursor = cursor or (previous or {}).get("cursor")
+  months = _group_by_month(items, {} if complete else _read_shards(shard_dir))
+  shards, shards_changed = _write_shards(output, shard_dir, months)
+  index = {
+    "version": 2,
+    "items": items[:index_items],
+    "total": sum(entry["count"] for entry in shards),
+    "shards": shards,
+  }
+  if cursor:
+    index["cursor"] = cursor
+
+  if previous is not None and {k: v for k, v in previous.items() if k != "generated_at"} == index:
+    if cache is not None:
+      cache.update(key, digest, output.read_bytes())
+    return shards_changed > 0
+
+  payload = {
+    "version": index["version"],
+    "generated_at": dt.datetime.now(dt.timezone.utc)
+    .isoformat(timespec="seconds")
+    .replace("+00:00", "Z"),
+    **index,
+  }
+
+  text = json.dumps(payload, indent=2) + "\n"
+  output.parent.mkdir(parents=True, exist_ok=True)
+  write_text_atomic(output, text)
+  if cache is not None:
+    cache.update(key, digest, text)
+  return True
+
+
+def _apply_changes(
+  output: Path,
+  rows: list,
+  deleted: list[str] | None = None,
+  cache: RenderCache | None = None,
+  *,
+  shard_dir: Path | None = None,
+  index_items: int = DEFAULT_INDEX_ITEMS,
+  cursor: dict | None = None,
+) -> bool:
+  """Merge changed rows and deletions into the existing manifest and shards."""
+  shard_dir = _shard_dir(output, shard_dir)
+  items = _merge_changes(_read_history(output, shard_dir), rows, list(deleted or []))
+  return _write_manifest(
+    output,
+    items,
+    cache,
+    shard_dir=shard_dir,
+    index_items=index_items,
+    cursor=cursor,
+    complete=True,
+  )
+
+
+def refresh_manifest(
+  output: Path,
+  rows: Iterable,
+  deleted: list[str],
+  cache: RenderCache | None = None,
+  *,
+  merge: bool = False,
+  limit: int = DEFAULT_LIMIT,
+  shard_dir: Path | None = None,
+  index_items: int = DEFAULT_INDEX_ITEMS,
+  cursor: dict | None = None,
+) -> tuple[bool, str]:
+  """Write loaded rows into the manifest; returns (changed, summary).
+
+  With ``merge`` the rows are changes applied to the existing history,
+  otherwise they are the newest ``limit`` sketches. ``deleted`` is only read
+  once ``rows`` has been consumed, so a streamed snapshot can fill it in.
+  ``cursor`` is the change feed's position from ``fetch_changes``; without it
+  the recorded cursor only moves past the rows seen.
+  """
+  tracker = _CursorTracker(cursor or read_cursor(output))
+  if merge:
+    rows = list(tracker.watch(rows))
+    changed = _apply_changes(
+      output,
+      rows,
+      deleted,
+      cache,
+      shard_dir=shard_dir,
+      index_items=index_items,
+      cursor=tracker.cursor,
+    )
+    refresh_metrics.count("items", len(rows))
+    return changed, f"merged {len(rows)} changed and {len(deleted)} deleted row(s)"
+
+  items = _normalize_items(tracker.watch(rows), limit)
+  refresh_metrics.count("items", len(items))
+  changed = _write_manifest(
+    output,
+    items,
+    cache,
+    shard_dir=shard_dir,
+    index_items=index_items,
+    cursor=tracker.cursor,
+  )
+  return changed, f"with {len(items)} item(s)"
 
 
 def _truncate(text: str, max_chars: int = 260) -> str:
@@ -238,6 +814,7 @@ def _handle_load_failure(best_effort: bool, message: str) -> int:
   raise SystemExit(message)
 
 
+@refresh_metrics.instrumented("update_sketches_manifest")
 def main() -> int:
   parser = argparse.ArgumentParser()
   parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
@@ -245,7 +822,7 @@ def main() -> int:
   parser.add_argument("--api-url", default=DEFAULT_API_URL)
   parser.add_argument("--source", choices=["auto", "file", "api"], default="api")
   parser.add_argument("--timeout", type=float, default=6.0)
-  parser.add_argument("--limit", type=int, default=200)
+  parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT)
   parser.add_argument(
     "--cafile",
     type=Path,
@@ -262,24 +839,101 @@ def main() -> int:
     action="store_true",
     help="On load failure, keep existing manifest and exit 0.",
   )
+  parser.add_argument(
+    "--validator-cache",
+    type=Path,
+    default=DEFAULT_VALIDATOR_CACHE,
+    help="ETag cache used for conditional GETs (API mode).",
+  )
+  parser.add_argument(
+    "--no-conditional",
+    action="store_true",
+    help="Always download and rewrite the manifest, ignoring cached ETags.",
+  )
+  parser.add_argument(
+    "--render-cache",
+    type=Path,
+    default=DEFAULT_RENDER_CACHE,
+    help="Sidecar state file used to skip rewriting an unchanged manifest.",
+  )
+  parser.add_argument(
+    "--shard-dir",
+    type=Path,
+    default=None,
+    help="Directory for the YYYY/MM.json month shards (default: sketches/ next to --output).",
+  )
+  parser.add_argument(
+    "--full",
+    action="store_true",
+    help="Refetch the newest --limit rows even when the manifest has a change-feed cursor.",
+  )
+  parser.add_argument(
+    "--merge",
+    action="store_true",
+    help="Treat the loaded rows (and any 'deleted' ids) as changes to merge into the manifest.",
+  )
+  parser.add_argument(
+    "--index-items",
+    type=int,
+    default=DEFAULT_INDEX_ITEMS,
+    help="Number of newest sketches inlined in the index for first paint.",
+  )
+  refresh_metrics.add_arguments(parser)
   args = parser.parse_args()
+  refresh_metrics.configure(args)
 
   if args.limit < 1:
     raise SystemExit("--limit must be >= 1")
+  if args.index_items < 1:
+    raise SystemExit("--index-items must be >= 1")
   if args.cafile and args.insecure:
     raise SystemExit("Use either --cafile or --insecure, not both.")
 
-  ssl_context = _build_ssl_context(args.cafile, args.insecure)
+  client = _build_client(args.cafile, args.insecure)
+  validators = None if args.no_conditional else ValidatorCache(args.validator_cache)
+
+  validator_key = f"{args.output.resolve()} {args.api_url}"
+  render_cache = RenderCache(args.render_cache)
+  intact = manifest_intact(args.output, render_cache, args.shard_dir)
+  if validators and not intact:
+    validators.discard(validator_key)
+  previous_cursor = read_cursor(args.output) if intact else None
+  use_api = args.source == "api" or (args.source == "auto" and not args.input.exists())
 
   try:
-    items, source = _load_items(
-      args.source,
-      args.input,
-      args.api_url,
-      args.timeout,
-      args.limit,
-      ssl_context,
-    )
+    if use_api and previous_cursor and not args.full:
+      rows, deleted, cursor = fetch_changes(client, args.api_url, previous_cursor, args.timeout)
+      source, merge = "api changes", True
+      if not rows and not deleted:
+        print("sketches manifest up to date (no changes since last sync)")
+        return 0
+    else:
+      rows, deleted, source = _load_items(
+        args.source,
+        args.input,
+        args.api_url,
+        args.timeout,
+        client,
+        validators,
+        validator_key,
+      )
+      merge, cursor = args.merge, None
+    # Snapshot files are streamed, so parse errors surface while writing.
+    with refresh_metrics.phase("normalize"):
+      changed, summary = refresh_manifest(
+        args.output,
+        rows,
+        deleted,
+        render_cache,
+        merge=merge,
+        limit=args.limit,
+        shard_dir=args.shard_dir,
+        index_items=args.index_items,
+        cursor=cursor,
+      )
+  except NotModified:
+    print("sketches manifest not modified (served from 304)")
+    return 0
   except urllib.error.HTTPError as exc:
     return _handle_load_failure(args.best_effort, _format_http_error(exc, args.api_url))
   except urllib.error.URLError as exc:
@@ -298,17 +952,11 @@ def main() -> int:
       _format_json_error(exc, args.source, args.api_url),
     )
 
-  payload = {
-    "version": 1,
-    "generated_at": dt.datetime.now(dt.timezone.utc)
-    .isoformat(timespec="seconds")
-    .replace("+00:00", "Z"),
-    "items": items,
-  }
-
-  args.output.parent.mkdir(parents=True, exist_ok=True)
-  args.output.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
-  print(f"updated sketches manifest from {source} with {len(items)} item(s)")
+  render_cache.save()
+  if validators:
+    validators.commit()
+    validators.save()
+  print(f"updated sketches manifest from {source} {summary}. changed={str(changed).lower()}")
   return 0
 
 
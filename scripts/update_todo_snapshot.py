@@ -7,16 +7,24 @@ import argparse
 import html
 import json
 import os
-import re
 import socket
-import ssl
 import sys
 import urllib.error
-import urllib.request
 from pathlib import Path
 
-START_MARKER = "<!-- TODO_SNAPSHOT_START -->"
-END_MARKER = "<!-- TODO_SNAPSHOT_END -->"
+import refresh_metrics
+from api_client import (
+    DEFAULT_VALIDATOR_CACHE,
+    ApiClient,
+    NotModified,
+    ValidatorCache,
+    get_client,
+)
+from index_render import TODO_SNAPSHOT, block_cache_key, intact_blocks, render_index
+from render_cache import DEFAULT_RENDER_CACHE, RenderCache, input_digest
+
+BLOCK_NAME = TODO_SNAPSHOT
+RENDERER_VERSION = "1"
 USER_AGENT = "adamjones.ca-daily-journal-refresh/1.0"
 
 
@@ -53,50 +61,37 @@ def parse_args() -> argparse.Namespace:
             "If omitted, uses SSL_CERT_FILE, then certifi, then system defaults."
         ),
     )
+    parser.add_argument(
+        "--validator-cache",
+        type=Path,
+        default=DEFAULT_VALIDATOR_CACHE,
+        help="ETag cache used for conditional GETs.",
+    )
+    parser.add_argument(
+        "--no-conditional",
+        action="store_true",
+        help="Always download and re-render, ignoring cached ETags.",
+    )
+    parser.add_argument(
+        "--render-cache",
+        type=Path,
+        default=DEFAULT_RENDER_CACHE,
+        help="Sidecar state file used to skip re-rendering unchanged todo data.",
+    )
+    refresh_metrics.add_arguments(parser)
     return parser.parse_args()
 
 
-def build_headers() -> dict[str, str]:
-    headers = {"Accept": "application/json", "User-Agent": USER_AGENT}
-    bearer = os.getenv("TODOS_API_BEARER_TOKEN")
-    if bearer:
-        headers["Authorization"] = f"Bearer {bearer}"
-    cf_id = os.getenv("CF_ACCESS_CLIENT_ID")
-    cf_secret = os.getenv("CF_ACCESS_CLIENT_SECRET")
-    if cf_id and cf_secret:
-        headers["CF-Access-Client-Id"] = cf_id
-        headers["CF-Access-Client-Secret"] = cf_secret
-    return headers
-
-
-def resolve_ca_bundle(explicit_ca_bundle: str | None) -> str | None:
-    if explicit_ca_bundle:
-        return explicit_ca_bundle
-    env_ca_bundle = os.getenv("SSL_CERT_FILE")
-    if env_ca_bundle:
-        return env_ca_bundle
-    try:
-        import certifi  # type: ignore
-
-        return certifi.where()
-    except Exception:
-        return None
-
-
-def create_ssl_context(explicit_ca_bundle: str | None) -> ssl.SSLContext:
-    ca_bundle = resolve_ca_bundle(explicit_ca_bundle)
-    if ca_bundle:
-        return ssl.create_default_context(cafile=ca_bundle)
-    return ssl.create_default_context()
-
-
 def fetch_items(
-    api_url: str, timeout: float, ssl_context: ssl.SSLContext
+    api_url: str,
+    timeout: float,
+    client: ApiClient,
+    validators: ValidatorCache | None = None,
+    validator_key: str | None = None,
 ) -> list[dict[str, object]]:
-    request = urllib.request.Request(api_url, headers=build_headers(), method="GET")
-    with urllib.request.urlopen(request, timeout=timeout, context=ssl_context) as response:
-        body = response.read().decode("utf-8")
-        payload = json.loads(body)
+    payload = client.get_json(
+        api_url, timeout=timeout, validators=validators, validator_key=validator_key
+    )
     if isinstance(payload, dict):
         data = payload.get("data", [])
     elif isinstance(payload, list):
@@ -135,31 +130,56 @@ def build_snapshot(items: list[dict[str, object]]) -> str:
     return "\n".join(parts)
 
 
-def update_html(index_path: Path, items: list[dict[str, object]]) -> bool:
-    content = index_path.read_text(encoding="utf-8")
-    pattern = re.compile(
-        rf"({re.escape(START_MARKER)}\n)(.*?)(\n\s*{re.escape(END_MARKER)})",
-        re.DOTALL,
+def snapshot_digest(items: list[dict[str, object]]) -> str:
+    return input_digest(
+        RENDERER_VERSION,
+        [
+            [
+                str(item.get("id", "")),
+                str(item.get("text", "")).strip(),
+                bool(item.get("completed", False)),
+            ]
+            for item in items
+        ],
     )
-    snapshot = build_snapshot(items)
-    replaced, count = pattern.subn(rf"\1{snapshot}\3", content, count=1)
-    if count != 1:
-        raise ValueError("Could not find TODO snapshot markers in index.html.")
-    if replaced == content:
-        return False
-    index_path.write_text(replaced, encoding="utf-8")
-    return True
 
 
+def update_html(
+    index_path: Path, items: list[dict[str, object]], cache: RenderCache | None = None
+) -> bool:
+    changed = render_index(
+        index_path,
+        {BLOCK_NAME: lambda: build_snapshot(items)},
+        digests={BLOCK_NAME: snapshot_digest(items)},
+        cache=cache,
+    )
+    return bool(changed)
+
+
+@refresh_metrics.instrumented("update_todo_snapshot")
 def main() -> int:
     args = parse_args()
+    refresh_metrics.configure(args)
     index_path = Path(args.index_path)
+    validators = None if args.no_conditional else ValidatorCache(args.validator_cache)
+    validator_key = f"{block_cache_key(index_path, BLOCK_NAME)} {args.api_url}"
+    render_cache = RenderCache(args.render_cache)
+    if validators and not intact_blocks(index_path, [BLOCK_NAME], render_cache):
+        validators.discard(validator_key)
     try:
-        ssl_context = create_ssl_context(args.ca_bundle)
-        items = fetch_items(args.api_url, args.timeout, ssl_context)
-        changed = update_html(index_path, items)
+        client = get_client(args.ca_bundle, user_agent=USER_AGENT)
+        items = fetch_items(args.api_url, args.timeout, client, validators, validator_key)
+        refresh_metrics.count("items", len(items))
+        changed = update_html(index_path, items, render_cache)
+        render_cache.save()
+        if validators:
+            validators.commit()
+            validators.save()
         print(f"Updated todo snapshot with {len(items)} item(s). changed={str(changed).lower()}")
         return 0
+    except NotModified:
+        print("Todo snapshot not modified (served from 304). changed=false")
+        return 0
     except urllib.error.HTTPError as exc:
         cf_ray = exc.headers.get("cf-ray", "")
         location = exc.headers.get("location", "")
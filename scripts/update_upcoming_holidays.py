@@ -1,19 +1,47 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
 import argparse
+import bisect
 import datetime as dt
 import html
 import json
+from array import array
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Iterable
 import re
 import calendar as calmod
+import functools
+
+import ics_reader
+import recurrence
+import refresh_metrics
+from index_render import (
+    UPCOMING_HOLIDAYS,
+    end_marker,
+    render_index,
+    start_marker,
+    write_text_atomic,
+)
+from render_cache import DEFAULT_RENDER_CACHE, RenderCache, input_digest
+from sketch_ledger import file_sha256
 
 
 ROOT = Path(__file__).resolve().parents[1]
 DEFAULT_INDEX = ROOT / "public" / "index.html"
 DEFAULT_INPUT = ROOT / "data" / "calendar" / "canadian-holidays.json"
-
-START_MARK = "<!-- UPCOMING_HOLIDAYS_START -->"
-END_MARK = "<!-- UPCOMING_HOLIDAYS_END -->"
+DEFAULT_FRAGMENTS_DIR = ROOT / "public" / "holidays"
+DEFAULT_REGION = "BC"
+
+START_MARK = start_marker(UPCOMING_HOLIDAYS)
+END_MARK = end_marker(UPCOMING_HOLIDAYS)
+RENDERER_VERSION = "2"
+# Bump when the occurrence index layout or its expansion rules change.
+INDEX_VERSION = "2"
+# Recurrences are expanded this far past the latest date the index was built
+# for, so it is rebuilt when the export changes rather than every day.
+INDEX_SLACK_DAYS = 730
 
 _REGION_TAGS = {
     "AB",
@@ -33,9 +61,19 @@ _REGION_TAGS = {
     "NWT",
     "PEI",
 }
+_REGION_ALIASES = {"NWT": "NT", "PEI": "PE"}
+REGIONS = tuple(sorted(_REGION_TAGS - set(_REGION_ALIASES)))
+# Bit order of the per-title region flags in the occurrence index; an alias
+# shares the bit of the region it stands for.
+_REGION_BITS = {tag: 1 << bit for bit, tag in enumerate(REGIONS)}
+_REGION_BITS.update({alias: _REGION_BITS[tag] for alias, tag in _REGION_ALIASES.items()})
+
+_PAREN_GROUP_RE = re.compile(r"\(([^)]*)\)")
+_TAG_RE = re.compile(r"\b[A-Z]{2,3}\b")
+_REGION_SUFFIX_RE = re.compile(r"\s*\((?:[A-Z]{2,3}(?:,\s*[A-Z]{2,3})*)\)\s*$")
 
 
-def _parse_iso_date(s: str) -> dt.date:
+def parse_iso_date(s: str) -> dt.date:
     return dt.date.fromisoformat(s)
 
 
@@ -57,47 +95,185 @@ def _format_day(d: dt.date, include_year: bool) -> str:
     return base
 
 
-def _render(events: list[dict], today: dt.date, horizon_days: int, limit: int) -> str:
-    end = today + dt.timedelta(days=horizon_days)
-    items: list[tuple[dt.date, str]] = []
-    seen: set[tuple[dt.date, str]] = set()
+@dataclass
+class OccurrenceIndex:
+    """Every (day, title) occurrence of an export, sorted by day then title.
+
+    ``days`` holds date ordinals and ``title_ids`` indexes into ``titles``;
+    ``title_regions`` is the region bitmask of each title (0 when the title
+    names no region). Occurrences are complete up to and including ``through``.
+    """
+
+    source_sha256: str
+    through: dt.date
+    titles: list[str]
+    title_regions: list[int]
+    days: array
+    title_ids: array
+
+    def window(self, start: dt.date, end: dt.date) -> range:
+        """Positions of the occurrences within [start, end]."""
+        lo = bisect.bisect_left(self.days, start.toordinal())
+        hi = bisect.bisect_right(self.days, end.toordinal())
+        return range(lo, hi)
+
 
+def _event_day(e: dict) -> dt.date:
+    if e.get("allDay") and e.get("date"):
+        return parse_iso_date(e["date"])
+    return _parse_iso_datetime_utc(e["start"]).date()
+
+
+def _build_occurrence_index(
+    events: Iterable[dict], through: dt.date, source_sha256: str = ""
+) -> OccurrenceIndex:
+    """Expand ``events`` once, through ``through`` plus ``INDEX_SLACK_DAYS``.
+
+    ``events`` is consumed in a single pass, so it may be a stream. Only
+    recurring events are held until the end, when the horizon is known.
+    """
+    occurrences: set[tuple[dt.date, str]] = set()
+    recurring: list[tuple[str, dt.date, str, frozenset[dt.date], str]] = []
+    # Instances moved by a RECURRENCE-ID override no longer fall on their rule date.
+    moved: dict[str, set[dt.date]] = {}
     for e in events:
         title = str(e.get("title") or "").strip()
         if not title:
             continue
-        if not _include_title_for_bc(title):
-            continue
-
+        day = _event_day(e)
+        through = max(through, day)
+        uid = str(e.get("uid") or "")
+        if e.get("recurrenceId") and uid:
+            moved.setdefault(uid, set()).add(parse_iso_date(str(e["recurrenceId"])[:10]))
         if e.get("recurrence"):
-            base_day = (
-                _parse_iso_date(e["date"])
-                if e.get("allDay") and e.get("date")
-                else _parse_iso_datetime_utc(e["start"]).date()
-            )
-            for day in _expand_recurrence_dates(str(e["recurrence"]), base_day, today, end):
-                key = (day, title)
-                if key in seen:
-                    continue
-                seen.add(key)
-                items.append((day, title))
+            recurring.append((title, day, str(e["recurrence"]), _event_exdates(e), uid))
         else:
-            if e.get("allDay") and e.get("date"):
-                day = _parse_iso_date(e["date"])
-            else:
-                day = _parse_iso_datetime_utc(e["start"]).date()
+            occurrences.add((day, title))
+    through += dt.timedelta(days=INDEX_SLACK_DAYS)
+
+    for title, base_day, rrule, exdates, uid in recurring:
+        exdates = exdates | moved.get(uid, frozenset())
+        for day in _expand_recurrence_dates(rrule, base_day, base_day, through, exdates):
+            occurrences.add((day, title))
+
+    titles: list[str] = []
+    title_ids: dict[str, int] = {}
+    days = array("i")
+    ids = array("i")
+    for day, title in sorted(occurrences, key=lambda x: (x[0], x[1].lower(), x[1])):
+        if title not in title_ids:
+            title_ids[title] = len(titles)
+            titles.append(title)
+        days.append(day.toordinal())
+        ids.append(title_ids[title])
+    return OccurrenceIndex(
+        source_sha256=source_sha256,
+        through=through,
+        titles=titles,
+        title_regions=[_region_mask(title) for title in titles],
+        days=days,
+        title_ids=ids,
+    )
 
-            if day < today or day > end:
-                continue
-            key = (day, title)
-            if key in seen:
+
+def _occurrence_index_path(export_path: Path) -> Path:
+    return export_path.with_name(f"{export_path.stem}.occurrences.json")
+
+
+def _read_occurrence_index(path: Path) -> OccurrenceIndex | None:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != INDEX_VERSION or data.get("regions") != list(REGIONS):
+            return None
+        index = OccurrenceIndex(
+            source_sha256=str(data["source_sha256"]),
+            through=parse_iso_date(data["through"]),
+            titles=[str(title) for title in data["titles"]],
+            title_regions=[int(mask) for mask in data["title_regions"]],
+            days=array("i", data["days"]),
+            title_ids=array("i", data["title_ids"]),
+        )
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return None
+    if len(index.days) != len(index.title_ids) or len(index.titles) != len(index.title_regions):
+        return None
+    return index
+
+
+def _write_occurrence_index(path: Path, index: OccurrenceIndex) -> None:
+    payload = {
+        "version": INDEX_VERSION,
+        "source_sha256": index.source_sha256,
+        "through": index.through.isoformat(),
+        "regions": list(REGIONS),
+        "titles": index.titles,
+        "title_regions": index.title_regions,
+        "days": index.days.tolist(),
+        "title_ids": index.title_ids.tolist(),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_text_atomic(path, json.dumps(payload, separators=(",", ":")) + "\n")
+
+
+def _read_events(export_path: Path) -> Iterable[dict]:
+    """Events of a JSON export, or streamed from an .ics calendar."""
+    if export_path.suffix.lower() == ".ics":
+        return ics_reader.read_events(export_path)
+    payload = json.loads(export_path.read_text(encoding="utf-8"))
+    return payload.get("events") or []
+
+
+def load_occurrence_index(
+    export_path: Path, through: dt.date, source_sha256: str | None = None
+) -> OccurrenceIndex:
+    """The persisted index for the export, rebuilt when it changed or ends before ``through``."""
+    source_sha256 = source_sha256 or file_sha256(export_path)
+    index_path = _occurrence_index_path(export_path)
+    index = _read_occurrence_index(index_path)
+    if index is None or index.source_sha256 != source_sha256 or index.through < through:
+        index = _build_occurrence_index(_read_events(export_path), through, source_sha256)
+        _write_occurrence_index(index_path, index)
+    return index
+
+
+def render_occurrences(
+    index: OccurrenceIndex,
+    today: dt.date,
+    horizon_days: int,
+    limit: int,
+    region: str = DEFAULT_REGION,
+) -> str:
+    return render_regions(index, (region,), today, horizon_days, limit)[region]
+
+
+def render_regions(
+    index: OccurrenceIndex,
+    regions: tuple[str, ...],
+    today: dt.date,
+    horizon_days: int,
+    limit: int,
+) -> dict[str, str]:
+    """One fragment per region, from a single walk over the horizon window."""
+    end = today + dt.timedelta(days=horizon_days)
+    items: dict[str, list[tuple[dt.date, str]]] = {region: [] for region in regions}
+    pending = {region: _REGION_BITS[region] for region in regions} if limit > 0 else {}
+    for position in index.window(today, end):
+        if not pending:
+            break
+        title_id = index.title_ids[position]
+        mask = index.title_regions[title_id]
+        occurrence = (dt.date.fromordinal(index.days[position]), index.titles[title_id])
+        for region, bit in list(pending.items()):
+            # Region-specific holidays only show in the regions they name.
+            if mask and not mask & bit:
                 continue
-            seen.add(key)
-            items.append((day, title))
+            items[region].append(occurrence)
+            if len(items[region]) >= limit:
+                del pending[region]
+    return {region: _render_items(items[region], today, horizon_days) for region in regions}
 
-    items.sort(key=lambda x: (x[0], x[1].lower()))
-    items = items[:limit]
 
+def _render_items(items: list[tuple[dt.date, str]], today: dt.date, horizon_days: int) -> str:
     if not items:
         return f'<p class="muted">No holidays in the next {horizon_days} days.</p>'
 
@@ -118,141 +294,50 @@ def _render(events: list[dict], today: dt.date, horizon_days: int, limit: int) -
 
 def _display_holiday_title(title: str) -> str:
     # Strip trailing region abbreviations, e.g. "Family Day (AB, BC)" -> "Family Day".
-    return re.sub(r"\s*\((?:[A-Z]{2,3}(?:,\s*[A-Z]{2,3})*)\)\s*$", "", title).strip()
+    return _REGION_SUFFIX_RE.sub("", title).strip()
 
 
-def _include_title_for_bc(title: str) -> bool:
+@functools.lru_cache(maxsize=None)
+def _region_mask(title: str) -> int:
     """
-    Exclude region-specific holidays not for BC.
+    Bitmask (``_REGION_BITS``) of the region tags in the title's parentheses.
 
-    - No parentheses: include.
-    - Parentheses but no known region tag: include (e.g. "(Observed)").
-    - Known region tag(s) present: include only if BC is among them.
+    - No parentheses, or none with a known region tag (e.g. "(Observed)"): 0,
+      meaning the holiday applies everywhere.
+    - Otherwise the bits of every tag present, e.g. "Family Day (AB, BC)".
     """
-    groups = re.findall(r"\(([^)]*)\)", title)
-    if not groups:
-        return True
-
-    found_tags: set[str] = set()
-    for g in groups:
+    mask = 0
+    for g in _PAREN_GROUP_RE.findall(title):
         # Handle dotted abbreviations like "B.C." / "N.W.T." by stripping dots.
         g_norm = g.upper().replace(".", "")
-        for tok in re.findall(r"\b[A-Z]{2,3}\b", g_norm):
-            if tok in _REGION_TAGS:
-                found_tags.add(tok)
-
-    if not found_tags:
-        return True
-    return "BC" in found_tags
-
-
-def _parse_rrule(rrule: str) -> dict[str, str]:
-    out: dict[str, str] = {}
-    for part in rrule.split(";"):
-        if not part.strip():
-            continue
-        if "=" not in part:
-            continue
-        k, v = part.split("=", 1)
-        out[k.strip().upper()] = v.strip()
-    return out
-
-
-def _nth_weekday_of_month(year: int, month: int, weekday: int, nth: int) -> dt.date:
-    """
-    weekday: Monday=0..Sunday=6
-    nth: 1..5 or -1..-5 (e.g. -1 is last)
-    """
-    _, last_day = calmod.monthrange(year, month)
-    if nth > 0:
-        first = dt.date(year, month, 1)
-        offset = (weekday - first.weekday()) % 7
-        day = 1 + offset + 7 * (nth - 1)
-        if day > last_day:
-            raise ValueError("nth weekday out of range")
-        return dt.date(year, month, day)
-    else:
-        last = dt.date(year, month, last_day)
-        offset = (last.weekday() - weekday) % 7
-        day = last_day - offset - 7 * (abs(nth) - 1)
-        if day < 1:
-            raise ValueError("nth weekday out of range")
-        return dt.date(year, month, day)
-
-
-def _expand_recurrence_dates(rrule: str, base_day: dt.date, window_start: dt.date, window_end: dt.date) -> list[dt.date]:
-    """
-    Minimal RRULE support for Apple holiday calendars.
-    Currently supports:
-    - FREQ=YEARLY with BYMONTH + BYMONTHDAY
-    - FREQ=YEARLY with BYMONTH + BYDAY (e.g. 3MO, -1MO)
-    Respects INTERVAL and COUNT when present.
-    """
-    rule = _parse_rrule(rrule)
-    if rule.get("FREQ") != "YEARLY":
-        return []
-
-    interval = int(rule.get("INTERVAL", "1") or "1")
-    count = int(rule["COUNT"]) if "COUNT" in rule and rule["COUNT"].isdigit() else None
-
-    bymonth_s = rule.get("BYMONTH")
-    if bymonth_s:
+        for tok in _TAG_RE.findall(g_norm):
+            mask |= _REGION_BITS.get(tok, 0)
+    return mask
+
+
+def _event_exdates(e: dict) -> frozenset[dt.date]:
+    """EXDATEs an export lists next to the recurrence (ISO dates or datetimes)."""
+    values = e.get("exdates") or e.get("exdate") or []
+    if isinstance(values, str):
+        values = values.split(",")
+    out: set[dt.date] = set()
+    for value in values:
         try:
-            month = int(bymonth_s.split(",")[0])
+            out.add(parse_iso_date(str(value).strip()[:10]))
         except ValueError:
-            return []
-    else:
-        # Apple sometimes omits BYMONTH/BYMONTHDAY for fixed-date yearly recurrences.
-        month = base_day.month
-
-    # Choose the first computed occurrence on/after window_start.year, then step by interval.
-    start_year = base_day.year
-    target_start_year = window_start.year
-    if target_start_year <= start_year:
-        first_year = start_year
-    else:
-        diff = target_start_year - start_year
-        steps = (diff + interval - 1) // interval
-        first_year = start_year + steps * interval
-
-    out: list[dt.date] = []
-    year = first_year
-    while year <= window_end.year:
-        idx = ((year - start_year) // interval) + 1
-        if count is not None and idx > count:
-            break
-
-        occ: dt.date | None = None
-        if "BYMONTHDAY" in rule:
-            try:
-                md = int(rule["BYMONTHDAY"].split(",")[0])
-                occ = dt.date(year, month, md)
-            except Exception:
-                occ = None
-        elif "BYDAY" in rule:
-            tok = rule["BYDAY"].split(",")[0].strip().upper()
-            m = re.match(r"^(-?\d+)?(MO|TU|WE|TH|FR|SA|SU)$", tok)
-            if m:
-                nth_s, wd_s = m.group(1), m.group(2)
-                nth = int(nth_s) if nth_s else 1
-                weekday_map = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
-                try:
-                    occ = _nth_weekday_of_month(year, month, weekday_map[wd_s], nth)
-                except Exception:
-                    occ = None
-        else:
-            # No BY* fields: use the base event's month/day.
-            try:
-                occ = dt.date(year, month, base_day.day)
-            except Exception:
-                occ = None
-
-        if occ and window_start <= occ <= window_end:
-            out.append(occ)
+            continue
+    return frozenset(out)
 
-        year += interval
 
-    return out
+def _expand_recurrence_dates(
+    rrule: str,
+    base_day: dt.date,
+    window_start: dt.date,
+    window_end: dt.date,
+    exdates: frozenset[dt.date] = frozenset(),
+) -> list[dt.date]:
+    """Occurrences of ``rrule`` (which may also carry EXDATE lines) within the window."""
+    return recurrence.expand(rrule, base_day, window_start, window_end, exdates)
 
 
 def _render_month_calendar(items: list[tuple[dt.date, str]], today: dt.date) -> str:
@@ -306,35 +391,51 @@ def _render_month_calendar(items: list[tuple[dt.date, str]], today: dt.date) ->
     return "\n".join(parts)
 
 
-def _replace_between_markers(text: str, replacement_html: str) -> str:
-    start = text.find(START_MARK)
-    end = text.find(END_MARK)
-    if start == -1 or end == -1 or end < start:
-        raise SystemExit(
-            f"Missing markers in index.html. Expected {START_MARK} ... {END_MARK}"
-        )
+def render_digest(
+    export_sha256: str,
+    today: dt.date,
+    horizon_days: int,
+    limit: int,
+    region: str = DEFAULT_REGION,
+) -> str:
+    return input_digest(
+        RENDERER_VERSION, export_sha256, today.isoformat(), horizon_days, limit, region
+    )
 
-    # Replace whole lines between the marker lines, preserving indentation of END_MARK.
-    start_line_start = text.rfind("\n", 0, start)
-    start_line_start = 0 if start_line_start == -1 else start_line_start + 1
-    indent = re.match(r"[ \t]*", text[start_line_start:start]).group(0)
 
-    start_line_end = text.find("\n", start)
-    if start_line_end == -1:
-        raise SystemExit("Malformed index.html: start marker not followed by newline")
-    start_line_end += 1
+def _parse_regions(value: str) -> tuple[str, ...]:
+    """Canonical region codes from "BC,ON,P.E.I." in the order given, without duplicates."""
+    regions: list[str] = []
+    for token in value.split(","):
+        tag = token.strip().upper().replace(".", "")
+        if not tag:
+            continue
+        tag = _REGION_ALIASES.get(tag, tag)
+        if tag not in REGIONS:
+            raise SystemExit(
+                f"Unknown region {token.strip()!r}; expected one of {', '.join(REGIONS)}"
+            )
+        if tag not in regions:
+            regions.append(tag)
+    if not regions:
+        raise SystemExit("--regions must name at least one region")
+    return tuple(regions)
 
-    indented = "\n".join(
-        (indent + line) if line.strip() else indent.rstrip()
-        for line in replacement_html.splitlines()
-    )
-    return text[:start_line_end] + indented + "\n" + indent + text[end:]
+
+def _fragment_path(fragments_dir: Path, region: str) -> Path:
+    return fragments_dir / f"upcoming-holidays-{region.lower()}.html"
 
 
+@refresh_metrics.instrumented("update_upcoming_holidays")
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--index", type=Path, default=DEFAULT_INDEX)
-    ap.add_argument("--input", type=Path, default=DEFAULT_INPUT)
+    ap.add_argument(
+        "--input",
+        type=Path,
+        default=DEFAULT_INPUT,
+        help="Calendar export JSON, or an .ics calendar (streamed, e.g. a public holiday feed).",
+    )
     ap.add_argument("--horizon-days", type=int, default=180)
     ap.add_argument("--limit", type=int, default=8)
     ap.add_argument(
@@ -342,21 +443,84 @@ def main() -> int:
         help="Override 'today' as YYYY-MM-DD (defaults to local date).",
         default=None,
     )
+    ap.add_argument(
+        "--regions",
+        default=DEFAULT_REGION,
+        help=(
+            "Comma-separated provinces/territories, e.g. BC,AB,ON. The first one fills "
+            "the index block; with more than one, every region is also written to "
+            "--fragments-dir."
+        ),
+    )
+    ap.add_argument(
+        "--fragments-dir",
+        type=Path,
+        default=DEFAULT_FRAGMENTS_DIR,
+        help="Where per-region upcoming-holidays-<region>.html fragments are written.",
+    )
+    ap.add_argument(
+        "--render-cache",
+        type=Path,
+        default=DEFAULT_RENDER_CACHE,
+        help="Sidecar state file used to skip re-rendering unchanged inputs.",
+    )
+    refresh_metrics.add_arguments(ap)
     args = ap.parse_args()
+    refresh_metrics.configure(args)
 
-    today = _parse_iso_date(args.today) if args.today else dt.date.today()
+    today = parse_iso_date(args.today) if args.today else dt.date.today()
+    regions = _parse_regions(args.regions)
 
     if not args.input.exists():
         raise SystemExit(f"Missing calendar export: {args.input}")
 
-    payload = json.loads(args.input.read_text(encoding="utf-8"))
-    events = payload.get("events") or []
-
-    replacement = _render(events, today=today, horizon_days=args.horizon_days, limit=args.limit)
-
-    index_text = args.index.read_text(encoding="utf-8")
-    new_text = _replace_between_markers(index_text, replacement)
-    args.index.write_text(new_text, encoding="utf-8")
+    source_sha256 = file_sha256(args.input)
+    digests = {
+        region: render_digest(source_sha256, today, args.horizon_days, args.limit, region)
+        for region in regions
+    }
+
+    # The export is expanded and every region rendered at most once, on first use.
+    @functools.lru_cache(maxsize=None)
+    def rendered() -> dict[str, str]:
+        end = today + dt.timedelta(days=args.horizon_days)
+        with refresh_metrics.phase("normalize"):
+            index = load_occurrence_index(args.input, end, source_sha256)
+        refresh_metrics.count("items", len(index.days))
+        return render_regions(index, regions, today, args.horizon_days, args.limit)
+
+    cache = RenderCache(args.render_cache)
+    try:
+        render_index(
+            args.index,
+            {UPCOMING_HOLIDAYS: lambda: rendered()[regions[0]]},
+            digests={UPCOMING_HOLIDAYS: digests[regions[0]]},
+            cache=cache,
+        )
+    except ValueError:
+        raise SystemExit(
+            f"Missing markers in index.html. Expected {START_MARK} ... {END_MARK}"
+        ) from None
+
+    if len(regions) > 1:
+        written = 0
+        for region in regions:
+            path = _fragment_path(args.fragments_dir, region)
+            key = str(path.resolve())
+            current = path.read_text(encoding="utf-8") if path.exists() else None
+            if cache.is_fresh(key, digests[region], current):
+                continue
+            text = rendered()[region] + "\n"
+            if text != current:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                write_text_atomic(path, text)
+                written += 1
+            cache.update(key, digests[region], text)
+        print(
+            f"Holiday fragments for {','.join(regions)} in {args.fragments_dir}: "
+            f"{written} written."
+        )
+    cache.save()
     return 0
 
 
@@ -0,0 +1,10 @@
+CREATE INDEX IF NOT EXISTS idx_sketches_updated_at
+  ON sketches (updated_at, id);
+
+CREATE TABLE IF NOT EXISTS sketch_tombstones (
+  id TEXT PRIMARY KEY,
+  deleted_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_sketch_tombstones_deleted_at
+  ON sketch_tombstones (deleted_at);
@@ -0,0 +1,11 @@
+CREATE TABLE IF NOT EXISTS sketch_uploads (
+  upload_id TEXT PRIMARY KEY,
+  object_key TEXT NOT NULL UNIQUE,
+  sketch_at TEXT NOT NULL,
+  content_type TEXT NOT NULL,
+  size_bytes INTEGER NOT NULL CHECK (size_bytes > 0),
+  part_size INTEGER NOT NULL CHECK (part_size > 0),
+  note TEXT NOT NULL DEFAULT '',
+  created_at TEXT NOT NULL,
+  CHECK (length(note) <= 280)
+);
@@ -0,0 +1 @@
+ALTER TABLE sketches ADD COLUMN derivatives TEXT NOT NULL DEFAULT '[]';
@@ -0,0 +1,2 @@
+CREATE INDEX IF NOT EXISTS idx_sketch_tombstones_cursor
+  ON sketch_tombstones (deleted_at, id);
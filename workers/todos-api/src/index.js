@@ -7,6 +7,16 @@ const MAX_SKETCH_NOTE_LENGTH = 280;
 const DEFAULT_SKETCH_PAGE_SIZE = 30;
 const MAX_SKETCH_PAGE_SIZE = 200;
 const MAX_SKETCH_UPLOAD_BYTES = 12 * 1024 * 1024;
+// Chunked uploads go through R2 multipart uploads, whose parts (all but the
+// last) must be the same size and at least 5 MiB.
+const MAX_SKETCH_CHUNKED_UPLOAD_BYTES = 100 * 1024 * 1024;
+const SKETCH_UPLOAD_PART_BYTES = 5 * 1024 * 1024;
+// Derivatives (web-format primary and thumbnails) are stored next to the
+// original under "<object key without extension>/<name>".
+const MAX_SKETCH_DERIVATIVE_BYTES = 8 * 1024 * 1024;
+const MAX_SKETCH_DERIVATIVES = 8;
+const SKETCH_DERIVATIVE_NAME_PATTERN = /^(primary|w\d{2,4})\.(webp|avif)$/;
+const SKETCH_DERIVATIVE_CONTENT_TYPES = { webp: "image/webp", avif: "image/avif" };
 const ALLOWED_SKETCH_CONTENT_TYPES = new Set([
   "image/jpeg",
   "image/png",
@@ -88,6 +98,30 @@ async function routeRequest(request, env) {
     return uploadSketch(env, request);
   }
 
+  if (url.pathname === "/sketches/uploads" && method === "POST") {
+    return createSketchUpload(env, request);
+  }
+
+  const uploadPartMatch = url.pathname.match(/^\/sketches\/uploads\/([^/]+)\/parts\/(\d+)$/);
+  if (uploadPartMatch && method === "PUT") {
+    return uploadSketchPart(env, request, uploadPartMatch[1], uploadPartMatch[2]);
+  }
+
+  const uploadCompleteMatch = url.pathname.match(/^\/sketches\/uploads\/([^/]+)\/complete$/);
+  if (uploadCompleteMatch && method === "POST") {
+    return completeSketchUpload(env, request, uploadCompleteMatch[1]);
+  }
+
+  const uploadIdMatch = url.pathname.match(/^\/sketches\/uploads\/([^/]+)$/);
+  if (uploadIdMatch && method === "DELETE") {
+    return abortSketchUpload(env, request, uploadIdMatch[1]);
+  }
+
+  const derivativeMatch = url.pathname.match(/^\/sketches\/([^/]+)\/derivatives\/([^/]+)$/);
+  if (derivativeMatch && method === "PUT") {
+    return uploadSketchDerivative(env, request, url, derivativeMatch[1], derivativeMatch[2]);
+  }
+
   const sketchIdMatch = url.pathname.match(/^\/sketches\/([^/]+)$/);
   if (sketchIdMatch && method === "PATCH") {
     return updateSketch(env, request, sketchIdMatch[1]);
@@ -110,7 +144,7 @@ async function listTodos(env, request) {
   ).all();
 
   const todos = (result.results || []).map(normalizeTodoRow);
-  return json({ data: todos }, 200, request);
+  return jsonWithEtag({ data: todos }, request);
 }
 
 async function createTodo(env, request) {
@@ -235,7 +269,7 @@ async function listFocusCards(env, request) {
   ).all();
 
   const cards = (result.results || []).map(normalizeFocusCardRow);
-  return json({ data: cards }, 200, request);
+  return jsonWithEtag({ data: cards }, request);
 }
 
 async function updateFocusCard(env, request, rawSlot) {
@@ -341,6 +375,11 @@ async function listSketches(env, request, url) {
     );
   }
 
+  const updatedSinceParam = sanitizeText(url.searchParams.get("updated_since"));
+  if (updatedSinceParam) {
+    return listSketchChanges(env, request, url, limit.value, updatedSinceParam);
+  }
+
   const beforeParam = sanitizeText(url.searchParams.get("before"));
   let rowsResult;
   if (beforeParam) {
@@ -359,25 +398,95 @@ async function listSketches(env, request, url) {
     }
 
     rowsResult = await env.DB.prepare(
-      "SELECT id, sketch_at, object_key, image_url, content_type, size_bytes, note, created_at, updated_at FROM sketches WHERE sketch_at < ? ORDER BY sketch_at DESC, created_at DESC LIMIT ?"
+      "SELECT id, sketch_at, object_key, image_url, content_type, size_bytes, note, derivatives, created_at, updated_at FROM sketches WHERE sketch_at < ? ORDER BY sketch_at DESC, created_at DESC LIMIT ?"
     )
       .bind(before, limit.value)
       .all();
   } else {
     rowsResult = await env.DB.prepare(
-      "SELECT id, sketch_at, object_key, image_url, content_type, size_bytes, note, created_at, updated_at FROM sketches ORDER BY sketch_at DESC, created_at DESC LIMIT ?"
+      "SELECT id, sketch_at, object_key, image_url, content_type, size_bytes, note, derivatives, created_at, updated_at FROM sketches ORDER BY sketch_at DESC, created_at DESC LIMIT ?"
     )
       .bind(limit.value)
       .all();
   }
 
   const sketches = (rowsResult.results || []).map(normalizeSketchRow);
-  return json({ data: sketches }, 200, request);
+  return jsonWithEtag({ data: sketches }, request);
+}
+
+// Change feed for incremental syncs: rows whose (updated_at, id) sorts after
+// the row cursor and ids whose (deleted_at, id) sorts after the tombstone
+// cursor, oldest first and paged separately. `cursor` is the position after
+// this page (store it for the next sync); `next` repeats it while either
+// page was full. deleted_since defaults to updated_since for older clients.
+async function listSketchChanges(env, request, url, limit, updatedSinceParam) {
+  const updatedSince = normalizeIsoTimestamp(updatedSinceParam);
+  if (!updatedSince) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: "Query parameter updated_since must be a valid timestamp.",
+        },
+      },
+      400,
+      request
+    );
+  }
+  const after = sanitizeText(url.searchParams.get("after"));
+  const deletedSinceParam = sanitizeText(url.searchParams.get("deleted_since"));
+  const deletedSince = deletedSinceParam
+    ? normalizeIsoTimestamp(deletedSinceParam)
+    : updatedSince;
+  if (!deletedSince) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: "Query parameter deleted_since must be a valid timestamp.",
+        },
+      },
+      400,
+      request
+    );
+  }
+  const deletedAfter = sanitizeText(url.searchParams.get("deleted_after"));
+
+  const rowsResult = await env.DB.prepare(
+    "SELECT id, sketch_at, object_key, image_url, content_type, size_bytes, note, derivatives, created_at, updated_at FROM sketches WHERE updated_at > ? OR (updated_at = ? AND id > ?) ORDER BY updated_at ASC, id ASC LIMIT ?"
+  )
+    .bind(updatedSince, updatedSince, after, limit)
+    .all();
+  const deletedResult = await env.DB.prepare(
+    "SELECT id, deleted_at FROM sketch_tombstones WHERE deleted_at > ? OR (deleted_at = ? AND id > ?) ORDER BY deleted_at ASC, id ASC LIMIT ?"
+  )
+    .bind(deletedSince, deletedSince, deletedAfter, limit)
+    .all();
+
+  const sketches = (rowsResult.results || []).map(normalizeSketchRow);
+  const tombstones = deletedResult.results || [];
+  const last = sketches[sketches.length - 1];
+  const lastDeleted = tombstones[tombstones.length - 1];
+  const cursor = {
+    updated_since: last ? last.updated_at : updatedSince,
+    after: last ? last.id : after,
+    deleted_since: lastDeleted ? lastDeleted.deleted_at : deletedSince,
+    deleted_after: lastDeleted ? lastDeleted.id : deletedAfter,
+  };
+  return jsonWithEtag(
+    {
+      data: sketches,
+      deleted: tombstones.map((row) => row.id),
+      cursor,
+      next: sketches.length === limit || tombstones.length === limit ? cursor : null,
+    },
+    request
+  );
 }
 
 async function getLatestSketch(env, request) {
   const row = await env.DB.prepare(
-    "SELECT id, sketch_at, object_key, image_url, content_type, size_bytes, note, created_at, updated_at FROM sketches ORDER BY sketch_at DESC, created_at DESC LIMIT 1"
+    "SELECT id, sketch_at, object_key, image_url, content_type, size_bytes, note, derivatives, created_at, updated_at FROM sketches ORDER BY sketch_at DESC, created_at DESC LIMIT 1"
   ).first();
   return json({ data: normalizeSketchRow(row) }, 200, request);
 }
@@ -515,6 +624,7 @@ async function createSketch(env, request) {
         content_type: contentType,
         size_bytes: sizeBytes,
         note: note.value,
+        derivatives: [],
         created_at: now,
         updated_at: now,
       },
@@ -655,21 +765,132 @@ async function uploadSketch(env, request) {
     );
   }
 
-  const id = crypto.randomUUID();
-  const now = new Date().toISOString();
   const body = await file.arrayBuffer();
 
-  const existingByObjectKey = await env.DB.prepare(
-    "SELECT id FROM sketches WHERE object_key = ?"
+  if (await sketchObjectKeyExists(env, objectKey)) {
+    return sketchConflict(request);
+  }
+
+  await env.SKETCHES_BUCKET.put(objectKey, body, {
+    httpMetadata: { contentType: uploadContentType },
+  });
+
+  return insertUploadedSketch(env, request, {
+    sketchAt,
+    objectKey,
+    imageUrl,
+    contentType: uploadContentType,
+    sizeBytes: file.size,
+    note: note.value,
+  });
+}
+
+// Resumable uploads: create returns an upload id and the part size, parts
+// are PUT in any order (and may be retried), and complete assembles them in
+// R2 and inserts the sketch row exactly like /sketches/upload.
+async function createSketchUpload(env, request) {
+  if (!env.SKETCHES_BUCKET) {
+    return json(
+      {
+        error: {
+          code: "CONFIG_ERROR",
+          message: "SKETCHES_BUCKET binding is not configured.",
+        },
+      },
+      500,
+      request
+    );
+  }
+
+  const body = await parseJson(request);
+  if (!body.ok) {
+    return body.response;
+  }
+
+  const contentType = sanitizeText(body.value?.content_type).toLowerCase();
+  if (!ALLOWED_SKETCH_CONTENT_TYPES.has(contentType)) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: "Only JPEG, PNG, WEBP, HEIC, and HEIF uploads are supported.",
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  const sizeBytes = toPositiveInteger(body.value?.size_bytes);
+  if (!sizeBytes || sizeBytes > MAX_SKETCH_CHUNKED_UPLOAD_BYTES) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: `size_bytes must be between 1 and ${MAX_SKETCH_CHUNKED_UPLOAD_BYTES}.`,
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  const sketchAt = normalizeIsoTimestamp(
+    sanitizeText(body.value?.sketch_at) || new Date().toISOString()
+  );
+  if (!sketchAt) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: "sketch_at must be a valid timestamp.",
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  const note = normalizeSketchNote(body.value?.note);
+  if (!note.ok) {
+    return json(
+      { error: { code: "VALIDATION_ERROR", message: note.message } },
+      400,
+      request
+    );
+  }
+
+  const objectKey =
+    sanitizeText(body.value?.object_key) || buildSketchObjectKey(sketchAt, contentType);
+  if (!isValidObjectKey(objectKey)) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: "object_key must be a safe object path.",
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  if (await sketchObjectKeyExists(env, objectKey)) {
+    return sketchConflict(request);
+  }
+
+  const pending = await env.DB.prepare(
+    "SELECT upload_id FROM sketch_uploads WHERE object_key = ?"
   )
     .bind(objectKey)
     .first();
-  if (existingByObjectKey) {
+  if (pending) {
     return json(
       {
         error: {
-          code: "CONFLICT",
-          message: "A sketch already exists with this object key.",
+          code: "UPLOAD_IN_PROGRESS",
+          message: "An upload for this object key is already in progress.",
+          upload_id: pending.upload_id,
         },
       },
       409,
@@ -677,9 +898,221 @@ async function uploadSketch(env, request) {
     );
   }
 
-  await env.SKETCHES_BUCKET.put(objectKey, body, {
-    httpMetadata: { contentType: uploadContentType },
+  const upload = await env.SKETCHES_BUCKET.createMultipartUpload(objectKey, {
+    httpMetadata: { contentType },
   });
+  const now = new Date().toISOString();
+  await env.DB.prepare(
+    "INSERT INTO sketch_uploads (upload_id, object_key, sketch_at, content_type, size_bytes, part_size, note, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+  )
+    .bind(
+      upload.uploadId,
+      objectKey,
+      sketchAt,
+      contentType,
+      sizeBytes,
+      SKETCH_UPLOAD_PART_BYTES,
+      note.value,
+      now
+    )
+    .run();
+
+  return json(
+    {
+      data: {
+        upload_id: upload.uploadId,
+        object_key: objectKey,
+        part_size: SKETCH_UPLOAD_PART_BYTES,
+        part_count: Math.ceil(sizeBytes / SKETCH_UPLOAD_PART_BYTES),
+      },
+    },
+    201,
+    request
+  );
+}
+
+async function uploadSketchPart(env, request, uploadId, rawPartNumber) {
+  const pending = await getPendingSketchUpload(env, uploadId);
+  if (!pending) {
+    return sketchUploadNotFound(request);
+  }
+
+  const partCount = Math.ceil(pending.size_bytes / pending.part_size);
+  const partNumber = Number.parseInt(rawPartNumber, 10);
+  if (!Number.isInteger(partNumber) || partNumber < 1 || partNumber > partCount) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: `Part number must be between 1 and ${partCount}.`,
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  const expectedBytes =
+    partNumber < partCount
+      ? pending.part_size
+      : pending.size_bytes - pending.part_size * (partCount - 1);
+  const contentLength = Number.parseInt(request.headers.get("content-length") || "", 10);
+  if (contentLength !== expectedBytes || !request.body) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: `Part ${partNumber} must be exactly ${expectedBytes} bytes.`,
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  const upload = env.SKETCHES_BUCKET.resumeMultipartUpload(pending.object_key, uploadId);
+  const part = await upload.uploadPart(partNumber, request.body);
+  return json(
+    { data: { part_number: part.partNumber, etag: part.etag } },
+    200,
+    request
+  );
+}
+
+async function completeSketchUpload(env, request, uploadId) {
+  const pending = await getPendingSketchUpload(env, uploadId);
+  if (!pending) {
+    return sketchUploadNotFound(request);
+  }
+
+  const body = await parseJson(request);
+  if (!body.ok) {
+    return body.response;
+  }
+
+  const partCount = Math.ceil(pending.size_bytes / pending.part_size);
+  const parts = Array.isArray(body.value?.parts)
+    ? body.value.parts
+        .map((part) => ({
+          partNumber: Number.parseInt(part?.part_number, 10),
+          etag: sanitizeText(part?.etag),
+        }))
+        .filter((part) => Number.isInteger(part.partNumber) && part.etag)
+        .sort((a, b) => a.partNumber - b.partNumber)
+    : [];
+  if (
+    parts.length !== partCount ||
+    parts.some((part, index) => part.partNumber !== index + 1)
+  ) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: `parts must list part_number and etag for all ${partCount} parts.`,
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  const imageUrl = buildSketchImageUrl(env, pending.object_key);
+  if (!isValidHttpUrl(imageUrl)) {
+    return json(
+      {
+        error: {
+          code: "CONFIG_ERROR",
+          message:
+            "SKETCHES_PUBLIC_BASE_URL is required to produce a public image URL.",
+        },
+      },
+      500,
+      request
+    );
+  }
+
+  const upload = env.SKETCHES_BUCKET.resumeMultipartUpload(pending.object_key, uploadId);
+  if (await sketchObjectKeyExists(env, pending.object_key)) {
+    await upload.abort().catch(() => {});
+    await deletePendingSketchUpload(env, uploadId);
+    return sketchConflict(request);
+  }
+
+  await upload.complete(parts);
+  await deletePendingSketchUpload(env, uploadId);
+
+  return insertUploadedSketch(env, request, {
+    sketchAt: pending.sketch_at,
+    objectKey: pending.object_key,
+    imageUrl,
+    contentType: pending.content_type,
+    sizeBytes: pending.size_bytes,
+    note: pending.note,
+  });
+}
+
+async function abortSketchUpload(env, request, uploadId) {
+  const pending = await getPendingSketchUpload(env, uploadId);
+  if (!pending) {
+    return sketchUploadNotFound(request);
+  }
+
+  await env.SKETCHES_BUCKET.resumeMultipartUpload(pending.object_key, uploadId)
+    .abort()
+    .catch((error) => {
+      console.error("Failed to abort sketch multipart upload", error);
+    });
+  await deletePendingSketchUpload(env, uploadId);
+  return json({ data: { upload_id: uploadId, aborted: true } }, 200, request);
+}
+
+async function getPendingSketchUpload(env, uploadId) {
+  return env.DB.prepare(
+    "SELECT upload_id, object_key, sketch_at, content_type, size_bytes, part_size, note FROM sketch_uploads WHERE upload_id = ?"
+  )
+    .bind(uploadId)
+    .first();
+}
+
+async function deletePendingSketchUpload(env, uploadId) {
+  await env.DB.prepare("DELETE FROM sketch_uploads WHERE upload_id = ?")
+    .bind(uploadId)
+    .run();
+}
+
+function sketchUploadNotFound(request) {
+  return json(
+    { error: { code: "NOT_FOUND", message: "Upload not found or already finished." } },
+    404,
+    request
+  );
+}
+
+async function sketchObjectKeyExists(env, objectKey) {
+  const existing = await env.DB.prepare("SELECT id FROM sketches WHERE object_key = ?")
+    .bind(objectKey)
+    .first();
+  return Boolean(existing);
+}
+
+function sketchConflict(request) {
+  return json(
+    {
+      error: {
+        code: "CONFLICT",
+        message: "A sketch already exists with this object key.",
+      },
+    },
+    409,
+    request
+  );
+}
+
+// Inserts the row for an object already stored in R2; the object is removed
+// again if the insert fails for any reason other than a duplicate key.
+async function insertUploadedSketch(env, request, sketch) {
+  const id = crypto.randomUUID();
+  const now = new Date().toISOString();
 
   try {
     await env.DB.prepare(
@@ -687,31 +1120,22 @@ async function uploadSketch(env, request) {
     )
       .bind(
         id,
-        sketchAt,
-        objectKey,
-        imageUrl,
-        uploadContentType,
-        file.size,
-        note.value,
+        sketch.sketchAt,
+        sketch.objectKey,
+        sketch.imageUrl,
+        sketch.contentType,
+        sketch.sizeBytes,
+        sketch.note,
         now,
         now
       )
       .run();
   } catch (error) {
     if (isUniqueConstraintError(error)) {
-      return json(
-        {
-          error: {
-            code: "CONFLICT",
-            message: "A sketch already exists with this object key.",
-          },
-        },
-        409,
-        request
-      );
+      return sketchConflict(request);
     }
 
-    await env.SKETCHES_BUCKET.delete(objectKey).catch((cleanupError) => {
+    await env.SKETCHES_BUCKET.delete(sketch.objectKey).catch((cleanupError) => {
       console.error("Failed to delete orphaned sketch object", cleanupError);
     });
 
@@ -722,12 +1146,13 @@ async function uploadSketch(env, request) {
     {
       data: {
         id,
-        sketch_at: sketchAt,
-        object_key: objectKey,
-        image_url: imageUrl,
-        content_type: uploadContentType,
-        size_bytes: file.size,
-        note: note.value,
+        sketch_at: sketch.sketchAt,
+        object_key: sketch.objectKey,
+        image_url: sketch.imageUrl,
+        content_type: sketch.contentType,
+        size_bytes: sketch.sizeBytes,
+        note: sketch.note,
+        derivatives: [],
         created_at: now,
         updated_at: now,
       },
@@ -737,6 +1162,139 @@ async function uploadSketch(env, request) {
   );
 }
 
+// Stores one derivative of an existing sketch and records it on the row. The
+// row's updated_at is bumped so change-feed syncs pick the new URL up.
+async function uploadSketchDerivative(env, request, url, id, name) {
+  const nameMatch = SKETCH_DERIVATIVE_NAME_PATTERN.exec(name);
+  if (!nameMatch) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: "Derivative name must be primary.<ext> or w<width>.<ext> (webp or avif).",
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  const contentType = SKETCH_DERIVATIVE_CONTENT_TYPES[nameMatch[2]];
+  const width = toPositiveInteger(url.searchParams.get("width"));
+  const height = toPositiveInteger(url.searchParams.get("height"));
+  if (!width || !height) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: "Query parameters width and height must be positive integers.",
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  const contentLength = Number.parseInt(request.headers.get("content-length") || "", 10);
+  if (
+    !request.body ||
+    !Number.isInteger(contentLength) ||
+    contentLength <= 0 ||
+    contentLength > MAX_SKETCH_DERIVATIVE_BYTES
+  ) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: `Derivative body must be between 1 and ${MAX_SKETCH_DERIVATIVE_BYTES} bytes.`,
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  const row = await env.DB.prepare(
+    "SELECT id, sketch_at, object_key, image_url, content_type, size_bytes, note, derivatives, created_at, updated_at FROM sketches WHERE id = ?"
+  )
+    .bind(id)
+    .first();
+  if (!row) {
+    return json(
+      { error: { code: "NOT_FOUND", message: "Sketch not found." } },
+      404,
+      request
+    );
+  }
+
+  const derivatives = parseSketchDerivatives(row.derivatives).filter(
+    (derivative) => derivative.name !== name
+  );
+  if (derivatives.length >= MAX_SKETCH_DERIVATIVES) {
+    return json(
+      {
+        error: {
+          code: "VALIDATION_ERROR",
+          message: `A sketch can have at most ${MAX_SKETCH_DERIVATIVES} derivatives.`,
+        },
+      },
+      400,
+      request
+    );
+  }
+
+  const objectKey = `${row.object_key.replace(/\.[^./]+$/, "")}/${name}`;
+  const imageUrl = buildSketchImageUrl(env, objectKey);
+  if (!isValidHttpUrl(imageUrl)) {
+    return json(
+      {
+        error: {
+          code: "CONFIG_ERROR",
+          message:
+            "SKETCHES_PUBLIC_BASE_URL is required to produce a public image URL.",
+        },
+      },
+      500,
+      request
+    );
+  }
+
+  await env.SKETCHES_BUCKET.put(objectKey, request.body, {
+    httpMetadata: {
+      contentType,
+      cacheControl: "public, max-age=31536000, immutable",
+    },
+  });
+
+  derivatives.push({
+    name,
+    object_key: objectKey,
+    url: imageUrl,
+    content_type: contentType,
+    width,
+    height,
+    size_bytes: contentLength,
+  });
+  derivatives.sort((a, b) => a.width - b.width);
+
+  const now = new Date().toISOString();
+  await env.DB.prepare("UPDATE sketches SET derivatives = ?, updated_at = ? WHERE id = ?")
+    .bind(JSON.stringify(derivatives), now, id)
+    .run();
+
+  return json(
+    {
+      data: normalizeSketchRow({
+        ...row,
+        derivatives: JSON.stringify(derivatives),
+        updated_at: now,
+      }),
+    },
+    200,
+    request
+  );
+}
+
 async function updateSketch(env, request, id) {
   const body = await parseJson(request);
   if (!body.ok) {
@@ -781,7 +1339,7 @@ async function updateSketch(env, request, id) {
   }
 
   const row = await env.DB.prepare(
-    "SELECT id, sketch_at, object_key, image_url, content_type, size_bytes, note, created_at, updated_at FROM sketches WHERE id = ?"
+    "SELECT id, sketch_at, object_key, image_url, content_type, size_bytes, note, derivatives, created_at, updated_at FROM sketches WHERE id = ?"
   )
     .bind(id)
     .first();
@@ -791,7 +1349,7 @@ async function updateSketch(env, request, id) {
 
 async function deleteSketch(env, request, id) {
   const existing = await env.DB.prepare(
-    "SELECT id, object_key FROM sketches WHERE id = ?"
+    "SELECT id, object_key, derivatives FROM sketches WHERE id = ?"
   )
     .bind(id)
     .first();
@@ -805,8 +1363,17 @@ async function deleteSketch(env, request, id) {
   }
 
   await env.DB.prepare("DELETE FROM sketches WHERE id = ?").bind(id).run();
-  if (env.SKETCHES_BUCKET && existing.object_key) {
-    await env.SKETCHES_BUCKET.delete(existing.object_key).catch((error) => {
+  await env.DB.prepare(
+    "INSERT OR REPLACE INTO sketch_tombstones (id, deleted_at) VALUES (?, ?)"
+  )
+    .bind(id, new Date().toISOString())
+    .run();
+  const objectKeys = [
+    existing.object_key,
+    ...parseSketchDerivatives(existing.derivatives).map((derivative) => derivative.object_key),
+  ].filter(Boolean);
+  if (env.SKETCHES_BUCKET && objectKeys.length > 0) {
+    await env.SKETCHES_BUCKET.delete(objectKeys).catch((error) => {
       console.error("Failed to delete sketch object from R2", error);
     });
   }
@@ -847,11 +1414,28 @@ function normalizeSketchRow(row) {
     content_type: row.content_type,
     size_bytes: row.size_bytes,
     note: row.note || "",
+    derivatives: parseSketchDerivatives(row.derivatives).map((derivative) => ({
+      name: derivative.name,
+      url: derivative.url,
+      content_type: derivative.content_type,
+      width: derivative.width,
+      height: derivative.height,
+    })),
     created_at: row.created_at,
     updated_at: row.updated_at,
   };
 }
 
+function parseSketchDerivatives(value) {
+  if (typeof value !== "string" || !value) return [];
+  try {
+    const parsed = JSON.parse(value);
+    return Array.isArray(parsed) ? parsed.filter((item) => item && item.name) : [];
+  } catch {
+    return [];
+  }
+}
+
 async function parseJson(request) {
   const contentType = request.headers.get("content-type") || "";
   if (!contentType.includes("application/json")) {
@@ -1055,12 +1639,49 @@ function json(payload, status, request) {
   return new Response(JSON.stringify(payload), { status, headers });
 }
 
+async function jsonWithEtag(payload, request) {
+  const body = JSON.stringify(payload);
+  const etag = await computeEtag(body);
+  const headers = {
+    etag,
+    "cache-control": "private, no-cache",
+  };
+  const origin = request.headers.get("origin");
+  if (isAllowedOrigin(origin)) {
+    Object.assign(headers, corsHeaders(origin));
+  }
+
+  if (etagMatches(request.headers.get("if-none-match"), etag)) {
+    return new Response(null, { status: 304, headers });
+  }
+
+  headers["content-type"] = "application/json; charset=utf-8";
+  return new Response(body, { status: 200, headers });
+}
+
+async function computeEtag(body) {
+  const digest = await crypto.subtle.digest("SHA-256", new TextEncoder().encode(body));
+  const hex = Array.from(new Uint8Array(digest))
+    .map((byte) => byte.toString(16).padStart(2, "0"))
+    .join("");
+  return `"${hex}"`;
+}
+
+function etagMatches(ifNoneMatch, etag) {
+  if (!ifNoneMatch) return false;
+  return ifNoneMatch
+    .split(",")
+    .map((candidate) => candidate.trim().replace(/^W\//, ""))
+    .some((candidate) => candidate === "*" || candidate === etag);
+}
+
 function corsHeaders(origin) {
   return {
     "access-control-allow-origin": origin,
     "access-control-allow-credentials": "true",
-    "access-control-allow-methods": "GET,POST,PATCH,DELETE,OPTIONS",
-    "access-control-allow-headers": "content-type",
+    "access-control-allow-methods": "GET,POST,PUT,PATCH,DELETE,OPTIONS",
+    "access-control-allow-headers": "content-type, if-none-match",
+    "access-control-expose-headers": "etag",
     "access-control-max-age": "86400",
     vary: "origin",
   };